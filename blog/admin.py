@@ -1,5 +1,11 @@
+from operator import methodcaller
+
 from django.contrib import admin
-from .models import Genre, Language, Book, BookInstance, Author
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from . import loans
+from .models import Genre, Language, Book, BookInstance, Author, Hold
+from .widgets import IndexAutocompleteSelect, IndexAutocompleteSelectMultiple
 
 # admin.site.register(Book)
 # admin.site.register(Author)
@@ -8,10 +14,86 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 
-class BooksInline(admin.TabularInline):
+class IndexAutocompleteAdminMixin:
+    '''
+    Выбирает связанные объекты подсказками при вводе из индекса в памяти
+    (blog/autocomplete.py) вместо <select> со всеми записями.
+
+    index_autocomplete_fields сопоставляет имени поля имя индекса.
+    '''
+    index_autocomplete_fields = {}
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.index_autocomplete_fields:
+            kwargs['widget'] = IndexAutocompleteSelect(
+                db_field, self.index_autocomplete_fields[db_field.name], admin_site=self.admin_site,
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name in self.index_autocomplete_fields:
+            kwargs['widget'] = IndexAutocompleteSelectMultiple(
+                db_field, self.index_autocomplete_fields[db_field.name], admin_site=self.admin_site,
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class CappedInlineFormSet(BaseInlineFormSet):
+    '''
+    Набор форм вставки, который показывает не больше max_rows связанных записей.
+
+    У автора могут быть сотни книг, а у книги - сотни экземпляров: каждая строка
+    вставки - это отдельная форма со своими запросами, поэтому страница изменения
+    выводит только первые записи, а полный список доступен в списке объектов.
+    '''
+    max_rows = 25
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            # Порядок с pk, чтобы при отправке формы срез состоял из тех же записей
+            ordering = queryset.query.order_by or self.model._meta.ordering
+            self._queryset = queryset.order_by(*ordering, 'pk')[:self.max_rows]
+        return self._queryset
+
+
+class CappedInlineMixin:
+    '''
+    Ограничивает число строк вставки (см. CappedInlineFormSet) и задает связи для ее запроса.
+
+    Для полей из shared_choice_fields варианты <select> загружаются один раз на набор
+    форм, а не отдельным запросом в каждой строке.
+    '''
+    formset = CappedInlineFormSet
+    max_rows = CappedInlineFormSet.max_rows
+    inline_select_related = ()
+    inline_prefetch_related = ()
+    shared_choice_fields = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            *self.inline_select_related).prefetch_related(*self.inline_prefetch_related)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if formfield is not None and db_field.name in self.shared_choice_fields:
+            # Готовый список копируется в формы строк вместе с полем
+            formfield.choices = list(iter(formfield.choices))
+        return formfield
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.max_rows = self.max_rows
+        return formset
+
+
+class BooksInline(CappedInlineMixin, IndexAutocompleteAdminMixin, admin.TabularInline):
     """Определяет формат встроенной вставки книги (используется в AuthorAdmin)."""
     model = Book
     extra = 0
+    index_autocomplete_fields = {'genre': 'genres'}
+    inline_prefetch_related = ('genre',)
+    shared_choice_fields = ('language',)
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
@@ -21,23 +103,58 @@ class AuthorAdmin(admin.ModelAdmin):
     inlines = [BooksInline]
 
 
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(CappedInlineMixin, admin.TabularInline):
     """Определяет формат вставки экземпляра встроенной книги (используется в BookAdmin)."""
     model = BookInstance
     extra = 0
+    # Поле id вместо <select> со всеми читателями в каждой строке
+    raw_id_fields = ('borrower',)
+
+
+class PageAnnotatingPaginator(Paginator):
+    '''
+    Paginator, который применяет annotate только к записям текущей страницы.
+
+    Запросы COUNT(*) для списка объектов выполняются без аннотаций, иначе подзапросы
+    из них вычислялись бы для каждой строки таблицы, а не только для ста строк страницы.
+    '''
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, annotate=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.annotate = annotate
+
+    def page(self, number):
+        page = super().page(number)
+        if self.annotate is not None:
+            # object_list страницы - срез queryset, и аннотация попадает в запрос только ее строк
+            page.object_list = self.annotate(page.object_list)
+        return page
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(IndexAutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
+    list_select_related = ('author',)
+    index_autocomplete_fields = {'author': 'authors', 'genre': 'genres'}
 
     inlines = [BooksInstanceInline]
 
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        # Жанры для display_genre приходят строкой в том же запросе, что и книги страницы
+        return PageAnnotatingPaginator(queryset, per_page, orphans, allow_empty_first_page,
+                                       annotate=methodcaller('with_genre_names'))
+
 
 @admin.register(BookInstance)
-class BookInstanceAdmin(admin.ModelAdmin):
+class BookInstanceAdmin(IndexAutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    # BookInstance.__str__ и столбец book используют название книги, столбец borrower - читателя
+    list_select_related = ('book', 'borrower')
+    raw_id_fields = ('borrower',)
+    index_autocomplete_fields = {'book': 'books'}
+
+    actions = ['return_copies', 'renew_copies']
 
     fieldsets = (
         (None, {
@@ -46,4 +163,30 @@ class BookInstanceAdmin(admin.ModelAdmin):
         ('Availability', {
             'fields': ('status', 'due_back', 'borrower')
         }),
-    )
\ No newline at end of file
+    )
+
+    def apply_loans(self, request, queryset, action):
+        """Выполняет пакетную операцию над выбранными экземплярами одной транзакцией (см. blog/loans.py)."""
+        result = loans.apply_loans(action, queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Обработано экземпляров: {len(result.updated)}, пропущено: {len(result.skipped)}.')
+
+    @admin.action(description='Принять возврат выбранных экземпляров', permissions=['mark_returned'])
+    def return_copies(self, request, queryset):
+        self.apply_loans(request, queryset, loans.RETURN)
+
+    @admin.action(description='Продлить выбранные экземпляры на 3 недели', permissions=['mark_returned'])
+    def renew_copies(self, request, queryset):
+        self.apply_loans(request, queryset, loans.RENEW)
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('blog.can_mark_returned')
+
+
+@admin.register(Hold)
+class HoldAdmin(IndexAutocompleteAdminMixin, admin.ModelAdmin):
+    """Очередь заявок; назначение экземпляров выполняет blog/holds.py."""
+    list_display = ('book', 'user', 'status', 'created_at', 'copy')
+    list_filter = ('status',)
+    list_select_related = ('book', 'user', 'copy__book')
+    raw_id_fields = ('user', 'copy')
+    index_autocomplete_fields = {'book': 'books'}
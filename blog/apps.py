@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        # Подключает обработчики сигналов, поддерживающие денормализованные данные.
+        from . import signals  # noqa: F401
+        # Регистрирует проверку blog.W001 времени жизни снимков разрешений.
+        from . import auth_backends  # noqa: F401
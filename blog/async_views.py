@@ -0,0 +1,120 @@
+"""Асинхронные версии страниц каталога для запуска под ASGI (uvicorn).
+
+Включаются переменной окружения BLOG_ASYNC_VIEWS=1 (website.urls_async): адреса
+и имена маршрутов те же, что у синхронных представлений, меняются только
+представления главной страницы, списков и карточек книг и авторов. Запросы
+выполняются асинхронным ORM (acount, aget, async for), а шаблоны, которые
+могут обращаться к базе при промахе кэша фрагментов, выводятся в потоке.
+
+В Django 4.1 асинхронный ORM выполняет запросы через sync_to_async в одном
+потоке соединения, поэтому запросы одного ответа не перекрываются во времени,
+зато событийный цикл не блокируется и обслуживает другие запросы, пока страница
+ждет базу. Поведение (контекст шаблонов, ETag/304, 404, заголовки кэша)
+совпадает с синхронными представлениями в blog/views.py.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.translation import gettext as _
+
+from blog import visits
+from blog.conditional import (
+    async_catalog_condition, author_list_version, author_version, book_list_version, book_version, get_user,
+)
+from blog.models import Author, Book, LibraryStats
+from blog.pagination import InvalidCursor, KeysetPaginator
+from blog.views import AuthorListView, BookListView, index_context, patch_index_caching
+
+arender = sync_to_async(render)
+
+
+async def index(request):
+    """Главная страница: счетчики и число посещений запрашиваются одновременно."""
+    user = await get_user(request)
+    if user.is_authenticated:
+        stats, num_visits = await asyncio.gather(LibraryStats.aload(), visits.arecord_visit(user))
+    else:
+        stats, num_visits = await LibraryStats.aload(), None
+    response = await arender(request, 'index.html', context=index_context(stats, num_visits))
+    return patch_index_caching(response, num_visits)
+
+
+async def paginate(request, queryset, per_page, keyset_ordering):
+    """Асинхронный аналог ListView.paginate_queryset (с учетом BLOG_KEYSET_PAGINATION)."""
+    if getattr(settings, 'BLOG_KEYSET_PAGINATION', False):
+        paginator = KeysetPaginator(queryset, per_page, keyset_ordering)
+        try:
+            page = await sync_to_async(paginator.page)(request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page
+
+    paginator = Paginator(queryset, per_page)
+    # Paginator.count - cached_property: количество запрашивается заранее асинхронно
+    paginator.count = await queryset.acount()
+    page_number = request.GET.get('page') or 1
+    try:
+        page_number = paginator.num_pages if page_number == 'last' else int(page_number)
+        page = paginator.page(page_number)
+    except ValueError:
+        raise Http404(_('Page is not “last”, nor can it be converted to an int.'))
+    except InvalidPage as e:
+        raise Http404(_('Invalid page (%(page_number)s): %(message)s') % {
+            'page_number': page_number, 'message': str(e),
+        })
+    page.object_list = [obj async for obj in page.object_list]
+    return paginator, page
+
+
+async def object_list(request, view_class, queryset, context_object_name):
+    paginator, page = await paginate(request, queryset, view_class.paginate_by, view_class.keyset_ordering)
+    context = {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list,
+        context_object_name: page.object_list,
+    }
+    template_name = f'{queryset.model._meta.app_label}/{queryset.model._meta.model_name}_list.html'
+    return await arender(request, template_name, context)
+
+
+async def object_detail(request, queryset, pk):
+    try:
+        obj = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise Http404(_('No %(verbose_name)s found matching the query') % {
+            'verbose_name': queryset.model._meta.verbose_name,
+        })
+    context = {'object': obj, queryset.model._meta.model_name: obj}
+    template_name = f'{queryset.model._meta.app_label}/{queryset.model._meta.model_name}_detail.html'
+    return await arender(request, template_name, context)
+
+
+@async_catalog_condition(book_list_version)
+async def book_list(request):
+    """Список книг (BookListView)."""
+    return await object_list(request, BookListView, Book.objects.select_related('author'), 'book_list')
+
+
+@async_catalog_condition(book_version)
+async def book_detail(request, pk):
+    """Карточка книги (BookDetailView)."""
+    queryset = Book.objects.select_related('author', 'language').prefetch_related('genre')
+    return await object_detail(request, queryset, pk)
+
+
+@async_catalog_condition(author_list_version)
+async def author_list(request):
+    """Список авторов (AuthorListView)."""
+    return await object_list(request, AuthorListView, Author.objects.all(), 'author_list')
+
+
+@async_catalog_condition(author_version)
+async def author_detail(request, pk):
+    """Карточка автора (AuthorDetailView)."""
+    return await object_detail(request, Author.objects.all(), pk)
@@ -0,0 +1,122 @@
+"""Бэкенд аутентификации с кэшированными разрешениями пользователя.
+
+ModelBackend загружает разрешения пользователя и его групп двумя запросами на
+каждый запрос к сайту: base_generic.html проверяет perms.blog.can_mark_returned
+на каждой странице. CachedModelBackend хранит этот набор в кэше фрагментов
+(blog/fragments.py) под ключом с двумя версиями: общей, которая увеличивается
+при изменении групп и разрешений (Group.permissions, удаление группы, Permission),
+и версией пользователя, которая увеличивается при изменении его разрешений,
+групп или флагов is_active/is_superuser (сигналы в blog/signals.py). После
+прогрева проверка разрешений не выполняет запросов к БД.
+
+Как и сводки выдач (blog/loan_summary.py), на локальном кэше версии меняются
+только в текущем процессе: другие процессы видят отзыв разрешения по истечении
+BLOG_PERMISSION_CACHE_TIMEOUT (по умолчанию 5 секунд), поэтому для нескольких
+процессов нужен общий кэш, а без него проверка blog.W001 предупреждает о долгом
+времени жизни снимка.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+from django.db import transaction
+
+from .fragments import get_cache
+
+GLOBAL_VERSION_KEY = 'perm-version'
+
+
+def _user_version_key(user_id):
+    return f'perm-version:{user_id}'
+
+
+def cache_timeout():
+    return getattr(settings, 'BLOG_PERMISSION_CACHE_TIMEOUT', 5)
+
+
+# Дольше этого снимок на локальном кэше нескольких процессов считается опасным
+LOCAL_CACHE_MAX_TIMEOUT = 10
+
+
+@register()
+def check_local_cache(app_configs, **kwargs):
+    """Предупреждает, если отзыв разрешения в других процессах ждет долгого времени жизни снимка."""
+    if 'blog.auth_backends.CachedModelBackend' not in settings.AUTHENTICATION_BACKENDS:
+        return []
+    workers = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    if workers > 1 and isinstance(get_cache(), LocMemCache) and cache_timeout() > LOCAL_CACHE_MAX_TIMEOUT:
+        return [Warning(
+            f'Снимки разрешений хранятся в памяти каждого из {workers} процессов {cache_timeout()} с: '
+            f'отозванное разрешение действует в других процессах до истечения этого времени.',
+            hint='Задайте общий кэш BLOG_FRAGMENT_CACHE_BACKEND или уменьшите BLOG_PERMISSION_CACHE_TIMEOUT.',
+            id='blog.W001',
+        )]
+    return []
+
+
+def get_versions(user_id, cache):
+    """Общая версия и версия пользователя (одним обращением к кэшу)."""
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Новая версия не должна совпасть с вытесненной, поэтому она не начинается с 1
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def snapshot_key(user_obj, cache):
+    global_version, user_version = get_versions(user_obj.pk, cache)
+    # date_joined отличает пользователя от удаленного с тем же id
+    return f'perms:{user_obj.pk}:{user_obj.date_joined.timestamp()}:{global_version}:{user_version}'
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Версии нет: при следующем чтении будет создана новая
+            pass
+
+
+def _bump_now_and_on_commit(keys):
+    # Второй сброс после фиксации - для снимка, построенного параллельным запросом до нее
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_users(user_ids):
+    """Сбрасывает снимки разрешений пользователей user_ids."""
+    keys = [_user_version_key(user_id) for user_id in set(user_ids) - {None}]
+    if keys:
+        _bump_now_and_on_commit(keys)
+
+
+def invalidate_all():
+    """Сбрасывает снимки разрешений всех пользователей (изменились группы или разрешения)."""
+    _bump_now_and_on_commit([GLOBAL_VERSION_KEY])
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, берущий разрешения пользователя и его групп из кэша."""
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_user_perm_cache') or not hasattr(user_obj, '_group_perm_cache'):
+            cache = get_cache()
+            key = snapshot_key(user_obj, cache)
+            snapshot = cache.get(key)
+            if snapshot is None:
+                load = super()._get_permissions
+                snapshot = {name: load(user_obj, obj, name) for name in ('user', 'group')}
+                cache.set(key, snapshot, cache_timeout())
+            user_obj._user_perm_cache = snapshot['user']
+            user_obj._group_perm_cache = snapshot['group']
+        return getattr(user_obj, f'_{from_name}_perm_cache')
@@ -0,0 +1,223 @@
+"""Подсказки при вводе по индексу префиксов в памяти процесса.
+
+Для каждой модели хранится отсортированный массив пар (ключ, id), где ключ -
+нормализованная строка, с начала которой может начинаться запрос (например,
+"фамилия имя" и "имя фамилия" автора, название и ISBN книги). Поиск по
+префиксу - это bisect по массиву и просмотр подряд идущих ключей, без обращений к БД.
+
+Индекс строится при первом запросе и обновляется:
+
+* сигналами post_save/post_delete в том же процессе (после фиксации транзакции);
+* раз в BLOG_AUTOCOMPLETE_REFRESH секунд при очередном запросе - изменения из
+  других процессов: измененные записи выбираются по индексу updated_at, а удаления
+  (и любые изменения моделей без updated_at, например жанров) увеличивают версию
+  индекса в кэше фрагментов (blog/fragments.py), и при ее смене индекс строится
+  заново. Проверка версии - одно обращение к кэшу, без COUNT(*) по таблице.
+
+На локальном кэше версия видна только своему процессу, поэтому удаления в других
+процессах подхватываются полным перестроением раз в BLOG_AUTOCOMPLETE_MAX_AGE секунд.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+from .fragments import get_cache
+from .models import Author, Book, Genre
+
+
+def normalize(text):
+    return ' '.join(str(text).casefold().split())
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей модели с поиском по префиксу через bisect."""
+    model = None
+    # Поля, которые загружаются при построении индекса
+    fields = ()
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Индекс строит один поток; остальные ждут и используют его результат
+        self.build_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.entries = []
+            self.keys = {}
+            self.labels = {}
+            self.loaded = False
+            self.checked_at = 0.0
+            self.built_at = 0.0
+            self.watermark = None
+            self.version = None
+
+    def index_keys(self, obj):
+        """Строки, по началу которых находится объект."""
+        raise NotImplementedError
+
+    def label(self, obj):
+        return str(obj)
+
+    def queryset(self):
+        return self.model.objects.only(*self.fields)
+
+    @property
+    def versioned(self):
+        return any(field.name == 'updated_at' for field in self.model._meta.fields)
+
+    @property
+    def version_key(self):
+        return f'autocomplete-version:{self.model._meta.label_lower}'
+
+    def current_version(self):
+        cache = get_cache()
+        version = cache.get(self.version_key)
+        if version is None:
+            # Новая версия не должна совпасть с вытесненной, поэтому она не начинается с 1
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        """Сообщает всем процессам, что индекс нужно построить заново (удаление или изменение без updated_at)."""
+        cache = get_cache()
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # Версии нет: при следующей проверке индекс будет построен заново
+            pass
+
+    def build(self, stale_version=None):
+        """Строит индекс; при stale_version - только если его еще не перестроил другой поток."""
+        with self.build_lock:
+            if self.loaded and self.version != stale_version:
+                return
+            self._build()
+
+    def _build(self):
+        # Версия читается до выборки: изменение во время построения вызовет повторное построение
+        version = self.current_version()
+        entries, keys, labels, watermark = [], {}, {}, None
+        for obj in self.queryset().order_by().iterator(chunk_size=5000):
+            obj_keys = {normalize(key) for key in self.index_keys(obj) if key}
+            keys[obj.pk] = obj_keys
+            labels[obj.pk] = self.label(obj)
+            entries.extend((key, obj.pk) for key in obj_keys)
+            if self.versioned and (watermark is None or obj.updated_at > watermark):
+                watermark = obj.updated_at
+        entries.sort()
+        with self.lock:
+            self.entries, self.keys, self.labels = entries, keys, labels
+            self.watermark = watermark
+            self.version = version
+            self.loaded = True
+            self.checked_at = self.built_at = time.monotonic()
+
+    def add(self, obj):
+        """Добавляет или обновляет объект в построенном индексе."""
+        with self.lock:
+            if not self.loaded:
+                return
+            self._remove(obj.pk)
+            obj_keys = {normalize(key) for key in self.index_keys(obj) if key}
+            self.keys[obj.pk] = obj_keys
+            self.labels[obj.pk] = self.label(obj)
+            for key in obj_keys:
+                insort(self.entries, (key, obj.pk))
+
+    def discard(self, pk):
+        with self.lock:
+            if self.loaded:
+                self._remove(pk)
+
+    def _remove(self, pk):
+        for key in self.keys.pop(pk, ()):
+            position = bisect_left(self.entries, (key, pk))
+            if position < len(self.entries) and self.entries[position] == (key, pk):
+                del self.entries[position]
+        self.labels.pop(pk, None)
+
+    def refresh(self):
+        """Строит индекс или подхватывает изменения из БД, если с прошлой проверки прошло достаточно времени."""
+        if not self.loaded:
+            self.build()
+            return
+        interval = getattr(settings, 'BLOG_AUTOCOMPLETE_REFRESH', 5)
+        now = time.monotonic()
+        if now - self.checked_at < interval:
+            return
+        self.checked_at = now
+        version = self.version
+        max_age = getattr(settings, 'BLOG_AUTOCOMPLETE_MAX_AGE', 300)
+        if (self.current_version() != version
+                or isinstance(get_cache(), LocMemCache) and now - self.built_at >= max_age):
+            self.build(stale_version=version)
+            return
+        if self.versioned and self.watermark is not None:
+            for obj in self.queryset().filter(updated_at__gte=self.watermark):
+                self.add(obj)
+                self.watermark = max(self.watermark, obj.updated_at)
+
+    def search(self, query, limit=20):
+        """Список пар (id, подпись) объектов, у которых один из ключей начинается с query."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.refresh()
+        results, seen = [], set()
+        with self.lock:
+            position = bisect_left(self.entries, (prefix,))
+            while position < len(self.entries) and len(results) < limit:
+                key, pk = self.entries[position]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self.labels[pk]))
+                position += 1
+        return results
+
+
+class AuthorIndex(PrefixIndex):
+    model = Author
+    fields = ('id', 'first_name', 'last_name', 'updated_at')
+
+    def index_keys(self, author):
+        return [f'{author.last_name} {author.first_name}', f'{author.first_name} {author.last_name}']
+
+
+class BookIndex(PrefixIndex):
+    model = Book
+    fields = ('id', 'title', 'isbn', 'updated_at')
+
+    def index_keys(self, book):
+        # Только начало названия и ISBN: ключ на каждое слово названия увеличил бы
+        # индекс в несколько раз, а поиск по словам выполняет blog/search.py.
+        return [book.title, book.isbn]
+
+
+class GenreIndex(PrefixIndex):
+    model = Genre
+    fields = ('id', 'name')
+
+    def index_keys(self, genre):
+        words = genre.name.split()
+        return [' '.join(words[num:]) for num in range(len(words))]
+
+
+INDEXES = {
+    'authors': AuthorIndex(),
+    'books': BookIndex(),
+    'genres': GenreIndex(),
+}
+
+
+def index_for_model(model):
+    for index in INDEXES.values():
+        if index.model is model:
+            return index
+    return None
@@ -0,0 +1,294 @@
+"""Вспомогательные функции для команд бенчмарков.
+
+Все данные создаются внутри транзакции, которая откатывается по завершении,
+поэтому бенчмарки можно запускать на рабочей базе, не оставляя в ней следов.
+"""
+import datetime
+import itertools
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from .models import Author, Book, BookInstance, Genre, Language, LibraryStats
+
+
+@contextmanager
+def rollback():
+    """Выполняет блок в транзакции и всегда откатывает ее."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def benchmark_client():
+    """Тестовый клиент Django, которому разрешено обращаться к сайту из команды manage.py."""
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        yield Client()
+
+
+def seed_author_with_books(num_books, copies_per_book=3, batch_size=1000):
+    """Создает автора с num_books книгами, у каждой из которых copies_per_book экземпляров."""
+    language, _ = Language.objects.get_or_create(name='Benchmark')
+    genre, _ = Genre.objects.get_or_create(name='Benchmark')
+    author = Author.objects.create(first_name='Bench', last_name=f'Author {num_books}')
+
+    prefix = f'B{author.pk}-'
+    Book.objects.bulk_create(
+        (Book(title=f'Benchmark book {num}', summary='Benchmark', isbn=f'{prefix}{num}',
+              author=author, language=language) for num in range(num_books)),
+        batch_size=batch_size,
+    )
+    books = list(Book.objects.filter(author=author).values_list('pk', flat=True))
+    Book.genre.through.objects.bulk_create(
+        (Book.genre.through(book_id=book_id, genre_id=genre.pk) for book_id in books),
+        batch_size=batch_size,
+    )
+    statuses = [code for code, _ in BookInstance.LOAN_STATUS]
+    BookInstance.objects.bulk_create(
+        (BookInstance(book_id=book_id, imprint='Benchmark', status=statuses[num % len(statuses)])
+         for book_id in books for num in range(copies_per_book)),
+        batch_size=batch_size,
+    )
+    # bulk_create не вызывает сигналы, поэтому счетчики пересчитываются целиком
+    LibraryStats.rebuild()
+    return author
+
+
+class QueryTimer:
+    """Обертка для connection.execute_wrapper(), считающая запросы и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def seed_library(authors=100, books=1000, copies=10000, users=100, genres=20,
+                 loan_ratio=0.2, batch_size=2000, seed=0):
+    """Создает синтетическую библиотеку заданного размера и возвращает список созданных читателей.
+
+    Доля loan_ratio экземпляров выдана читателям (часть из них просрочена),
+    остальные распределены между прочими статусами.
+    """
+    rnd = random.Random(seed)
+    tag = f'{time.monotonic_ns():x}'[-6:]
+    language, _ = Language.objects.get_or_create(name='Benchmark')
+
+    User.objects.bulk_create(
+        (User(username=f'bench-{tag}-{num}', email=f'bench-{num}@example.com', password='!')
+         for num in range(users)),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith=f'bench-{tag}-').values_list('pk', flat=True))
+
+    Genre.objects.bulk_create((Genre(name=f'Genre {tag} {num}') for num in range(genres)), batch_size=batch_size)
+    genre_ids = list(Genre.objects.filter(name__startswith=f'Genre {tag} ').values_list('pk', flat=True))
+
+    Author.objects.bulk_create(
+        (Author(first_name=f'First {num}', last_name=f'Last {tag} {num}') for num in range(authors)),
+        batch_size=batch_size,
+    )
+    author_ids = list(Author.objects.filter(last_name__startswith=f'Last {tag} ').values_list('pk', flat=True))
+
+    Book.objects.bulk_create(
+        (Book(title=f'Title {rnd.randrange(books * 10)}', summary='Benchmark', isbn=f'{tag}{num}',
+              author_id=rnd.choice(author_ids), language=language) for num in range(books)),
+        batch_size=batch_size,
+    )
+    book_ids = list(Book.objects.filter(isbn__startswith=tag).values_list('pk', flat=True))
+    Book.genre.through.objects.bulk_create(
+        (Book.genre.through(book_id=book_id, genre_id=rnd.choice(genre_ids)) for book_id in book_ids),
+        batch_size=batch_size,
+    )
+
+    today = datetime.date.today()
+
+    def make_copy():
+        if rnd.random() < loan_ratio:
+            return BookInstance(book_id=rnd.choice(book_ids), imprint='Benchmark', status='o',
+                                borrower_id=rnd.choice(user_ids),
+                                due_back=today + datetime.timedelta(days=rnd.randint(-14, 28)))
+        return BookInstance(book_id=rnd.choice(book_ids), imprint='Benchmark', status=rnd.choice('amr'))
+
+    BookInstance.objects.bulk_create((make_copy() for _ in range(copies)), batch_size=batch_size)
+    # bulk_create не вызывает сигналы, поэтому счетчики пересчитываются целиком
+    LibraryStats.rebuild()
+    return list(User.objects.filter(pk__in=user_ids))
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'to', 'su', 'vi', 'de', 'ga', 'po', 'ri', 'sa', 'lu', 'be', 'zo']
+
+
+def make_vocabulary(size, rnd):
+    """Список из size различных псевдослов (2-4 слога) в случайном порядке."""
+    words = {''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))) for _ in range(size * 3)}
+    words = sorted(words)
+    rnd.shuffle(words)
+    return words[:size]
+
+
+def seed_search_catalog(books=1000000, authors=None, genres=50, vocabulary=20000, batch_size=5000, seed=0):
+    """Создает каталог для поиска: названия и описания из псевдослов с распределением Ципфа.
+
+    Возвращает словарь слов, упорядоченный от самых частых к самым редким.
+    Поисковый индекс не перестраивается (см. blog.search.rebuild_index).
+    """
+    rnd = random.Random(seed)
+    tag = f'{time.monotonic_ns():x}'[-6:]
+    words = make_vocabulary(vocabulary, rnd)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+    def text(min_words, max_words):
+        return ' '.join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(min_words, max_words)))
+
+    Genre.objects.bulk_create((Genre(name=f'{words[num]} {tag}') for num in range(genres)), batch_size=batch_size)
+    genre_ids = list(Genre.objects.filter(name__endswith=f' {tag}').values_list('pk', flat=True))
+    Author.objects.bulk_create(
+        (Author(first_name=text(1, 1).capitalize(), last_name=f'{text(1, 1).capitalize()} {tag}')
+         for _ in range(authors or max(books // 10, 1))),
+        batch_size=batch_size,
+    )
+    author_ids = list(Author.objects.filter(last_name__endswith=f' {tag}').values_list('pk', flat=True))
+
+    for start in range(0, books, batch_size):
+        Book.objects.bulk_create(
+            Book(title=text(2, 5).capitalize(), summary=text(15, 30), isbn=f'{tag}{num:07d}',
+                 author_id=rnd.choice(author_ids))
+            for num in range(start, min(start + batch_size, books))
+        )
+        book_ids = Book.objects.filter(isbn__gte=f'{tag}{start:07d}', isbn__startswith=tag)\
+                .order_by('isbn').values_list('pk', flat=True)[:batch_size]
+        Book.genre.through.objects.bulk_create(
+            Book.genre.through(book_id=book_id, genre_id=rnd.choice(genre_ids)) for book_id in book_ids
+        )
+    LibraryStats.rebuild()
+    return words
+
+
+def time_call(func, repeat=10):
+    """Медиана времени (мс) выполнения func()."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def measure_get(client, url, repeat=10):
+    """Запрашивает url repeat раз.
+
+    Возвращает медиану времени ответа (мс), медиану времени SQL (мс) и число запросов к БД.
+    """
+    # Первый запрос прогревает кэши шаблонов и не учитывается
+    client.get(url)
+    timings, sql_timings = [], []
+    for _ in range(repeat):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        sql_timings.append(timer.duration * 1000)
+    return statistics.median(timings), statistics.median(sql_timings), timer.count
+
+
+# Параметры запроса для маршрутов blog/urls.py, которым они нужны
+ROUTE_QUERIES = {
+    'search': {'q': 'title'},
+    'autocomplete': {'term': 'la'},
+    'catalog-export': {'format': 'csv'},
+}
+
+
+def route_kwargs(name, book, author, copy):
+    """Аргументы reverse() для маршрута blog/urls.py с первичным ключом в адресе."""
+    if name.startswith('author-') and name != 'author-create':
+        return {'pk': author.pk}
+    if name.startswith('book-') and name != 'book-create':
+        return {'pk': book.pk}
+    if name == 'renew-book-librarian':
+        return {'pk': copy.pk}
+    if name == 'autocomplete':
+        return {'index': 'authors'}
+    return {}
+
+
+def percentile(values, pct):
+    """Процентиль pct (0-100) по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * pct / 100) - 1, 0)]
+
+
+def measure_request(request, repeat=10, memory=True, prepare=None):
+    """Выполняет request() repeat раз (после одного прогревочного запроса).
+
+    request возвращает ответ тестового клиента; потоковый ответ читается целиком.
+    Если задан prepare, перед каждым запросом вне замера вызывается prepare(),
+    и его результат передается в request (например, новый клиент для входа).
+    Возвращает словарь со статусом, процентилями времени ответа (мс), медианой
+    числа запросов к БД и медианой пикового объема памяти Python на запрос (КБ,
+    по tracemalloc; замеряется отдельным проходом, чтобы не искажать время).
+    """
+    def arguments():
+        return () if prepare is None else (prepare(),)
+
+    def fetch(*args):
+        resp = request(*args)
+        if resp.streaming:
+            b''.join(resp.streaming_content)
+        return resp
+
+    resp = fetch(*arguments())
+    timings, queries = [], []
+    for _ in range(repeat):
+        args, timer = arguments(), QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            resp = fetch(*args)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(timer.count)
+
+    result = {
+        'status': resp.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': statistics.median_low(queries),
+        'memory_kb': None,
+    }
+    if memory:
+        peaks = []
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                args = arguments()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                fetch(*args)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        result['memory_kb'] = round(statistics.median(peaks) / 1024, 1)
+    return result
@@ -0,0 +1,133 @@
+"""Условные ответы (ETag/Last-Modified) для страниц каталога.
+
+Версия страницы вычисляется одним запросом по столбцу updated_at (для страницы
+объекта - по первичному ключу, для списка - наибольший updated_at по индексу и
+счетчик из LibraryStats, чтобы учитывать удаления без COUNT(*) по всей таблице).
+Если версия совпадает с If-None-Match/If-Modified-Since,
+представление не вызывается: объекты не загружаются, шаблон не отрисовывается.
+
+Версии поддерживаются сигналами (см. blog/signals.py) и BookQuerySet.touch().
+"""
+import functools
+import hashlib
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .models import Author, Book, LibraryStats
+
+
+def book_version(pk):
+    return Book.objects.filter(pk=pk).aggregate(updated_at=Max('updated_at'))
+
+
+def author_version(pk):
+    return Author.objects.filter(pk=pk).aggregate(updated_at=Max('updated_at'))
+
+
+def list_version(model, counter):
+    """Наибольший updated_at модели (по индексу) и число объектов из счетчика LibraryStats."""
+    # Счетчик читается из той же базы, что и список (реплики копируют и LibraryStats),
+    # иначе ETag строился бы по основной базе, а страница - по реплике
+    using = router.db_for_read(model)
+    latest = model.objects.using(using).order_by('-updated_at').values('updated_at')[:1]
+    version = LibraryStats.objects.using(using).filter(pk=LibraryStats.SINGLETON_PK).values(
+        counter, updated_at=Subquery(latest),
+    ).first()
+    if version is None:
+        if using != DEFAULT_DB_ALIAS:
+            # На реплике строку не создать: версия один раз считается по самой таблице
+            return model.objects.using(using).aggregate(updated_at=Max('updated_at'), count=Count('id'))
+        # Строки счетчиков еще нет: она создается один раз, как в LibraryStats.load()
+        LibraryStats.rebuild()
+        return list_version(model, counter)
+    return {'updated_at': version['updated_at'], 'count': version[counter]}
+
+
+def book_list_version():
+    return list_version(Book, 'num_books')
+
+
+def author_list_version():
+    return list_version(Author, 'num_authors')
+
+
+def catalog_etag(version, user):
+    if version['updated_at'] is None:
+        return None
+    # Страницы выводят имя пользователя и ссылки по его правам, поэтому ETag
+    # у каждого пользователя свой.
+    source = repr((sorted(version.items()), user.pk))
+    return hashlib.md5(source.encode(), usedforsecurity=False).hexdigest()
+
+
+def catalog_last_modified(version, user):
+    # If-Modified-Since не различает пользователей, поэтому Last-Modified
+    # отдается только анонимным посетителям.
+    if user.is_authenticated:
+        return None
+    return version['updated_at']
+
+
+def catalog_condition(version_func):
+    """Декоратор класса представления: обрабатывает условные GET/HEAD по версии version_func.
+
+    version_func получает именованные аргументы URL и возвращает словарь с ключом
+    updated_at (None - объекта нет, условная обработка пропускается).
+    """
+    def get_version(request, **kwargs):
+        # condition() вызывает etag_func и last_modified_func по отдельности,
+        # а версия должна вычисляться одним запросом.
+        if not hasattr(request, '_catalog_version'):
+            request._catalog_version = version_func(**kwargs)
+        return request._catalog_version
+
+    def etag(request, *args, **kwargs):
+        return catalog_etag(get_version(request, **kwargs), request.user)
+
+    def last_modified(request, *args, **kwargs):
+        return catalog_last_modified(get_version(request, **kwargs), request.user)
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified), name='get')
+
+
+def async_catalog_condition(version_func):
+    """То же, что catalog_condition, для асинхронного представления-функции.
+
+    Декоратор condition() в Django 4.1 не поддерживает асинхронные представления,
+    поэтому проверка повторяет его логику; версия вычисляется в потоке.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            version = await sync_to_async(version_func)(**kwargs)
+            user = await get_user(request)
+            etag = catalog_etag(version, user)
+            etag = quote_etag(etag) if etag else None
+            last_modified = catalog_last_modified(version, user)
+            last_modified = int(timegm(last_modified.utctimetuple())) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+async def get_user(request):
+    """Загружает request.user в потоке: SimpleLazyObject читает сессию и пользователя синхронно."""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
@@ -0,0 +1 @@
+"""Подключения к базам данных: настройки из окружения, пул соединений и маршрутизация чтений на реплику."""
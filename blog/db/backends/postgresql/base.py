@@ -0,0 +1,11 @@
+"""Бэкенд PostgreSQL (psycopg2) с пулом соединений процесса (см. blog/db/pool.py)."""
+from django.db.backends.postgresql import base
+
+from blog.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def init_reused_connection(self, connection):
+        # Базовый get_new_connection запоминает уровень изоляции соединения в обертке
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
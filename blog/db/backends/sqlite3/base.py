@@ -0,0 +1,9 @@
+"""Бэкенд SQLite с пулом соединений процесса (см. blog/db/pool.py)."""
+from django.db.backends.sqlite3 import base
+
+from blog.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    # Соединения SQLite создаются с check_same_thread=False и могут переходить между потоками
+    pass
@@ -0,0 +1,94 @@
+"""Настройки DATABASES из переменных окружения.
+
+Основная база задается DATABASE_URL (по умолчанию - SQLite в каталоге проекта),
+реплики для чтения каталога (blog/db/routers.py) - DATABASE_REPLICA_URLS через
+запятую (или одна DATABASE_REPLICA_URL) с весами BLOG_DB_REPLICA_WEIGHTS в том же
+порядке, например "3,1" (по умолчанию веса равны). Для всех баз:
+
+- BLOG_DB_CONN_MAX_AGE - время жизни постоянного соединения в секундах (по умолчанию 500);
+- BLOG_DB_CONN_HEALTH_CHECKS - проверять соединение, взятое повторно, перед первым
+  запросом (по умолчанию включено), чтобы разорванное сервером соединение не
+  приводило к ошибке запроса;
+- BLOG_DB_POOL_SIZE - размер пула соединений процесса (blog/db/pool.py; 0 - без пула),
+  BLOG_DB_POOL_TIMEOUT - сколько секунд ждать свободного соединения,
+  BLOG_DB_POOL_MAX_IDLE - через сколько секунд простоя соединение закрывается,
+  BLOG_DB_POOL_CHECK_INTERVAL - после скольких секунд простоя соединение проверяется
+  перед выдачей (при BLOG_DB_CONN_HEALTH_CHECKS; по умолчанию 30).
+
+Модуль импортируется из settings.py, поэтому не обращается к моделям и django.conf.settings.
+"""
+import os
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+# Бэкенды с пулом соединений для стандартных бэкендов Django
+POOLED_ENGINES = {
+    'django.db.backends.sqlite3': 'blog.db.backends.sqlite3',
+    'django.db.backends.postgresql': 'blog.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'blog.db.backends.postgresql',
+}
+
+REPLICA_ALIAS = 'replica'
+
+
+def env_flag(env, name, default):
+    value = env.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def database_config(url, base=None, env=os.environ):
+    """Настройки одной базы: base, дополненные разбором url и параметрами соединений."""
+    config = dict(base or {})
+    if url:
+        config.update(dj_database_url.parse(url))
+    config['CONN_MAX_AGE'] = int(env.get('BLOG_DB_CONN_MAX_AGE', 500))
+    config['CONN_HEALTH_CHECKS'] = env_flag(env, 'BLOG_DB_CONN_HEALTH_CHECKS', True)
+
+    pool_size = int(env.get('BLOG_DB_POOL_SIZE', 0))
+    if pool_size > 0:
+        try:
+            config['ENGINE'] = POOLED_ENGINES[config['ENGINE']]
+        except KeyError:
+            raise ImproperlyConfigured(f'Пул соединений не поддерживается для {config["ENGINE"]}')
+        # Соединение возвращается в пул в конце каждого запроса, а не держится потоком
+        config['CONN_MAX_AGE'] = 0
+        config['POOL'] = {
+            'SIZE': pool_size,
+            'TIMEOUT': float(env.get('BLOG_DB_POOL_TIMEOUT', 10)),
+            'MAX_IDLE': float(env.get('BLOG_DB_POOL_MAX_IDLE', 300)),
+            'CHECK_INTERVAL': float(env.get('BLOG_DB_POOL_CHECK_INTERVAL', 30)),
+        }
+    return config
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def replica_alias(num):
+    """Псевдонимы реплик: replica, replica_2, replica_3, ..."""
+    return REPLICA_ALIAS if num == 1 else f'{REPLICA_ALIAS}_{num}'
+
+
+def databases(default, env=os.environ):
+    """DATABASES: основная база (default, если DATABASE_URL не задан) и реплики, если заданы."""
+    result = {'default': database_config(env.get('DATABASE_URL'), default, env)}
+    replica_urls = _split(env.get('DATABASE_REPLICA_URLS')) or _split(env.get('DATABASE_REPLICA_URL'))
+    for num, url in enumerate(replica_urls, start=1):
+        replica = database_config(url, env=env)
+        # В тестах реплика - то же соединение, что и основная база
+        replica['TEST'] = {'MIRROR': 'default'}
+        result[replica_alias(num)] = replica
+    return result
+
+
+def replica_weights(databases, env=os.environ):
+    """{псевдоним реплики: вес} для BLOG_DATABASE_REPLICAS."""
+    aliases = [alias for alias in databases if alias != 'default']
+    weights = [int(weight) for weight in _split(env.get('BLOG_DB_REPLICA_WEIGHTS'))]
+    if weights and len(weights) != len(aliases):
+        raise ImproperlyConfigured(f'BLOG_DB_REPLICA_WEIGHTS: нужно {len(aliases)} весов, задано {len(weights)}')
+    return dict(zip(aliases, weights or [1] * len(aliases)))
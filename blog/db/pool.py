@@ -0,0 +1,223 @@
+"""Пул соединений с БД внутри процесса.
+
+Django держит по соединению на поток: при CONN_MAX_AGE > 0 каждый поток сервера
+приложений держит свое соединение, даже простаивая, а при CONN_MAX_AGE = 0
+открывает новое на каждый запрос. Бэкенды blog.db.backends.* (см. blog/db/config.py)
+вместо этого берут соединение из пула процесса на время запроса и возвращают его
+после: соединений не больше BLOG_DB_POOL_SIZE, а установка соединения (для
+PostgreSQL - TCP, TLS и аутентификация) происходит только при росте пула.
+
+Если все соединения заняты, запрос ждет освобождения не дольше BLOG_DB_POOL_TIMEOUT
+секунд и затем получает OperationalError. Соединение, которое простаивало в пуле
+дольше BLOG_DB_POOL_CHECK_INTERVAL секунд, при CONN_HEALTH_CHECKS проверяется
+запросом SELECT 1 перед выдачей (только что возвращенное соединение под нагрузкой
+выдается без лишнего запроса); соединение, простоявшее дольше BLOG_DB_POOL_MAX_IDLE,
+закрывается.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Не больше size соединений, из которых свободные хранятся в стеке (LIFO).
+
+    Последнее возвращенное соединение выдается первым, поэтому при спаде нагрузки
+    лишние соединения простаивают и закрываются по max_idle.
+    """
+
+    def __init__(self, size, timeout=10, max_idle=None, check_interval=0):
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.idle = deque()  # (соединение, время возврата)
+        self.in_use = 0
+        self.created = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.condition = threading.Condition()
+
+    def _expire(self, now):
+        expired = []
+        while self.idle and self.max_idle is not None and now - self.idle[0][1] > self.max_idle:
+            expired.append(self.idle.popleft()[0])
+        return expired
+
+    def acquire(self, connect, check=None):
+        """
+        Свободное соединение или новое от connect(). Соединение, простоявшее в пуле
+        не меньше check_interval секунд, выдается, только если проходит check (если он задан).
+
+        Возвращает (соединение, True - если оно взято из пула повторно).
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        expired = []
+        with self.condition:
+            while True:
+                expired.extend(self._expire(time.monotonic()))
+                if self.idle or self.in_use + len(self.idle) < self.size:
+                    connection, released_at = self.idle.pop() if self.idle else (None, None)
+                    self.in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise OperationalError(
+                        f'Пул соединений исчерпан: все {self.size} соединений заняты дольше {self.timeout} с'
+                    )
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                self.condition.wait(remaining)
+        for stale in expired:
+            _close_quietly(stale)
+
+        try:
+            if (connection is not None and check is not None
+                    and time.monotonic() - released_at >= self.check_interval and not check(connection)):
+                _close_quietly(connection)
+                connection = None
+            if connection is not None:
+                return connection, True
+            connection = connect()
+        except BaseException:
+            self._give_back()
+            raise
+        with self.condition:
+            self.created += 1
+        return connection, False
+
+    def _give_back(self):
+        with self.condition:
+            self.in_use -= 1
+            self.condition.notify()
+
+    def release(self, connection, discard=False):
+        """Возвращает соединение в пул (discard=True - закрывает его)."""
+        if discard:
+            _close_quietly(connection)
+            self._give_back()
+            return
+        with self.condition:
+            self.in_use -= 1
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close(self):
+        """Закрывает свободные соединения (занятые закроются при возврате, если пул не нужен)."""
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'created': self.created,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """Пул процесса для базы alias с параметрами соединения conn_params.
+
+    Параметры входят в ключ, чтобы тестовая база (другое имя БД) не получила
+    соединения, открытые к рабочей.
+    """
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                max_idle=options.get('MAX_IDLE'),
+                check_interval=options.get('CHECK_INTERVAL', 0),
+            )
+        return pool
+
+
+def pool_stats():
+    """{alias: состояние пула} по всем пулам процесса (для /metrics/)."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    stats = {}
+    for (alias, _), pool in pools:
+        current = pool.stats()
+        if alias in stats:
+            current = {name: stats[alias][name] + value for name, value in current.items()}
+        stats[alias] = current
+    return stats
+
+
+@atexit.register
+def close_pools():
+    """Закрывает свободные соединения всех пулов и забывает пулы."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class PooledDatabaseWrapperMixin:
+    """Примесь к DatabaseWrapper: соединение берется из пула и возвращается в него вместо закрытия."""
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get('POOL') or {})
+        check = self.connection_is_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        connection, reused = self.pool.acquire(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params), check,
+        )
+        if reused:
+            self.init_reused_connection(connection)
+        return connection
+
+    def init_reused_connection(self, connection):
+        """Восстанавливает состояние обертки, которое задает get_new_connection бэкенда."""
+
+    def connection_is_usable(self, connection):
+        """is_usable() для соединения, еще не назначенного self.connection."""
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        try:
+            # Незавершенная транзакция не должна достаться следующему запросу
+            connection.rollback()
+        except self.Database.Error:
+            discard = True
+        else:
+            discard = self.errors_occurred and not self.connection_is_usable(connection)
+        self.pool.release(connection, discard=discard)
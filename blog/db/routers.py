@@ -0,0 +1,176 @@
+"""Чтение каталога с реплик и привязка к основной базе после записи.
+
+Чтения книг, авторов, жанров и языков (REPLICATED_MODELS) в GET- и HEAD-запросах
+идут на реплики BLOG_DATABASE_REPLICAS ({псевдоним: вес}). Реплика выбирается
+один раз на запрос, чтобы страница (и ее ETag) строилась по одному снимку
+данных: по кругу с учетом весов (BLOG_DATABASE_REPLICA_SELECTION='round_robin',
+по умолчанию) или случайно с вероятностью по весу ('random').
+
+Чтобы пользователь видел свои изменения (read-your-writes), основная база
+используется:
+
+- во всех запросах с методами, изменяющими данные (POST и т. п.);
+- в оставшейся части запроса после первой записи в модели приложения blog;
+- в течение BLOG_DATABASE_PIN_SECONDS секунд после запроса с изменяющим методом,
+  записавшего в модели blog: ответ ставит cookie BLOG_DATABASE_PIN_COOKIE, поэтому,
+  например, карточка книги сразу после BookCreate или список выдач после продления
+  читаются из основной базы. Служебные записи GET-запросов (счетчики посещений,
+  пересчет LibraryStats) клиента не привязывают, иначе с реплик читали бы только
+  анонимные посетители.
+
+Вне запросов (команды, задачи, тесты без клиента) и без настроенных реплик все
+запросы идут в основную базу.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICATED_MODELS = {'blog.author', 'blog.book', 'blog.book_genre', 'blog.genre', 'blog.language'}
+
+# Запись в модели этих приложений привязывает клиента к основной базе
+PINNING_APPS = {'blog'}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+def replicas():
+    """{псевдоним реплики: вес}; список псевдонимов означает равные веса."""
+    aliases = getattr(settings, 'BLOG_DATABASE_REPLICAS', {})
+    if isinstance(aliases, dict):
+        return {alias: weight for alias, weight in aliases.items() if weight > 0}
+    return dict.fromkeys(aliases, 1)
+
+
+def pin_seconds():
+    return getattr(settings, 'BLOG_DATABASE_PIN_SECONDS', 5)
+
+
+def pin_cookie():
+    return getattr(settings, 'BLOG_DATABASE_PIN_COOKIE', 'db_primary')
+
+
+class WeightedRoundRobin:
+    """Плавный взвешенный круговой выбор (как в nginx): при весах 3 и 1 - a, a, b, a, ...
+
+    Реплики с большим весом не выбираются несколько раз подряд без необходимости.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = {}
+
+    def choose(self, weights):
+        total = sum(weights.values())
+        with self.lock:
+            for alias, weight in weights.items():
+                self.current[alias] = self.current.get(alias, 0) + weight
+            alias = max(weights, key=lambda alias: self.current[alias])
+            self.current[alias] -= total
+        return alias
+
+    def reset(self):
+        with self.lock:
+            self.current = {}
+
+
+round_robin = WeightedRoundRobin()
+
+
+def choose_replica(weights):
+    if getattr(settings, 'BLOG_DATABASE_REPLICA_SELECTION', 'round_robin') == 'random':
+        return random.choices(list(weights), weights=list(weights.values()))[0]
+    return round_robin.choose(weights)
+
+
+class RequestRouting:
+    """Состояние маршрутизации одного запроса (общее для потоков sync_to_async)."""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.replica = None
+        self.wrote = False
+
+    def replica_for_read(self):
+        if not self.use_replicas or self.wrote:
+            return None
+        if self.replica is None:
+            weights = replicas()
+            if not weights:
+                return None
+            self.replica = choose_replica(weights)
+        return self.replica
+
+
+class ReplicaRouter:
+    """Маршрутизатор DATABASE_ROUTERS: чтения каталога - на реплику, если запрос не привязан к основной базе."""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.label_lower in REPLICATED_MODELS:
+            return routing.replica_for_read()
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.app_label in PINNING_APPS:
+            routing.wrote = True
+        # Объект, прочитанный с реплики, сохраняется в основную базу
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas():
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        databases = {'default', *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+def _start(request):
+    pinned = request.method not in SAFE_METHODS or pin_cookie() in request.COOKIES
+    return _routing.set(RequestRouting(use_replicas=not pinned))
+
+
+def _finish(token, request, response):
+    routing = _routing.get()
+    _routing.reset(token)
+    if routing.wrote and request.method not in SAFE_METHODS and pin_seconds() > 0:
+        response.set_cookie(pin_cookie(), '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """Включает чтение каталога с реплик на время запроса и ставит cookie привязки после изменяющего запроса."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _start(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _routing.reset(token)
+                raise
+            return _finish(token, request, response)
+    else:
+        def middleware(request):
+            token = _start(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _routing.reset(token)
+                raise
+            return _finish(token, request, response)
+    return middleware
@@ -0,0 +1,100 @@
+"""Потоковая выгрузка каталога в CSV или NDJSON.
+
+Книги читаются через .iterator(chunk_size=...), поэтому на PostgreSQL используется
+серверный курсор, а в памяти одновременно находится не больше одной порции строк.
+
+Для каждой книги выгружается количество экземпляров по статусам, а в NDJSON - еще
+и список экземпляров (id, imprint, status, due_back). Поля книги совпадают с полями
+import_catalog (см. blog/importer.py), поэтому выгрузка обновляет книги при
+повторном импорте, но экземпляры по ней не воссоздаются: import_catalog создает
+copies экземпляров с одним imprint и status из строки.
+"""
+import csv
+import json
+
+from .importer import GENRE_SEPARATOR
+from django.db.models import Prefetch
+
+from .models import Book, BookInstance
+
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+FIELDS = [
+    'isbn', 'title', 'summary', 'author_first_name', 'author_last_name', 'language', 'genres',
+    'copies', 'available', 'on_loan', 'reserved', 'maintenance',
+]
+
+
+def catalog_queryset(with_instances=False):
+    queryset = Book.objects.with_copy_counts()\
+            .select_related('author', 'language')\
+            .prefetch_related('genre')\
+            .order_by('pk')
+    if with_instances:
+        # Один запрос на порцию iterator(), как и для жанров
+        queryset = queryset.prefetch_related(Prefetch(
+            'bookinstance_set',
+            queryset=BookInstance.objects.only('id', 'book', 'imprint', 'status', 'due_back').order_by('id'),
+            to_attr='instances',
+        ))
+    return queryset
+
+
+def iter_books(chunk_size=2000, with_instances=False):
+    """Генератор словарей с данными книг и количеством экземпляров по статусам.
+
+    При with_instances=True в словаре есть и список экземпляров книги.
+    """
+    for book in catalog_queryset(with_instances).iterator(chunk_size=chunk_size):
+        row = {
+            'isbn': book.isbn,
+            'title': book.title,
+            'summary': book.summary,
+            'author_first_name': book.author.first_name if book.author else '',
+            'author_last_name': book.author.last_name if book.author else '',
+            'language': book.language.name if book.language else '',
+            'genres': [genre.name for genre in book.genre.all()],
+            'copies': book.num_copies,
+            'available': book.num_available,
+            'on_loan': book.num_on_loan,
+            'reserved': book.num_reserved,
+            'maintenance': book.num_maintenance,
+        }
+        if with_instances:
+            row['instances'] = [
+                {'id': str(copy.pk), 'imprint': copy.imprint, 'status': copy.status,
+                 'due_back': copy.due_back.isoformat() if copy.due_back else None}
+                for copy in book.instances
+            ]
+        yield row
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку вместо ее сохранения."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        row['genres'] = GENRE_SEPARATOR.join(row['genres'])
+        yield writer.writerow([row[name] for name in FIELDS])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_catalog(fmt, chunk_size=2000):
+    """Генератор строк выгрузки в формате fmt ('csv' или 'ndjson')."""
+    if fmt == 'csv':
+        return iter_csv(iter_books(chunk_size))
+    return iter_ndjson(iter_books(chunk_size, with_instances=True))
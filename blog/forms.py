@@ -1,10 +1,16 @@
-import datetime
+import re
+import uuid
 
 from django import forms
+from django.contrib.auth.models import User
 
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from .loans import ACTIONS, CHECKOUT, validate_renewal_date
+from .models import Book
+from .widgets import IndexAutocompleteSelect, IndexAutocompleteSelectMultiple
+
 
 class RenewBookForm(forms.Form):
     """Форма продления подписки для книги."""
@@ -13,12 +19,56 @@ class RenewBookForm(forms.Form):
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
 
-        # Проверяет, не является ли дата в прошлом.
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
+        # Дата не в прошлом и не дальше 4 недель от сегодняшнего дня (те же правила у пакетных операций).
+        validate_renewal_date(data)
+
+        return data
+
+
+class LoanBatchForm(forms.Form):
+    """Форма пакетной выдачи, возврата или продления списка экземпляров (см. blog/loans.py)."""
+    action = forms.ChoiceField(choices=ACTIONS)
+    copies = forms.CharField(widget=forms.Textarea(attrs={'rows': 10}),
+                             help_text='UUID экземпляров через пробел, запятую или с новой строки.')
+    borrower = forms.CharField(required=False, help_text='Имя пользователя читателя (только для выдачи).')
+    due_back = forms.DateField(required=False, help_text='Срок возврата для выдачи и продления (по умолчанию через 3 недели).')
+
+    def clean_copies(self):
+        values = [value for value in re.split(r'[\s,;]+', self.cleaned_data['copies']) if value]
+        try:
+            return list(dict.fromkeys(uuid.UUID(value) for value in values))
+        except ValueError:
+            raise ValidationError(_('Enter valid copy UUIDs'))
+
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower'].strip()
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise ValidationError(_('Unknown borrower'))
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        if data is not None:
+            validate_renewal_date(data)
+        return data
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == CHECKOUT and 'borrower' in cleaned_data and cleaned_data['borrower'] is None:
+            self.add_error('borrower', _('Borrower is required to check out copies'))
+        return cleaned_data
+
 
-        # Проверяет, находится ли дата в допустимом диапазоне (+4 недели с сегодняшнего дня).
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+class BookForm(forms.ModelForm):
+    """Форма книги, в которой автор и жанры выбираются подсказками при вводе."""
 
-        return data
\ No newline at end of file
+    class Meta:
+        model = Book
+        fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+        widgets = {
+            'author': IndexAutocompleteSelect(Book._meta.get_field('author'), 'authors'),
+            'genre': IndexAutocompleteSelectMultiple(Book._meta.get_field('genre'), 'genres'),
+        }
@@ -0,0 +1,119 @@
+"""Кэш отрисованных фрагментов шаблонов с ключами по версии объекта.
+
+Ключ фрагмента включает имя фрагмента, модель, первичный ключ и updated_at объекта.
+Сигналы из blog/signals.py обновляют updated_at книги при изменении ее экземпляров,
+жанров, языка и автора, а updated_at автора - при изменении его книг, поэтому после
+любого такого изменения фрагмент получает новый ключ, а старая запись вытесняется
+по истечении времени жизни. Явно удалять записи не нужно, и устаревший фрагмент
+не может быть прочитан даже при гонке сохранения и отрисовки.
+
+Используется кэш с псевдонимом 'fragments' (если он настроен), иначе 'default'.
+Счетчики попаданий и промахов хранятся в том же кэше, поэтому на общем бэкенде
+(Redis, Memcached) они суммируются по всем процессам. Чтобы не добавлять к каждому
+чтению фрагмента обращение к кэшу, счетчики копятся в памяти процесса и переносятся
+в кэш, когда накопится BLOG_FRAGMENT_STATS_FLUSH_SIZE событий или пройдет
+BLOG_FRAGMENT_STATS_FLUSH_INTERVAL секунд, а также перед чтением статистики и при
+завершении процесса.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+
+CACHE_ALIAS = 'fragments'
+STATS_KEYS = {'hits': 'fragment-stats:hits', 'misses': 'fragment-stats:misses'}
+
+
+def get_cache():
+    try:
+        return caches[CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def fragment_key(name, obj, vary_on=()):
+    """Ключ фрагмента для объекта или None, если у объекта нет версии."""
+    version = getattr(obj, 'updated_at', None)
+    if obj is None or obj.pk is None or version is None:
+        return None
+    parts = [name, obj._meta.label_lower, str(obj.pk), version.isoformat(), *map(str, vary_on)]
+    return 'fragment:' + ':'.join(parts).replace(' ', '_')
+
+
+class StatsBuffer:
+    """Попадания и промахи, еще не перенесенные в кэш (имя счетчика -> число)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'BLOG_FRAGMENT_STATS_FLUSH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'BLOG_FRAGMENT_STATS_FLUSH_INTERVAL', 10)
+
+    def add(self, name):
+        with self.lock:
+            self.pending[name] = self.pending.get(name, 0) + 1
+            due = (sum(self.pending.values()) >= self.flush_size
+                   or time.monotonic() - self.flushed_at >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Прибавляет накопленные значения к счетчикам в кэше (одно обращение на счетчик)."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        cache = get_cache()
+        for name, count in pending.items():
+            try:
+                cache.incr(STATS_KEYS[name], count)
+            except ValueError:
+                # Счетчика еще нет (или он вытеснен); add не затирает значение, созданное параллельно
+                if not cache.add(STATS_KEYS[name], count, timeout=None):
+                    cache.incr(STATS_KEYS[name], count)
+
+    def reset(self):
+        with self.lock:
+            self.pending = {}
+            self.flushed_at = time.monotonic()
+
+
+stats_buffer = StatsBuffer()
+atexit.register(stats_buffer.flush)
+
+
+def _count(name):
+    stats_buffer.add(name)
+
+
+def get_or_render(key, render):
+    """Возвращает фрагмент из кэша или отрисовывает его функцией render и сохраняет."""
+    cache = get_cache()
+    content = cache.get(key)
+    if content is not None:
+        _count('hits')
+        return content
+    _count('misses')
+    content = render()
+    cache.set(key, content)
+    return content
+
+
+def get_stats():
+    stats_buffer.flush()
+    values = get_cache().get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    stats_buffer.reset()
+    get_cache().delete_many(STATS_KEYS.values())
@@ -0,0 +1,145 @@
+"""Очередь заявок на книги (FIFO) и резервирование экземпляров.
+
+Когда у книги есть доступный экземпляр (статус 'a'), он откладывается для первой
+ожидающей заявки: экземпляр получает статус 'r' и читателя, заявка - статус READY.
+Это происходит при подаче заявки, при возврате экземпляра (blog/loans.py) и при
+любом другом переводе экземпляра в статус 'a' (сигнал в blog/signals.py).
+
+Параллельные запросы не могут отдать один экземпляр двоим: и заявка, и экземпляр
+захватываются условным UPDATE ... WHERE status = <ожидаемый статус> (оптимистичная
+блокировка по статусу), и если строку уже изменила другая транзакция, UPDATE
+затрагивает 0 строк, и выбирается следующий кандидат. Такой захват одинаково
+работает на PostgreSQL (конкурирующий UPDATE ждет блокировку строки и
+перепроверяет условие) и на SQLite, где нет SELECT ... FOR UPDATE.
+
+SQLite допускает только одну пишущую транзакцию и при конфликте сразу отвечает
+"database is locked" (транзакция, начавшая с чтения, не может дождаться записи),
+поэтому операции очереди повторяются с небольшой случайной паузой (retry_on_lock).
+"""
+import functools
+import random
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import Book, BookInstance, Hold, LibraryStats
+
+# Сколько кандидатов (заявок или экземпляров) просматривается за одну попытку
+CANDIDATES = 20
+
+# Попытки при блокировке SQLite и наибольшая пауза между ними (в секундах)
+LOCK_RETRIES = 50
+LOCK_RETRY_DELAY = 0.02
+
+
+def retry_on_lock(func):
+    """Повторяет транзакцию func, если SQLite ответила, что база или таблица заблокирована.
+
+    Повтор возможен только вне внешней транзакции: внутри нее ошибка передается вызывающему.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (connection.vendor != 'sqlite' or connection.in_atomic_block
+                        or 'locked' not in str(exc) or attempt == LOCK_RETRIES - 1):
+                    raise
+            time.sleep(random.uniform(0, LOCK_RETRY_DELAY))
+    return wrapper
+
+
+class NoAvailableCopy(Exception):
+    """Заявка захвачена, но свободного экземпляра нет - откатывает захват заявки."""
+
+
+@retry_on_lock
+def place_hold(book, user):
+    """Ставит читателя в очередь на книгу и сразу откладывает экземпляр, если он свободен."""
+    # Одна транзакция, чтобы при повторе после блокировки заявка не создавалась дважды
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                hold = Hold.objects.create(book=book, user=user)
+        except IntegrityError:
+            raise ValidationError(_('The reader already has an active hold on this book'))
+        assign_copies(book.pk)
+        hold.refresh_from_db()
+    return hold
+
+
+@retry_on_lock
+def cancel_hold(hold):
+    """Отменяет заявку; отложенный для нее экземпляр переходит следующей заявке в очереди."""
+    with transaction.atomic():
+        cancelled = Hold.objects.filter(
+            pk=hold.pk, status__in=[Hold.WAITING, Hold.READY],
+        ).update(status=Hold.CANCELLED)
+        if not cancelled:
+            return False
+        if hold.copy_id is not None:
+            released = BookInstance.objects.filter(
+                pk=hold.copy_id, status__exact='r', borrower_id=hold.user_id,
+            ).update(status='a', borrower=None, due_back=None, updated_at=timezone.now())
+            if released:
+                LibraryStats.adjust(num_instances_available=1)
+                # Страница книги и список книг автора выводят статус экземпляра
+                Book.objects.filter(pk=hold.book_id).touch()
+        assign_copies(hold.book_id)
+    return True
+
+
+@retry_on_lock
+def assign_copies(book_id):
+    """Откладывает доступные экземпляры книги для первых заявок ее очереди; возвращает число назначений."""
+    assigned = 0
+    while True:
+        try:
+            hold = _assign_next(book_id)
+        except NoAvailableCopy:
+            break
+        if hold is None:
+            break
+        assigned += 1
+    return assigned
+
+
+def assign_waiting(book_ids):
+    """assign_copies для тех книг из book_ids, у которых есть ожидающие заявки (один запрос на проверку)."""
+    waiting = (
+        Hold.objects.filter(book_id__in=book_ids, status=Hold.WAITING)
+        .order_by().values_list('book_id', flat=True).distinct()
+    )
+    return sum(assign_copies(book_id) for book_id in list(waiting))
+
+
+def _assign_next(book_id):
+    """Захватывает первую ожидающую заявку и свободный экземпляр. None - очередь пуста."""
+    now = timezone.now()
+    with transaction.atomic():
+        for hold in Hold.objects.filter(book_id=book_id, status=Hold.WAITING).order_by('created_at', 'id')[:CANDIDATES]:
+            if Hold.objects.filter(pk=hold.pk, status=Hold.WAITING).update(status=Hold.READY, ready_at=now):
+                break
+        else:
+            return None
+
+        copies = (
+            BookInstance.objects.available_for(book_id)
+            .order_by('imprint', 'id').values_list('pk', flat=True)[:CANDIDATES]
+        )
+        for copy_id in copies:
+            claimed = BookInstance.objects.filter(pk=copy_id, status__exact='a').update(
+                status='r', borrower=hold.user_id, due_back=None, updated_at=now,
+            )
+            if claimed:
+                Hold.objects.filter(pk=hold.pk).update(copy=copy_id)
+                LibraryStats.adjust(num_instances_available=-1)
+                Book.objects.filter(pk=book_id).touch()
+                hold.status, hold.copy_id, hold.ready_at = Hold.READY, copy_id, now
+                return hold
+        # Свободных экземпляров нет: откатывает захват заявки
+        raise NoAvailableCopy
@@ -0,0 +1,308 @@
+"""Массовый импорт каталога из CSV или JSON Lines.
+
+Файл читается потоково, строки обрабатываются пачками: каждая пачка записывается
+через bulk_create/bulk_update в отдельной транзакции, поэтому потребление памяти
+ограничено размером пачки и кэшами авторов, жанров и языков.
+
+Поля строки (заголовок CSV или ключи объекта JSON):
+    isbn, title, summary, author_first_name, author_last_name, language,
+    genres (в CSV через '|', в JSONL - список или строка через '|'),
+    copies (число экземпляров для новой книги, не больше MAX_COPIES), imprint, status.
+"""
+import csv
+import io
+import json
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .autocomplete import index_for_model
+from .models import Author, Book, BookInstance, Genre, Language, LibraryStats
+
+
+GENRE_SEPARATOR = '|'
+LOAN_STATUSES = {code for code, _ in BookInstance.LOAN_STATUS}
+# Экземпляры пачки создаются одним списком, поэтому их число в строке ограничено:
+# иначе одна ошибочная строка (copies=10000000) заняла бы всю память процесса.
+MAX_COPIES = 1000
+# Сколько ключей справочника (например, авторов) держит LookupCache между пачками
+LOOKUP_CACHE_SIZE = 100000
+
+
+class CatalogImportError(ValueError):
+    pass
+
+
+class InvalidLine:
+    """Строка JSON Lines, которую не удалось разобрать; при импорте считается пропущенной."""
+
+    def __init__(self, number, error):
+        self.number = number
+        self.error = error
+
+
+def open_source(path):
+    """Открывает файл для потокового чтения ('-' - стандартный ввод)."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(stream, fmt):
+    """Генератор словарей из CSV или JSON Lines."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                # Одна испорченная строка не должна прерывать импорт на середине
+                yield InvalidLine(number, e)
+    else:
+        raise CatalogImportError(f'Unknown format: {fmt}')
+
+
+def check_length(model, field_name, value):
+    max_length = model._meta.get_field(field_name).max_length
+    if len(value) > max_length:
+        raise CatalogImportError(f'{model.__name__}.{field_name} is longer than {max_length}: {value[:50]}')
+
+
+def detect_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class LookupCache:
+    """Кэш "ключ -> id" для справочной модели, которая дополняется пачками через bulk_create.
+
+    Хранит не больше max_size ключей сверх текущей пачки: давно не встречавшиеся
+    ключи вытесняются (LRU) и при необходимости загружаются из БД заново.
+    """
+
+    def __init__(self, model, key_fields, max_size=LOOKUP_CACHE_SIZE):
+        self.model = model
+        self.key_fields = key_fields
+        self.max_size = max_size
+        self.ids = OrderedDict()
+        self.created = 0
+
+    def _key(self, obj):
+        return tuple(getattr(obj, name) for name in self.key_fields)
+
+    def _load(self, keys):
+        if len(self.key_fields) == 1:
+            lookup = {f'{self.key_fields[0]}__in': [key[0] for key in keys]}
+            queryset = self.model.objects.filter(**lookup)
+        else:
+            # Сужаем выборку по последнему полю (фамилии) и точно сверяем ключи в Python
+            lookup = {f'{self.key_fields[-1]}__in': {key[-1] for key in keys}}
+            queryset = self.model.objects.filter(**lookup)
+        for obj in queryset.order_by('pk'):
+            key = self._key(obj)
+            if key in keys:
+                self.ids.setdefault(key, obj.pk)
+
+    def resolve(self, keys, batch_size):
+        """Гарантирует, что для всех ключей есть id, создавая недостающие записи."""
+        missing = set()
+        for key in keys:
+            if key in self.ids:
+                self.ids.move_to_end(key)
+            else:
+                missing.add(key)
+        # Вытесняются только ключи прошлых пачек: ключи этой пачки - в конце
+        while len(self.ids) > self.max_size and next(iter(self.ids)) not in keys:
+            self.ids.popitem(last=False)
+        if not missing:
+            return
+        self._load(missing)
+        missing = [key for key in missing if key not in self.ids]
+        if missing:
+            self.model.objects.bulk_create(
+                (self.model(**dict(zip(self.key_fields, key))) for key in missing),
+                batch_size=batch_size,
+            )
+            self.created += len(missing)
+            self._load(set(missing))
+
+    def __getitem__(self, key):
+        return self.ids[key]
+
+
+class CatalogImporter:
+    """Импортирует строки каталога с обновлением книг по уникальному ISBN."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.authors = LookupCache(Author, ('first_name', 'last_name'))
+        self.genres = LookupCache(Genre, ('name',))
+        self.languages = LookupCache(Language, ('name',))
+        self.rows = 0
+        self.skipped = 0
+        self.books_created = 0
+        self.books_updated = 0
+        self.copies_created = 0
+
+    @staticmethod
+    def clean_row(row):
+        """Приводит строку к единому виду или возбуждает CatalogImportError."""
+        if isinstance(row, InvalidLine):
+            raise CatalogImportError(f'Line {row.number}: {row.error}')
+        if not isinstance(row, dict):
+            raise CatalogImportError('Row must be an object')
+        isbn = (row.get('isbn') or '').strip()
+        title = (row.get('title') or '').strip()
+        if not isbn or not title:
+            raise CatalogImportError('isbn and title are required')
+
+        genres = row.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(GENRE_SEPARATOR)
+        genres = [name.strip() for name in genres if name.strip()]
+        status = (row.get('status') or 'm').strip()
+        if status not in LOAN_STATUSES:
+            raise CatalogImportError(f'Unknown status: {status}')
+        first_name = (row.get('author_first_name') or '').strip()
+        last_name = (row.get('author_last_name') or '').strip()
+        language = (row.get('language') or '').strip() or None
+        imprint = (row.get('imprint') or '').strip()
+
+        # PostgreSQL отклонил бы всю пачку (DataError), поэтому длины проверяются заранее
+        check_length(Book, 'isbn', isbn)
+        check_length(Book, 'title', title)
+        check_length(Author, 'first_name', first_name)
+        check_length(Author, 'last_name', last_name)
+        check_length(Language, 'name', language or '')
+        check_length(BookInstance, 'imprint', imprint)
+        for name in genres:
+            check_length(Genre, 'name', name)
+        copies = int(row.get('copies') or 0)
+        if not 0 <= copies <= MAX_COPIES:
+            raise CatalogImportError(f'copies must be between 0 and {MAX_COPIES}: {copies}')
+        return {
+            'isbn': isbn,
+            'title': title,
+            'summary': (row.get('summary') or '').strip(),
+            'author': (first_name, last_name) if first_name or last_name else None,
+            'language': language,
+            'genres': genres,
+            'copies': copies,
+            'imprint': imprint,
+            'status': status,
+        }
+
+    def run(self, rows, progress=None):
+        started = time.perf_counter()
+        for batch in batched(rows, self.batch_size):
+            self.import_batch(batch)
+            if progress:
+                progress(self, time.perf_counter() - started)
+        return time.perf_counter() - started
+
+    def import_batch(self, raw_rows):
+        self.rows += len(raw_rows)
+        rows = {}
+        for raw in raw_rows:
+            try:
+                row = self.clean_row(raw)
+            except (ValueError, TypeError, AttributeError):
+                self.skipped += 1
+                continue
+            # Повторный ISBN в пределах пачки: побеждает последняя строка
+            rows[row['isbn']] = row
+        if not rows:
+            return
+
+        with transaction.atomic():
+            self._resolve_lookups(rows.values())
+            book_ids, created_isbns, old_author_ids = self._upsert_books(rows)
+            self._replace_genres(rows, book_ids, created_isbns)
+            copies = self._create_copies(rows, book_ids, created_isbns)
+            # bulk_update не обновляет updated_at и не вызывает сигналы, поэтому версии книг
+            # и авторов (включая прежних авторов книг) и поисковый индекс обновляются явно
+            Book.objects.filter(pk__in=list(book_ids.values())).touch()
+            Author.objects.filter(pk__in=old_author_ids).update(updated_at=timezone.now())
+            search.index_books(book_ids.values())
+            # bulk_create не вызывает сигналы, поэтому счетчики главной страницы обновляются здесь
+            LibraryStats.adjust(
+                num_books=len(created_isbns),
+                num_instances=len(copies),
+                num_instances_available=sum(copy.status == 'a' for copy in copies),
+            )
+
+    def _resolve_lookups(self, rows):
+        authors_before, genres_before = self.authors.created, self.genres.created
+        self.authors.resolve({row['author'] for row in rows if row['author']}, self.batch_size)
+        self.genres.resolve({(name,) for row in rows for name in row['genres']}, self.batch_size)
+        self.languages.resolve({(row['language'],) for row in rows if row['language']}, self.batch_size)
+        LibraryStats.adjust(
+            num_authors=self.authors.created - authors_before,
+            num_genres=self.genres.created - genres_before,
+        )
+        if self.genres.created > genres_before:
+            # У жанров нет updated_at, и индекс подсказок узнает о новых жанрах по версии
+            index_for_model(Genre).invalidate()
+
+    def _book_fields(self, row):
+        return {
+            'title': row['title'],
+            'summary': row['summary'],
+            'author_id': self.authors[row['author']] if row['author'] else None,
+            'language_id': self.languages[(row['language'],)] if row['language'] else None,
+        }
+
+    def _upsert_books(self, rows):
+        existing, old_author_ids = {}, set()
+        for isbn, pk, author_id in Book.objects.filter(isbn__in=list(rows)).values_list('isbn', 'pk', 'author_id'):
+            existing[isbn] = pk
+            old_author_ids.add(author_id)
+        to_update = [Book(pk=pk, **self._book_fields(rows[isbn])) for isbn, pk in existing.items()]
+        if to_update:
+            Book.objects.bulk_update(to_update, ['title', 'summary', 'author_id', 'language_id'],
+                                     batch_size=self.batch_size)
+        created_isbns = [isbn for isbn in rows if isbn not in existing]
+        if created_isbns:
+            Book.objects.bulk_create(
+                (Book(isbn=isbn, **self._book_fields(rows[isbn])) for isbn in created_isbns),
+                batch_size=self.batch_size,
+            )
+            existing.update(Book.objects.filter(isbn__in=created_isbns).values_list('isbn', 'pk'))
+        self.books_updated += len(to_update)
+        self.books_created += len(created_isbns)
+        return existing, set(created_isbns), old_author_ids - {None}
+
+    def _replace_genres(self, rows, book_ids, created_isbns):
+        through = Book.genre.through
+        updated_ids = [book_ids[isbn] for isbn in rows if isbn not in created_isbns]
+        if updated_ids:
+            through.objects.filter(book_id__in=updated_ids).delete()
+        through.objects.bulk_create(
+            (through(book_id=book_ids[isbn], genre_id=self.genres[(name,)])
+             for isbn, row in rows.items() for name in dict.fromkeys(row['genres'])),
+            batch_size=self.batch_size,
+        )
+
+    def _create_copies(self, rows, book_ids, created_isbns):
+        # Экземпляры создаются только для новых книг, чтобы повторный импорт их не дублировал
+        copies = [
+            BookInstance(book_id=book_ids[isbn], imprint=rows[isbn]['imprint'], status=rows[isbn]['status'])
+            for isbn in created_isbns for _ in range(rows[isbn]['copies'])
+        ]
+        BookInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+        self.copies_created += len(copies)
+        return copies
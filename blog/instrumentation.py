@@ -0,0 +1,264 @@
+"""Замеры производительности запросов: SQL, шаблоны, размер ответа.
+
+PerformanceMiddleware для выборки запросов (доля BLOG_METRICS_SAMPLE_RATE)
+подключает к соединениям с БД execute_wrapper, который считает запросы, их
+суммарное время и повторы одного и того же SQL (признак N+1), а шаблонный
+бэкенд InstrumentedDjangoTemplates добавляет время отрисовки шаблонов. Итог
+отдается в заголовке Server-Timing и складывается в скользящую гистограмму
+процесса (окно BLOG_METRICS_WINDOW секунд), которую показывает /metrics/.
+
+Запросы вне выборки стоят одного вызова random(), поэтому при доле выборки
+0.05 накладные расходы остаются в пределах долей процента.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы времени ответа (мс)
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+# Длина слота скользящего окна (секунды)
+SLOT_SECONDS = 60
+
+_PLACEHOLDER_LIST = re.compile(r'(?:%s|\?)(?:\s*,\s*(?:%s|\?))+')
+_SPACES = re.compile(r'\s+')
+
+
+def sample_rate():
+    return getattr(settings, 'BLOG_METRICS_SAMPLE_RATE', 0.05)
+
+
+def duplicate_threshold():
+    return getattr(settings, 'BLOG_METRICS_DUPLICATE_THRESHOLD', 3)
+
+
+def fingerprint(sql):
+    """SQL без различий в длине списков параметров (IN (%s, %s, ...)) и пробелах."""
+    return _SPACES.sub(' ', _PLACEHOLDER_LIST.sub('%s, ...', sql)).strip()[:300]
+
+
+class RequestMetrics:
+    """Замеры одного запроса; объект подключается к соединениям как execute_wrapper."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+        self.wrapped = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+            self.wrapped.append(connection)
+
+    def uninstall(self):
+        for connection in self.wrapped:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+        self.wrapped = []
+
+    @property
+    def duplicates(self):
+        """{SQL: число повторов} для запросов, выполненных не меньше BLOG_METRICS_DUPLICATE_THRESHOLD раз."""
+        threshold = duplicate_threshold()
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+    def server_timing(self, total):
+        timings = [
+            f'total;dur={total * 1000:.1f}',
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        duplicates = self.duplicates
+        if duplicates:
+            timings.append(f'dup;desc="{len(duplicates)} repeated queries"')
+        return ', '.join(timings)
+
+
+class RouteStats:
+    """Накопленные замеры одного маршрута за слот окна."""
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sql_ms = 0.0
+        self.queries = 0
+        self.template_ms = 0.0
+        self.bytes = 0
+        self.duplicates = Counter()
+
+    def add(self, total_ms, metrics, size):
+        self.count += 1
+        self.buckets[next(num for num, bound in enumerate(BUCKETS) if total_ms <= bound)] += 1
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, total_ms)
+        self.sql_ms += metrics.sql_time * 1000
+        self.queries += metrics.queries
+        self.template_ms += metrics.template_time * 1000
+        self.bytes += size or 0
+        self.duplicates.update(metrics.duplicates.keys())
+
+    def merge(self, other):
+        self.count += other.count
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.sql_ms += other.sql_ms
+        self.queries += other.queries
+        self.template_ms += other.template_ms
+        self.bytes += other.bytes
+        self.duplicates.update(other.duplicates)
+
+    def percentile(self, pct):
+        """Верхняя граница корзины, в которую попадает процентиль pct (для последней - max_ms)."""
+        needed = self.count * pct / 100
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= needed:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'p50_ms': round(self.percentile(50), 1),
+            'p95_ms': round(self.percentile(95), 1),
+            'p99_ms': round(self.percentile(99), 1),
+            'max_ms': round(self.max_ms, 1),
+            'mean_ms': round(self.total_ms / count, 1),
+            'sql_ms_mean': round(self.sql_ms / count, 1),
+            'queries_mean': round(self.queries / count, 1),
+            'template_ms_mean': round(self.template_ms / count, 1),
+            'bytes_mean': round(self.bytes / count),
+            'buckets': {('le_inf' if bound == float('inf') else f'le_{bound}'): n
+                        for bound, n in zip(BUCKETS, self.buckets)},
+            # Запросы, которые повторялись в одном ответе: SQL -> число таких ответов
+            'repeated_queries': dict(self.duplicates.most_common(10)),
+        }
+
+
+class RollingHistogram:
+    """Замеры маршрутов за последние window секунд, по слотам SLOT_SECONDS."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}
+
+    @property
+    def window(self):
+        return getattr(settings, 'BLOG_METRICS_WINDOW', 300)
+
+    def _prune(self, now):
+        oldest = int(now // SLOT_SECONDS) - max(self.window // SLOT_SECONDS, 1) + 1
+        for slot in [slot for slot in self.slots if slot < oldest]:
+            del self.slots[slot]
+
+    def record(self, route, total_ms, metrics, size):
+        now = time.time()
+        with self.lock:
+            self._prune(now)
+            routes = self.slots.setdefault(int(now // SLOT_SECONDS), {})
+            routes.setdefault(route, RouteStats()).add(total_ms, metrics, size)
+
+    def snapshot(self):
+        with self.lock:
+            self._prune(time.time())
+            merged = {}
+            for routes in self.slots.values():
+                for route, stats in routes.items():
+                    merged.setdefault(route, RouteStats()).merge(stats)
+        return {route: stats.as_dict() for route, stats in sorted(merged.items())}
+
+    def reset(self):
+        with self.lock:
+            self.slots = {}
+
+
+histogram = RollingHistogram()
+
+
+class PerformanceMiddleware(MiddlewareMixin):
+    """Замеряет выборку запросов и добавляет к ответу заголовок Server-Timing.
+
+    Ставится первым в MIDDLEWARE, чтобы учитывать сессию, аутентификацию и прочие слои.
+    """
+
+    def process_request(self, request):
+        if random.random() >= sample_rate():
+            return None
+        request._performance_metrics = metrics = RequestMetrics()
+        metrics.install()
+        return None
+
+    def process_response(self, request, response):
+        metrics = getattr(request, '_performance_metrics', None)
+        if metrics is None:
+            return response
+        metrics.uninstall()
+        total = time.perf_counter() - metrics.started
+        size = None if response.streaming else len(response.content)
+        response.headers['Server-Timing'] = metrics.server_timing(total)
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unresolved'
+        histogram.record(route, total * 1000, metrics, size)
+        duplicates = metrics.duplicates
+        if duplicates:
+            logger.warning(
+                'Repeated queries in %s (%s): %s', route, request.path,
+                '; '.join(f'{count}x {sql}' for sql, count in duplicates.items()),
+            )
+        return response
+
+
+class InstrumentedTemplate(Template):
+    """Шаблон, добавляющий время отрисовки к замерам запроса (если запрос в выборке)."""
+
+    def render(self, context=None, request=None):
+        metrics = getattr(request, '_performance_metrics', None)
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates, шаблоны которого замеряют время отрисовки."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,137 @@
+"""Кэш сводки "мои книги" (выданные читателю экземпляры) с инвалидацией по изменениям.
+
+Сводка - название книги, срок возврата и признак просрочки для каждого экземпляра,
+выданного читателю, - строится одним запросом при первом обращении и хранится в
+кэше фрагментов (blog/fragments.py) под ключом с версией читателя. Любое изменение
+его выданных экземпляров (сигналы в blog/signals.py, пакетные операции в
+blog/loans.py) увеличивает версию сразу и еще раз после фиксации транзакции, и
+следующий запрос строит сводку заново. Сводка, построенная параллельным запросом
+по данным до фиксации, остается под старой версией и уже не читается.
+
+Признак просрочки вычисляется при чтении, поэтому сводка не устаревает в полночь.
+На локальном кэше (LocMemCache) версия увеличивается только в текущем процессе,
+и другие процессы видят изменения по истечении BLOG_LOAN_SUMMARY_TIMEOUT; для
+нескольких процессов нужен общий кэш (BLOG_FRAGMENT_CACHE_BACKEND).
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from .fragments import get_cache
+from .models import BookInstance
+
+
+class LoanEntry:
+    """Выданный экземпляр в сводке; поля совпадают с используемыми в шаблоне полями BookInstance."""
+    status = 'o'
+
+    def __init__(self, copy_id, book_id, title, due_back, borrower=None):
+        self.id = copy_id
+        self.book_id = book_id
+        self.title = title
+        self.due_back = due_back
+        self.borrower = borrower
+
+    @property
+    def is_overdue(self):
+        return bool(self.due_back and datetime.date.today() > self.due_back)
+
+    def get_book_url(self):
+        return reverse('book-detail', args=[self.book_id]) if self.book_id else None
+
+    def as_dict(self):
+        return {
+            'id': str(self.id),
+            'book': self.book_id,
+            'title': self.title,
+            'url': self.get_book_url(),
+            'due_back': self.due_back.isoformat() if self.due_back else None,
+            'is_overdue': self.is_overdue,
+        }
+
+
+class LoanSummary:
+    """Сводка читателя: строки выдач (по сроку возврата) и ETag содержимого."""
+
+    def __init__(self, rows, digest, borrower=None):
+        self.loans = [LoanEntry(*row, borrower=borrower) for row in rows]
+        self.digest = digest
+
+    @property
+    def etag(self):
+        # Признаки просрочки меняются со сменой даты
+        return f'{self.digest}-{datetime.date.today():%Y%m%d}'
+
+    def as_dict(self):
+        return {
+            'loans': [loan.as_dict() for loan in self.loans],
+            'num_overdue': sum(loan.is_overdue for loan in self.loans),
+        }
+
+
+def summary_timeout():
+    return getattr(settings, 'BLOG_LOAN_SUMMARY_TIMEOUT', 60 * 60)
+
+
+def _version_key(user_id):
+    return f'loan-summary-version:{user_id}'
+
+
+def get_version(user_id, cache=None):
+    cache = cache or get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Новая версия не должна совпасть с вытесненной, поэтому она не начинается с 1
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def build_rows(user_id):
+    """Строки сводки из БД: (id экземпляра, id книги, название, срок возврата)."""
+    return list(
+        BookInstance.objects.filter(borrower_id=user_id, status__exact='o')
+        .order_by('due_back', 'id').values_list('id', 'book_id', 'book__title', 'due_back')
+    )
+
+
+def get_summary(user):
+    """Сводка выдач пользователя из кэша (строится при промахе)."""
+    cache = get_cache()
+    # date_joined отличает читателя от удаленного с тем же id (базы, переиспользующие id)
+    key = f'loan-summary:{user.pk}:{user.date_joined.timestamp()}:{get_version(user.pk, cache)}'
+    cached = cache.get(key)
+    if cached is None:
+        rows = build_rows(user.pk)
+        digest = hashlib.md5(repr(rows).encode(), usedforsecurity=False).hexdigest()
+        cached = (rows, digest)
+        cache.set(key, cached, summary_timeout())
+    return LoanSummary(*cached, borrower=user)
+
+
+def invalidate(user_ids):
+    """Увеличивает версии сводок читателей user_ids."""
+    cache = get_cache()
+    for user_id in set(user_ids) - {None}:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            # Версии нет: при следующем чтении будет создана новая
+            pass
+
+
+def invalidate_on_commit(user_ids):
+    """invalidate() сейчас и еще раз после фиксации текущей транзакции.
+
+    Первый сброс нужен для чтений внутри той же транзакции, второй - для сводки,
+    которую параллельный запрос мог построить по данным до фиксации.
+    """
+    user_ids = set(user_ids) - {None}
+    if user_ids:
+        invalidate(user_ids)
+        transaction.on_commit(lambda: invalidate(user_ids))
@@ -0,0 +1,130 @@
+"""Пакетные операции с экземплярами: выдача, возврат и продление списка экземпляров.
+
+Все экземпляры обрабатываются в одной транзакции: строки блокируются одним
+SELECT ... FOR UPDATE (на PostgreSQL и MySQL; SQLite блокирует всю базу на запись),
+изменения записываются одним bulk_update только полей status, due_back, borrower
+и updated_at. bulk_update не вызывает сигналы, поэтому счетчики LibraryStats и
+версии книг и авторов (см. blog/signals.py) обновляются здесь же, по разу на пакет,
+как и сводки "мои книги" затронутых читателей (blog/loan_summary.py).
+"""
+import datetime
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from . import holds, loan_summary
+from .models import Book, BookInstance, Hold, LibraryStats
+
+CHECKOUT = 'checkout'
+RETURN = 'return'
+RENEW = 'renew'
+
+ACTIONS = (
+    (CHECKOUT, 'Выдать'),
+    (RETURN, 'Принять возврат'),
+    (RENEW, 'Продлить'),
+)
+
+# Статус, в котором экземпляр может участвовать в операции
+REQUIRED_STATUS = {
+    CHECKOUT: 'a',
+    RETURN: 'o',
+    RENEW: 'o',
+}
+
+UPDATE_FIELDS = ['status', 'due_back', 'borrower', 'updated_at']
+
+
+def default_due_date():
+    """Срок возврата по умолчанию - через 3 недели."""
+    return datetime.date.today() + datetime.timedelta(weeks=3)
+
+
+def validate_renewal_date(value):
+    """Правила RenewBookForm: дата не в прошлом и не дальше 4 недель от сегодняшнего дня."""
+    if value < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
+    if value > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+
+
+class LoanBatchResult:
+    """Итог пакетной операции: id измененных экземпляров и причины пропуска остальных."""
+
+    def __init__(self, action):
+        self.action = action
+        self.updated = []
+        self.skipped = {}
+
+    def __repr__(self):
+        return f'<LoanBatchResult {self.action}: {len(self.updated)} updated, {len(self.skipped)} skipped>'
+
+
+@holds.retry_on_lock
+def apply_loans(action, copy_ids, borrower=None, due_back=None, skip_locked=False, batch_size=500):
+    """
+    Выдает (CHECKOUT), принимает (RETURN) или продлевает (RENEW) экземпляры copy_ids.
+
+    Выдача требует читателя borrower. Срок due_back проверяется по правилам
+    RenewBookForm один раз для всего пакета (по умолчанию - через 3 недели).
+    Экземпляры не в том статусе, не найденные или (при skip_locked=True)
+    заблокированные другой транзакцией пропускаются и попадают в result.skipped.
+
+    Отложенный по заявке экземпляр (статус 'r') выдается только читателю заявки,
+    а возвращенные экземпляры сразу откладываются для очереди заявок (blog/holds.py).
+    """
+    if action not in REQUIRED_STATUS:
+        raise ValueError(f'Unknown loan action: {action}')
+    if action == CHECKOUT and borrower is None:
+        raise ValidationError(_('Borrower is required to check out copies'))
+    if action != RETURN:
+        due_back = due_back or default_due_date()
+        validate_renewal_date(due_back)
+
+    result = LoanBatchResult(action)
+    copy_ids = list(dict.fromkeys(uuid.UUID(str(pk)) for pk in copy_ids))
+    with transaction.atomic():
+        copies = list(
+            BookInstance.objects.select_for_update(skip_locked=skip_locked)
+            .filter(pk__in=copy_ids).only('id', 'book_id', 'status', 'due_back', 'borrower_id')
+        )
+        found = {copy.pk for copy in copies}
+        for pk in copy_ids:
+            if pk not in found:
+                result.skipped[pk] = 'not found or locked' if skip_locked else 'not found'
+
+        now = timezone.now()
+        changed, reserved, borrower_ids = [], [], set()
+        for copy in copies:
+            if action == CHECKOUT and copy.status == 'r' and copy.borrower_id == borrower.pk:
+                reserved.append(copy.pk)
+            elif copy.status != REQUIRED_STATUS[action]:
+                result.skipped[copy.pk] = f'status {copy.get_status_display()}'
+                continue
+            borrower_ids.add(copy.borrower_id)
+            if action == CHECKOUT:
+                copy.status, copy.borrower, copy.due_back = 'o', borrower, due_back
+            elif action == RETURN:
+                copy.status, copy.borrower, copy.due_back = 'a', None, None
+            else:
+                copy.due_back = due_back
+            copy.updated_at = now
+            changed.append(copy)
+            result.updated.append(copy.pk)
+
+        if changed:
+            BookInstance.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=batch_size)
+            # Выдача уменьшает число доступных экземпляров (кроме отложенных), возврат - увеличивает
+            available = {CHECKOUT: -1, RETURN: 1, RENEW: 0}[action] * (len(changed) - len(reserved))
+            LibraryStats.adjust(num_instances_available=available)
+            book_ids = {copy.book_id for copy in changed} - {None}
+            Book.objects.filter(pk__in=book_ids).touch()
+            loan_summary.invalidate_on_commit(borrower_ids | {borrower.pk if borrower else None})
+            if reserved:
+                Hold.objects.filter(copy_id__in=reserved, status=Hold.READY).update(status=Hold.FULFILLED)
+            if action == RETURN:
+                holds.assign_waiting(book_ids)
+    return result
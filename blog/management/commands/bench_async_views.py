@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from blog.benchmarks import benchmark_client, rollback, seed_library
+from blog.models import Author, Book
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность (запросов в секунду) синхронных (WSGI) и '
+            'асинхронных (ASGI, BLOG_ASYNC_VIEWS) страниц каталога. Запросы выполняются в '
+            'процессе тестовым клиентом, данные создаются во временной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000, help='Количество книг каталога.')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждую страницу.')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Одновременных запросов к асинхронным страницам.')
+
+    def handle(self, *args, **options):
+        with rollback():
+            seed_library(authors=max(options['books'] // 10, 1), books=options['books'],
+                         copies=options['books'] * 3, users=10)
+            book, author = Book.objects.first(), Author.objects.first()
+            urls = [
+                reverse('index'), reverse('books'), book.get_absolute_url(),
+                reverse('authors'), author.get_absolute_url(),
+            ]
+            self.stdout.write(f'{"url":<24} {"wsgi req/s":>11} {"asgi req/s":>11}')
+            with benchmark_client() as client:
+                for url in urls:
+                    wsgi = self.measure_wsgi(client, url, options['requests'])
+                    # Из синхронного кода: запросы асинхронного ORM выполняются в этом же
+                    # потоке и видят данные незавершенной транзакции rollback()
+                    with override_settings(ROOT_URLCONF='website.urls_async'):
+                        asgi = async_to_sync(self.measure_asgi)(url, options['requests'], options['concurrency'])
+                    self.stdout.write(f'{url:<24} {wsgi:>11.1f} {asgi:>11.1f}')
+
+    @staticmethod
+    def measure_wsgi(client, url, num_requests):
+        # Первый запрос прогревает кэши шаблонов и не учитывается
+        client.get(url)
+        started = time.perf_counter()
+        for _ in range(num_requests):
+            client.get(url)
+        return num_requests / (time.perf_counter() - started)
+
+    @staticmethod
+    async def measure_asgi(url, num_requests, concurrency):
+        client = AsyncClient()
+        await client.get(url)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with semaphore:
+                await client.get(url)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(get() for _ in range(num_requests)))
+        return num_requests / (time.perf_counter() - started)
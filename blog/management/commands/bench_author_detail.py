@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from blog.benchmarks import benchmark_client, measure_get, rollback, seed_author_with_books
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время ответа и число запросов страницы автора в зависимости '
+            'от количества его книг. Данные создаются во временной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Количество книг автора для каждого замера.')
+        parser.add_argument('--copies', type=int, default=3, help='Экземпляров на книгу.')
+        parser.add_argument('--repeat', type=int, default=10, help='Запросов на каждый замер.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"books":>8} {"median ms":>10} {"sql ms":>8} {"queries":>8}')
+        with benchmark_client() as client:
+            for num_books in options['books']:
+                with rollback():
+                    author = seed_author_with_books(num_books, options['copies'])
+                    median, sql, queries = measure_get(client, author.get_absolute_url(), options['repeat'])
+                self.stdout.write(f'{num_books:>8} {median:>10.2f} {sql:>8.2f} {queries:>8}')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.benchmarks import rollback, seed_library, time_call
+from blog.models import BookInstance
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными во временной транзакции и сравнивает '
+            'планы (EXPLAIN) и время запросов списков выдач без индексов BookInstance и с ними.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=100000, help='Количество экземпляров книг.')
+        parser.add_argument('--books', type=int, default=10000, help='Количество книг.')
+        parser.add_argument('--users', type=int, default=500, help='Количество читателей.')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого запроса.')
+        parser.add_argument('--no-explain', action='store_true', help='Не выводить планы запросов.')
+
+    def queries(self, borrower):
+        """Запросы, которые выполняют представления списков выдач и главная страница."""
+        on_loan = BookInstance.objects.filter(status__exact='o')
+        return {
+            'all-borrowed': lambda: on_loan.order_by('due_back', 'id')[:10],
+            'my-borrowed': lambda: on_loan.filter(borrower=borrower).order_by('due_back', 'id')[:10],
+            'available': lambda: BookInstance.objects.filter(status__exact='a').values('pk')[:10],
+        }
+
+    def report(self, label, borrower, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        results = {}
+        for name, make_queryset in self.queries(borrower).items():
+            queryset = make_queryset()
+            results[name] = time_call(lambda: list(queryset.all()), options['repeat'])
+            self.stdout.write(f'  {name:<14} {results[name]:>9.3f} ms')
+            if not options['no_explain']:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f'      {line}')
+        return results
+
+    def handle(self, *args, **options):
+        with rollback():
+            self.stdout.write('Seeding...')
+            users = seed_library(
+                authors=max(options['books'] // 10, 1), books=options['books'],
+                copies=options['copies'], users=options['users'],
+            )
+            borrower = users[0]
+            with connection.cursor() as cursor:
+                # Обновляет статистику планировщика после массовой вставки
+                cursor.execute('ANALYZE')
+
+            after = self.report('With indexes', borrower, options)
+            with connection.cursor() as cursor:
+                # DROP INDEX транзакционен в SQLite и PostgreSQL и будет отменен вместе с данными
+                for index in BookInstance._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                cursor.execute('ANALYZE')
+            before = self.report('Without indexes', borrower, options)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Speedup'))
+        for name in after:
+            self.stdout.write(f'  {name:<14} {before[name] / max(after[name], 1e-6):>8.1f}x')
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog import search
+from blog.benchmarks import rollback, seed_search_catalog
+
+
+class Command(BaseCommand):
+    help = ('Заполняет каталог синтетическими книгами во временной транзакции, строит '
+            'поисковый индекс и измеряет время поисковых запросов разных типов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000000, help='Количество книг.')
+        parser.add_argument('--repeat', type=int, default=20, help='Запросов каждого типа.')
+        parser.add_argument('--limit', type=int, default=20, help='Число результатов запроса.')
+        parser.add_argument('--target-ms', type=float, default=50.0,
+                            help='Целевое время запроса (p95) в миллисекундах.')
+
+    def queries(self, words, repeat):
+        """Запросы каждого типа; слова берутся из разных участков частотного словаря."""
+        frequent, rare = words[:50], words[len(words) // 2:]
+        step = max(len(rare) // repeat, 1)
+        return {
+            'rare word': [rare[num * step] for num in range(repeat)],
+            'frequent word': [frequent[num % len(frequent)] for num in range(repeat)],
+            'two words': [f'{frequent[num % len(frequent)]} {rare[num * step]}' for num in range(repeat)],
+            'typeahead': [rare[num * step][:4] for num in range(repeat)],
+            'word + prefix': [f'{frequent[num % len(frequent)]} {rare[num * step][:4]}' for num in range(repeat)],
+        }
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stderr.write(f'Search index is not supported on {connection.vendor}.')
+            return
+        with rollback():
+            self.stdout.write(f'Seeding {options["books"]} books...')
+            started = time.perf_counter()
+            words = seed_search_catalog(options['books'])
+            self.stdout.write(f'  seeded in {time.perf_counter() - started:.1f} s')
+            started = time.perf_counter()
+            search.rebuild_index()
+            self.stdout.write(f'  indexed in {time.perf_counter() - started:.1f} s')
+
+            self.stdout.write(f'{"query":<14} {"median ms":>10} {"p95 ms":>8} {"hits":>6}')
+            failed = False
+            for name, terms in self.queries(words, options['repeat']).items():
+                timings, hits = [], 0
+                for term in terms:
+                    started = time.perf_counter()
+                    hits += len(search.search_books(term, limit=options['limit']))
+                    timings.append((time.perf_counter() - started) * 1000)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                failed |= p95 > options['target_ms']
+                self.stdout.write(f'{name:<14} {statistics.median(timings):>10.2f} {p95:>8.2f} '
+                                  f'{hits / len(terms):>6.1f}')
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Some queries exceed {options["target_ms"]} ms (p95).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All queries are within {options["target_ms"]} ms (p95).'))
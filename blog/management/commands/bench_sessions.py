@@ -0,0 +1,59 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.benchmarks import QueryTimer, rollback, time_call
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стоимость записи и чтения сессии для каждого SESSION_ENGINE '
+            '(db, cached_db, cache, signed_cookies): медиана времени и число запросов к БД. '
+            'Сессии в БД создаются во временной транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=list(settings.SESSION_ENGINES),
+                            help='Имена из SESSION_ENGINES или пути к модулям.')
+        parser.add_argument('--repeat', type=int, default=200, help='Операций на каждый замер.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"engine":<16} {"create ms":>10} {"write ms":>9} {"read ms":>8} {"write queries":>14}')
+        for name in options['engines']:
+            store_class = import_module(settings.SESSION_ENGINES.get(name, name)).SessionStore
+            with rollback():
+                create, write, read, queries = self.measure(store_class, options['repeat'])
+            self.stdout.write(f'{name:<16} {create:>10.3f} {write:>9.3f} {read:>8.3f} {queries:>14}')
+
+    @staticmethod
+    def measure(store_class, repeat):
+        created = []
+
+        def create():
+            session = store_class()
+            session['num_visits'] = 0
+            session.save()
+            created.append(session.session_key)
+            return session
+
+        # Запись: загрузить существующую сессию, изменить и сохранить, как SessionMiddleware
+        session_key = create().session_key
+
+        def write():
+            session = store_class(session_key)
+            session['num_visits'] = session.get('num_visits', 0) + 1
+            session.save()
+
+        def read():
+            store_class(session_key).get('num_visits')
+
+        create_ms = time_call(create, repeat)
+        write_ms = time_call(write, repeat)
+        read_ms = time_call(read, repeat)
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            write()
+        # Транзакция откатывает только сессии в БД, записи в кэше удаляются явно
+        for key in created:
+            store_class().delete(key)
+        return create_ms, write_ms, read_ms, timer.count
@@ -0,0 +1,137 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from blog import urls as blog_urls
+from blog.benchmarks import (
+    ROUTE_QUERIES, benchmark_client, measure_request, rollback, route_kwargs, seed_library,
+)
+from blog.models import Author, Book, BookInstance
+
+PASSWORD = 'lhbnoFdb49'
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер всех именованных маршрутов blog/urls.py, а также входа, смены '
+            'пароля и выхода: процентили времени ответа (p50/p95/p99), число запросов к БД '
+            'и пиковая память на запрос. Запросы выполняются тестовым клиентом от имени '
+            'библиотекаря на синтетической библиотеке, созданной во временной транзакции. '
+            'Результат выводится в JSON для сравнения между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=100, help='Количество авторов.')
+        parser.add_argument('--books', type=int, default=1000, help='Количество книг.')
+        parser.add_argument('--genres', type=int, default=20, help='Количество жанров.')
+        parser.add_argument('--copies', type=int, default=10000, help='Количество экземпляров.')
+        parser.add_argument('--users', type=int, default=100, help='Количество читателей.')
+        parser.add_argument('--loan-ratio', type=float, default=0.2, help='Доля выданных экземпляров.')
+        parser.add_argument('--repeat', type=int, default=20, help='Запросов на каждый маршрут.')
+        parser.add_argument('--route', action='append', dest='routes', metavar='NAME',
+                            help='Замерить только указанные маршруты (можно повторять).')
+        parser.add_argument('--no-memory', action='store_false', dest='memory',
+                            help='Не замерять память (tracemalloc замедляет прогон).')
+        parser.add_argument('--output', help='Файл для JSON (по умолчанию - стандартный вывод).')
+
+    def handle(self, *args, **options):
+        seed = {name: options[name] for name in ('authors', 'books', 'genres', 'copies', 'users', 'loan_ratio')}
+        with rollback(), benchmark_client() as client:
+            readers = seed_library(**seed)
+            if not readers or not BookInstance.objects.exists():
+                raise CommandError('Нужен хотя бы один читатель и один экземпляр.')
+            librarian = readers[0]
+            librarian.set_password(PASSWORD)
+            librarian.save(update_fields=['password'])
+            librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+            book = Book.objects.order_by('pk').first()
+            author = Author.objects.order_by('pk').first()
+            copy = BookInstance.objects.filter(status__exact='o').order_by('pk').first() or BookInstance.objects.first()
+
+            requests = self.route_requests(client, librarian, book, author, copy) + self.auth_requests(librarian)
+            if options['routes']:
+                unknown = set(options['routes']) - {name for name, *_ in requests}
+                if unknown:
+                    raise CommandError(f'Неизвестные маршруты: {", ".join(sorted(unknown))}')
+                requests = [request for request in requests if request[0] in options['routes']]
+
+            results = []
+            for name, method, url, request, prepare in requests:
+                result = measure_request(request, options['repeat'], options['memory'], prepare)
+                results.append({'name': name, 'method': method, 'url': url, **result})
+                self.stderr.write(f'{method:<5} {url:<48} {result["p50_ms"]:>9.2f} ms {result["queries"]:>4} q')
+
+        report = {'meta': self.meta(seed, options), 'routes': results}
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Результат записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def route_requests(client, librarian, book, author, copy):
+        """GET каждого именованного маршрута blog/urls.py от имени библиотекаря."""
+        client.force_login(librarian)
+        requests = []
+        for pattern in blog_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            url = reverse(pattern.name, kwargs=route_kwargs(pattern.name, book, author, copy))
+            query = ROUTE_QUERIES.get(pattern.name, {})
+            requests.append((
+                pattern.name, 'GET', url,
+                lambda url=url, query=query: client.get(url, query), None,
+            ))
+        return requests
+
+    @staticmethod
+    def auth_requests(librarian):
+        """Страница и отправка формы входа, страница смены пароля и выход.
+
+        Вход и выход выполняются каждый раз новым клиентом, созданным вне замера.
+        """
+        anonymous, member = Client(), Client()
+        member.force_login(librarian)
+        login_url, logout_url = reverse('login'), reverse('logout')
+        password_change_url = reverse('password_change')
+
+        def logged_in_client():
+            client = Client()
+            client.force_login(librarian)
+            return client
+
+        return [
+            ('login', 'GET', login_url, lambda: anonymous.get(login_url), None),
+            ('login', 'POST', login_url,
+             lambda client: client.post(login_url, {'username': librarian.username, 'password': PASSWORD}), Client),
+            ('password_change', 'GET', password_change_url, lambda: member.get(password_change_url), None),
+            ('logout', 'POST', logout_url, lambda client: client.post(logout_url), logged_in_client),
+        ]
+
+    @staticmethod
+    def meta(seed, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': seed,
+        }
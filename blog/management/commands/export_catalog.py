@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.exporter import FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает каталог (книги, авторы, языки, жанры и статусы экземпляров) в CSV или NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help="Путь к файлу или '-' для стандартного вывода.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Строк, читаемых из БД за раз.')
+
+    def handle(self, *args, **options):
+        lines = export_catalog(options['format'], options['chunk_size'])
+        if options['output'] == '-':
+            stream = self.stdout
+            for line in lines:
+                stream.write(line, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                stream.writelines(lines)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blog.fragments import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Выводит счетчики попаданий и промахов кэша фрагментов шаблонов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода.')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f'Hits: {stats["hits"]}, misses: {stats["misses"]}, hit ratio: {ratio:.1%}')
+        if options['reset']:
+            reset_stats()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.importer import CatalogImporter, detect_format, open_source, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Потоково импортирует книги, авторов, жанры, языки и экземпляры из CSV или JSON Lines. '
+            'Книги обновляются по ISBN, запись идет пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу или '-' для стандартного ввода.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Формат файла (по умолчанию определяется по расширению).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк на пачку и транзакцию.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        importer = CatalogImporter(batch_size=options['batch_size'])
+
+        def progress(importer, elapsed):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{importer.rows} rows, {importer.rows / max(elapsed, 1e-9):.0f} rows/s')
+
+        try:
+            with open_source(path) as stream:
+                elapsed = importer.run(read_rows(stream, fmt), progress=progress)
+        except OSError as e:
+            raise CommandError(e)
+        except ValueError as e:
+            # CatalogImportError, а также ошибки чтения файла (например, не UTF-8)
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.rows} rows in {elapsed:.2f}s '
+            f'({importer.rows / max(elapsed, 1e-9):.0f} rows/s): '
+            f'{importer.books_created} books created, {importer.books_updated} updated, '
+            f'{importer.copies_created} copies, {importer.authors.created} authors, '
+            f'{importer.genres.created} genres, {importer.languages.created} languages, '
+            f'{importer.skipped} skipped.'
+        ))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.sessions import prune_expired_sessions, stores_sessions_in_db
+
+
+class Command(BaseCommand):
+    help = ('Удаляет истекшие сессии из БД пачками, каждую в короткой транзакции, вместо одного '
+            'DELETE команды clearsessions. Запускайте регулярно (например, раз в час из cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Сессий в одной пачке.')
+        parser.add_argument('--pause', type=float, default=0.05, help='Пауза между пачками (секунды).')
+        parser.add_argument('--max-batches', type=int, help='Наибольшее число пачек за запуск.')
+
+    def handle(self, *args, **options):
+        if not stores_sessions_in_db():
+            self.stdout.write(f'{settings.SESSION_ENGINE} does not store sessions in the database: nothing to prune.')
+            return
+        deleted = prune_expired_sessions(batch_size=options['batch_size'], pause=options['pause'],
+                                         max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import LibraryStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля счетчики главной страницы (LibraryStats).'
+
+    def handle(self, *args, **options):
+        stats = LibraryStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Books: {stats.num_books}, copies: {stats.num_instances} '
+            f'({stats.num_instances_available} available), '
+            f'authors: {stats.num_authors}, genres: {stats.num_genres}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс каталога (после загрузки данных в обход сигналов).'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from blog.overdue import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = ('Находит выдачи, просроченные после прошлого запуска, и отправляет читателям '
+            'напоминания одним письмом на читателя. Запускайте раз в день (например, из cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Обработать все просроченные выдачи, а не только новые с прошлого запуска.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только вывести сводку: без писем и без сдвига отметки запуска.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Писем в одной пачке отправки.')
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help='Дата проверки в формате ГГГГ-ММ-ДД (по умолчанию сегодня).')
+
+    def handle(self, *args, **options):
+        result = sweep_overdue(today=options['date'], full=options['full'], send=not options['dry_run'],
+                               batch_size=options['batch_size'])
+        since = result.since.isoformat() if result.since else 'start'
+        self.stdout.write(f'Overdue loans due in [{since}, {result.today.isoformat()}): '
+                          f'{result.num_loans} loans, {len(result.summaries)} borrowers')
+        for summary in result.summaries:
+            self.stdout.write(f'  {summary.borrower.username}: {len(summary.loans)} '
+                              f'(oldest due {summary.oldest_due_back.isoformat()})')
+        if options['dry_run']:
+            self.stdout.write('Dry run: no mail sent.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Sent {result.sent} reminders, {result.without_email} borrowers without e-mail.'
+            ))
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.4 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinstance',
+            name='bookinst_borrower_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(condition=models.Q(('status', 'o')), fields=['due_back', 'id'], name='bookinst_on_loan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(condition=models.Q(('status', 'o')), fields=['borrower', 'due_back', 'id'], name='bookinst_borrower_loan_idx'),
+        ),
+    ]
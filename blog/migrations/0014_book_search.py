@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from blog import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # Таблица индекса зависит от СУБД (FTS5 на SQLite, tsvector + GIN на PostgreSQL)
+    # и не описывается моделью, поэтому создается и заполняется через RunPython.
+
+    dependencies = [
+        ('blog', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
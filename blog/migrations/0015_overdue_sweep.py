@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-17 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_book_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('swept_until', models.DateField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('num_loans', models.IntegerField(default=0)),
+                ('num_borrowers', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import date
 
@@ -25,6 +28,53 @@ class Language(models.Model):
         return self.name
 
 
+class GroupConcat(models.Aggregate):
+    """Склеивает значения группы в одну строку (GROUP_CONCAT в SQLite, STRING_AGG в PostgreSQL)."""
+    function = 'GROUP_CONCAT'
+    output_field = models.TextField()
+
+    def __init__(self, expression, separator=', ', **extra):
+        super().__init__(expression, models.Value(separator), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+# Разделитель названий жанров в аннотации genre_names (не встречается в названиях).
+GENRE_NAMES_SEPARATOR = '\x1f'
+
+
+class BookQuerySet(models.QuerySet):
+
+    def with_copy_counts(self):
+        """Добавляет к каждой книге количество экземпляров, в том числе по статусам."""
+        return self.annotate(
+            num_copies=Count('bookinstance'),
+            num_available=Count('bookinstance', filter=Q(bookinstance__status='a')),
+            num_on_loan=Count('bookinstance', filter=Q(bookinstance__status='o')),
+            num_reserved=Count('bookinstance', filter=Q(bookinstance__status='r')),
+            num_maintenance=Count('bookinstance', filter=Q(bookinstance__status='m')),
+        )
+
+    def with_genre_names(self):
+        """Добавляет к каждой книге строку genre_names с названиями ее жанров.
+
+        Коррелированный подзапрос вместо JOIN с GROUP BY, чтобы аннотация
+        сочеталась с with_copy_counts() и не размножала строки.
+        """
+        names = (
+            Genre.objects.filter(book=OuterRef('pk')).order_by().values('book')
+            .annotate(names=GroupConcat('name', separator=GENRE_NAMES_SEPARATOR)).values('names')
+        )
+        return self.annotate(genre_names=Subquery(names, output_field=models.TextField()))
+
+    def touch(self):
+        """Обновляет updated_at у выбранных книг и их авторов (страница автора выводит его книги)."""
+        now = timezone.now()
+        Author.objects.filter(pk__in=self.values('author_id')).update(updated_at=now)
+        return self.update(updated_at=now)
+
+
 class Book(models.Model):
     """Модель, представляющая книгу (но не конкретный экземпляр книги)."""
     title = models.CharField(max_length=200)
@@ -43,12 +93,36 @@ class Book(models.Model):
 
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
 
+    # Версия для условных запросов (ETag/Last-Modified); обновляется и при изменении
+    # экземпляров, жанров, автора и языка книги (см. blog/signals.py).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = BookQuerySet.as_manager()
+
     class Meta:
         ordering = ['title', 'author']
+        indexes = [
+            # Соответствует порядку постраничного вывода по ключу в BookListView
+            models.Index(fields=['title', 'author', 'id'], name='book_title_author_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминает автора из БД, чтобы при смене автора обновить версии обоих.
+        instance._loaded_author_id = instance.__dict__.get('author_id', models.DEFERRED)
+        return instance
 
     def display_genre(self):
         """Создайте строку для Жанра. Это необходимо для отображения жанра в Admin."""
-        return ', '.join([genre.name for genre in self.genre.all()[:3]])
+        # Без лишних запросов, если жанры уже получены with_genre_names() или prefetch_related('genre')
+        if hasattr(self, 'genre_names'):
+            names = self.genre_names.split(GENRE_NAMES_SEPARATOR) if self.genre_names else []
+        elif 'genre' in getattr(self, '_prefetched_objects_cache', {}):
+            names = [genre.name for genre in self.genre.all()]
+        else:
+            names = [genre.name for genre in self.genre.all()[:3]]
+        return ', '.join(names[:3])
 
     display_genre.short_description = 'Genre'
 
@@ -61,6 +135,28 @@ class Book(models.Model):
         return self.title
 
 
+class BookInstanceQuerySet(models.QuerySet):
+
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def available_for(self, book_id):
+        return self.filter(book_id=book_id, status__exact='a')
+
+    def overdue(self, today=None, since=None):
+        """
+        Выданные экземпляры, срок возврата которых прошел (due_back < today).
+
+        since ограничивает выборку снизу (due_back >= since) - экземпляры, просроченные
+        после прошлой проверки. Оба условия - диапазон по частичному индексу
+        bookinst_on_loan_idx (due_back, id) только по выданным экземплярам.
+        """
+        queryset = self.on_loan().filter(due_back__lt=today or date.today())
+        if since is not None:
+            queryset = queryset.filter(due_back__gte=since)
+        return queryset
+
+
 class BookInstance(models.Model):
     """Модель, представляющая определенный экземпляр книги 
     (т.е. который можно взять в библиотеке)."""
@@ -69,6 +165,9 @@ class BookInstance(models.Model):
     imprint = models.CharField(max_length=200)
     due_back = models.DateField(null=True, blank=True)
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookInstanceQuerySet.as_manager()
 
     @property
     def is_overdue(self):
@@ -93,6 +192,25 @@ class BookInstance(models.Model):
     class Meta:
         ordering = ['due_back']
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            # Выборки по любому статусу (например, доступные экземпляры), сортировка по due_back
+            models.Index(fields=['status', 'due_back', 'id'], name='bookinst_status_due_idx'),
+            # Частичные индексы только по выданным экземплярам для списков выдач:
+            # они намного меньше полных, так как выдана лишь часть фонда.
+            models.Index(fields=['due_back', 'id'], name='bookinst_on_loan_idx',
+                         condition=Q(status='o')),
+            models.Index(fields=['borrower', 'due_back', 'id'], name='bookinst_borrower_loan_idx',
+                         condition=Q(status='o')),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминает статус, читателя и книгу из БД, чтобы сигналы могли отследить их изменение.
+        instance._loaded_status = instance.__dict__.get('status', models.DEFERRED)
+        instance._loaded_borrower_id = instance.__dict__.get('borrower_id', models.DEFERRED)
+        instance._loaded_book_id = instance.__dict__.get('book_id', models.DEFERRED)
+        return instance
 
     def __str__(self):
         """Строка для представления объекта модели."""
@@ -105,9 +223,14 @@ class Author(models.Model):
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+    # Обновляется и при изменении книг автора и их экземпляров (см. blog/signals.py).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_idx'),
+        ]
 
     def get_absolute_url(self):
         """Возвращает URL-адрес для доступа к конкретному экземпляру автора."""
@@ -115,4 +238,132 @@ class Author(models.Model):
 
     def __str__(self):
         """Строка для представления объекта модели."""
-        return f'{self.last_name}, {self.first_name}'
\ No newline at end of file
+        return f'{self.last_name}, {self.first_name}'
+
+
+class LibraryStats(models.Model):
+    """Денормализованные счетчики для главной страницы.
+
+    Хранится одна строка (pk=1), которая обновляется инкрементально из сигналов
+    (см. blog/signals.py) и может быть пересчитана командой rebuild_library_stats.
+    """
+    SINGLETON_PK = 1
+
+    num_books = models.IntegerField(default=0)
+    num_instances = models.IntegerField(default=0)
+    num_instances_available = models.IntegerField(default=0)
+    num_authors = models.IntegerField(default=0)
+    num_genres = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'library stats'
+
+    @classmethod
+    def load(cls):
+        """Возвращает счетчики одним запросом по первичному ключу (пересчитывает их, если строки еще нет)."""
+        try:
+            return cls.objects.get(pk=cls.SINGLETON_PK)
+        except cls.DoesNotExist:
+            return cls.rebuild()
+
+    @classmethod
+    async def aload(cls):
+        """Асинхронный load() для ASGI-представлений."""
+        try:
+            return await cls.objects.aget(pk=cls.SINGLETON_PK)
+        except cls.DoesNotExist:
+            return await sync_to_async(cls.rebuild)()
+
+    @classmethod
+    def rebuild(cls):
+        """Пересчитывает все счетчики с нуля."""
+        with transaction.atomic():
+            # Счетчики читаются из основной базы: отставшая реплика записала бы в нее старые значения
+            stats, _ = cls.objects.update_or_create(
+                pk=cls.SINGLETON_PK,
+                defaults={
+                    'num_books': Book.objects.using('default').count(),
+                    'num_instances': BookInstance.objects.using('default').count(),
+                    'num_instances_available': BookInstance.objects.using('default').filter(status__exact='a').count(),
+                    'num_authors': Author.objects.using('default').count(),
+                    'num_genres': Genre.objects.using('default').count(),
+                },
+            )
+        return stats
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """Атомарно изменяет счетчики на заданные величины (например, num_books=1)."""
+        changes = {name: F(name) + delta for name, delta in deltas.items() if delta}
+        if changes:
+            # Если строки еще нет, load() позже пересчитает ее целиком.
+            cls.objects.filter(pk=cls.SINGLETON_PK).update(**changes)
+
+    def __str__(self):
+        """Строка для представления объекта модели."""
+        return f'{self.num_books} books, {self.num_instances} copies'
+
+
+class OverdueSweep(models.Model):
+    """Отметка последнего запуска sweep_overdue (одна строка, pk=1).
+
+    Все выданные экземпляры с due_back < swept_until уже обработаны, поэтому
+    следующий запуск выбирает только диапазон [swept_until, сегодня).
+    """
+    SINGLETON_PK = 1
+
+    swept_until = models.DateField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    num_loans = models.IntegerField(default=0)
+    num_borrowers = models.IntegerField(default=0)
+
+    @classmethod
+    def load(cls):
+        sweep, _ = cls.objects.get_or_create(pk=cls.SINGLETON_PK)
+        return sweep
+
+
+class Hold(models.Model):
+    """Заявка читателя на книгу. Заявки на одну книгу образуют очередь FIFO (см. blog/holds.py)."""
+    WAITING = 'w'
+    READY = 'r'
+    FULFILLED = 'f'
+    CANCELLED = 'c'
+
+    HOLD_STATUS = (
+        (WAITING, 'Waiting'),
+        (READY, 'Ready for pickup'),
+        (FULFILLED, 'Fulfilled'),
+        (CANCELLED, 'Cancelled'),
+    )
+
+    book = models.ForeignKey('Book', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Экземпляр, отложенный для читателя (статус 'r' у экземпляра)
+    copy = models.ForeignKey('BookInstance', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Голова очереди книги: только ожидающие заявки в порядке подачи
+            models.Index(fields=['book', 'created_at', 'id'], name='hold_queue_idx', condition=Q(status='w')),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'user'], condition=Q(status__in=['w', 'r']),
+                                    name='hold_one_active_per_user'),
+        ]
+
+    def __str__(self):
+        return f'{self.book} - {self.user} ({self.get_status_display()})'
+
+
+class VisitCount(models.Model):
+    """Число посещений главной страницы пользователем.
+
+    Посещения копятся в памяти процесса и записываются пачками (см. blog/visits.py).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    count = models.IntegerField(default=0)
@@ -0,0 +1,124 @@
+"""Поиск просроченных выдач и рассылка напоминаний читателям.
+
+Просроченные экземпляры выбираются одним запросом-диапазоном по due_back
+(BookInstance.objects.overdue()), а не проверкой is_overdue у каждой выдачи.
+Проверка инкрементальная: OverdueSweep.swept_until хранит дату, до которой
+выдачи уже обработаны, поэтому каждый запуск видит только выдачи, срок которых
+истек после прошлого запуска. Письма группируются по читателю и отправляются
+пачками через одно соединение EMAIL_BACKEND.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BookInstance, OverdueSweep
+
+
+class BorrowerSummary:
+    """Просроченные экземпляры одного читателя."""
+
+    def __init__(self, borrower):
+        self.borrower = borrower
+        self.loans = []
+
+    @property
+    def oldest_due_back(self):
+        return min(loan.due_back for loan in self.loans)
+
+    def message(self, today, from_email=None):
+        lines = [
+            f'Здравствуйте, {self.borrower.get_full_name() or self.borrower.username}!',
+            '',
+            'Срок возврата этих книг истек:',
+        ]
+        lines += [
+            f'- {loan.book.title if loan.book else loan.imprint} (до {loan.due_back:%d.%m.%Y}, '
+            f'просрочено дней: {(today - loan.due_back).days})'
+            for loan in self.loans
+        ]
+        return EmailMessage(
+            subject=f'Просроченные книги: {len(self.loans)}',
+            body='\n'.join(lines),
+            from_email=from_email,
+            to=[self.borrower.email],
+        )
+
+
+class SweepResult:
+    """Итог проверки: диапазон дат, сводки по читателям и число отправленных писем."""
+
+    def __init__(self, since, today):
+        self.since = since
+        self.today = today
+        self.summaries = []
+        self.sent = 0
+        self.without_email = 0
+
+    @property
+    def num_loans(self):
+        return sum(len(summary.loans) for summary in self.summaries)
+
+
+def collect_overdue(today, since=None, chunk_size=2000):
+    """Сводки по читателям для выдач, просроченных в диапазоне [since, today)."""
+    summaries = {}
+    queryset = (
+        BookInstance.objects.overdue(today=today, since=since)
+        .select_related('book', 'borrower')
+        .only('id', 'imprint', 'due_back', 'status', 'book__title', 'borrower__username', 'borrower__email',
+              'borrower__first_name', 'borrower__last_name')
+        # Порядок частичного индекса bookinst_on_loan_idx: выборка без сортировки
+        .order_by('due_back', 'id')
+    )
+    for loan in queryset.iterator(chunk_size=chunk_size):
+        if loan.borrower is None:
+            continue
+        summary = summaries.get(loan.borrower_id)
+        if summary is None:
+            summary = summaries[loan.borrower_id] = BorrowerSummary(loan.borrower)
+        summary.loans.append(loan)
+    return sorted(summaries.values(), key=lambda summary: (summary.oldest_due_back, summary.borrower.pk))
+
+
+def send_reminders(summaries, today, batch_size=100, connection=None):
+    """Отправляет напоминания пачками по batch_size писем; возвращает (отправлено, без адреса)."""
+    connection = connection or get_connection()
+    from_email = getattr(settings, 'BLOG_OVERDUE_FROM_EMAIL', None)
+    messages = [summary.message(today, from_email) for summary in summaries if summary.borrower.email]
+    sent = 0
+    for start in range(0, len(messages), batch_size):
+        sent += connection.send_messages(messages[start:start + batch_size]) or 0
+    return sent, len(summaries) - len(messages)
+
+
+def sweep_overdue(today=None, full=False, send=True, batch_size=100):
+    """
+    Находит выдачи, просроченные с прошлого запуска (или все при full=True),
+    сдвигает отметку OverdueSweep.swept_until на today и рассылает напоминания.
+    При send=False (пробный запуск) письма не отправляются и отметка не меняется.
+
+    Блокировка отметки держится только на время выборки и сдвига отметки: письма
+    отправляются после фиксации транзакции, поэтому медленный SMTP не держит
+    транзакцию открытой, а параллельный запуск не отправит те же напоминания
+    повторно. Если отправка прервется, эти выдачи попадут только в запуск с --full.
+    """
+    today = today or datetime.date.today()
+    with transaction.atomic():
+        sweep = OverdueSweep.objects.select_for_update().get_or_create(pk=OverdueSweep.SINGLETON_PK)[0]
+        since = None if full else sweep.swept_until
+        result = SweepResult(since, today)
+        if since is not None and since >= today:
+            return result
+        result.summaries = collect_overdue(today, since)
+        if not send:
+            return result
+        sweep.swept_until = max(today, sweep.swept_until or today)
+        sweep.finished_at = timezone.now()
+        sweep.num_loans = result.num_loans
+        sweep.num_borrowers = len(result.summaries)
+        sweep.save()
+    result.sent, result.without_email = send_reminders(result.summaries, today, batch_size=batch_size)
+    return result
@@ -0,0 +1,194 @@
+"""Постраничный вывод по ключу (keyset/seek pagination).
+
+В отличие от стандартного Paginator, страница выбирается условием WHERE по
+столбцам сортировки последней записи предыдущей страницы, а не OFFSET, и общее
+количество записей (COUNT(*)) не запрашивается. Поэтому время загрузки страницы
+не зависит от ее номера, если для сортировки есть подходящий индекс.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.translation import gettext as _
+from rest_framework.pagination import CursorPagination
+
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class KeysetPage:
+    """Страница, совместимая с Page в той мере, в какой ее использует base_generic.html."""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginator по ключу сортировки.
+
+    ordering - последовательность имен полей модели (с '-' для убывания), которая
+    должна однозначно упорядочивать записи, поэтому последним обычно идет 'id'.
+    Поля должны принадлежать самой модели: сортировать по полям через JOIN нельзя.
+    """
+    keyset = True
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        opts = queryset.model._meta
+        self.fields = [opts.get_field(name) for name, _ in self.ordering]
+
+    def page(self, cursor=None):
+        """Возвращает страницу после (или перед) позицией, закодированной в cursor."""
+        direction, values = self.decode_cursor(cursor) if cursor else (FORWARD, None)
+        forward = direction == FORWARD
+
+        queryset = self.queryset.order_by(*self._order_by(forward))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more if forward else values is not None:
+                next_cursor = self.encode_cursor(FORWARD, rows[-1])
+            if has_more if not forward else values is not None:
+                previous_cursor = self.encode_cursor(BACKWARD, rows[0])
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+    def _order_by(self, forward):
+        for name, descending in self.ordering:
+            yield F(name).desc() if descending != (not forward) else F(name).asc()
+
+    def _seek(self, values, forward):
+        """Условие "строго после values" в порядке сортировки страницы.
+
+        Строится как (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., с учетом того,
+        где база данных размещает NULL при сортировке.
+        """
+        nulls_largest = connections[self.queryset.db].features.nulls_order_largest
+        condition = Q()
+        equal_prefix = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            # Поле отсортировано по возрастанию в порядке текущей выборки
+            ascending = descending != forward
+            beyond = self._beyond(name, value, ascending, nulls_largest)
+            if beyond is not None:
+                condition |= equal_prefix & beyond
+            equal_prefix &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        if not condition:
+            # Позиция последняя в порядке сортировки - после нее записей нет
+            return Q(pk__in=[])
+
+        # Избыточное условие на первый столбец позволяет базе использовать диапазон индекса
+        name, descending = self.ordering[0]
+        first = values[0]
+        if first is not None:
+            lookup = 'lte' if descending == forward else 'gte'
+            leading = Q(**{f'{name}__{lookup}': first})
+            if nulls_largest == (lookup == 'gte'):
+                leading |= Q(**{f'{name}__isnull': True})
+            condition &= leading
+        return condition
+
+    @staticmethod
+    def _beyond(name, value, ascending, nulls_largest):
+        """Условие "name строго больше value" для ascending=True (меньше - для False)."""
+        if value is None:
+            if nulls_largest == ascending:
+                return None
+            return Q(**{f'{name}__isnull': False})
+        condition = Q(**{f'{name}__{"gt" if ascending else "lt"}': value})
+        if nulls_largest == ascending:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def encode_cursor(self, direction, obj):
+        values = [getattr(obj, field.attname) for field in self.fields]
+        payload = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(payload)
+            if direction not in (FORWARD, BACKWARD) or len(values) != len(self.fields):
+                raise ValueError
+            values = [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor(_('Invalid cursor'))
+        return direction, values
+
+
+class KeysetPaginationMixin:
+    """Примесь для ListView: при BLOG_KEYSET_PAGINATION = True страницы выбираются
+    по ключу keyset_ordering и параметру ?cursor= вместо ?page=."""
+    keyset_ordering = ('id',)
+
+    def keyset_pagination_enabled(self):
+        return getattr(settings, 'BLOG_KEYSET_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_pagination_enabled():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Курсорная пагинация REST API по полю view.cursor_ordering (по умолчанию по id).
+
+    Страницы выбираются условием по ключу, без OFFSET и без COUNT(*), поэтому
+    стоимость запроса не зависит от глубины страницы.
+    """
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
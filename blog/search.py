@@ -0,0 +1,252 @@
+"""Полнотекстовый поиск по каталогу.
+
+Поисковый индекс хранится в отдельной таблице и содержит для каждой книги
+название, ISBN, имя автора, названия жанров и описание:
+
+* на PostgreSQL - таблица blog_book_search со столбцом tsvector и GIN-индексом;
+* на SQLite - виртуальная таблица FTS5 blog_book_fts (rowid = id книги).
+
+Таблицы создаются миграцией 0014_book_search, а строки обновляются сигналами
+(см. blog/signals.py) и массовым импортом. Последнее слово запроса ищется по
+префиксу, поэтому тот же поиск подходит для подсказок при вводе.
+
+На остальных СУБД индекс не ведется, и поиск выполняется через icontains.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+
+SEARCH_LIMIT = 100
+MAX_TERMS = 8
+# Релевантность вычисляется не больше чем для стольких совпадений на этап поиска.
+# Частые слова встречаются в сотнях тысяч книг, и ранжирование всех совпадений в
+# базе (bm25(), ts_rank() с ORDER BY) занимает сотни миллисекунд, а выборка первых
+# совпадений из индекса прерывается досрочно.
+SEARCH_CANDIDATES = 500
+
+# Длины префиксов, для которых FTS5 хранит отдельные индексы. Без них запрос
+# "слово"* объединяет списки документов всех слов с этим префиксом целиком, что для
+# частых слов на 1 млн книг занимает до сотни миллисекунд. Более длинные префиксы
+# встречаются у редких слов и обрабатываются без отдельного индекса.
+FTS_PREFIX_LENGTHS = '2 3 4 5 6 7 8'
+
+FTS_TABLE = 'blog_book_fts'
+PG_TABLE = 'blog_book_search'
+
+# Веса столбцов FTS5 при ранжировании; слово, найденное только в описании, весит 1.
+# Встроенная функция bm25() не используется: для вычисления IDF она читает полный
+# список документов каждого слова, и запрос с частым словом на 1 млн книг занимает
+# сотни миллисекунд даже при ограничении числа совпадений.
+FTS_WEIGHTS = {'title': 10.0, 'isbn': 10.0, 'author': 5.0, 'genres': 3.0}
+SUMMARY_WEIGHT = 1.0
+
+# Кандидаты выбираются одним запросом из двух частей, каждая не больше SEARCH_CANDIDATES:
+# совпадения в названии, ISBN и имени автора (столбцы FTS5 и веса A, B tsvector) и
+# совпадения по всем полям. Поэтому тысячи книг со словом в описании не вытесняют
+# книгу с ним в названии, а остальные совпадения дополняют список.
+PRIMARY_COLUMNS = ('title', 'isbn', 'author')
+PRIMARY_WEIGHTS = 'AB'
+
+FTS_DOCUMENTS = f'''
+    INSERT INTO {FTS_TABLE} (rowid, title, isbn, author, genres, summary)
+    SELECT b.id, b.title, b.isbn,
+           COALESCE(a.first_name || ' ' || a.last_name, ''),
+           COALESCE((SELECT group_concat(g.name, ' ') FROM blog_book_genre bg
+                     JOIN blog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''),
+           b.summary
+    FROM blog_book b LEFT JOIN blog_author a ON a.id = b.author_id
+'''
+
+PG_DOCUMENTS = f'''
+    INSERT INTO {PG_TABLE} (book_id, document)
+    SELECT b.id,
+           setweight(to_tsvector(%(config)s::regconfig, b.title || ' ' || b.isbn), 'A') ||
+           setweight(to_tsvector(%(config)s::regconfig,
+                                 COALESCE(a.first_name || ' ' || a.last_name, '')), 'B') ||
+           setweight(to_tsvector(%(config)s::regconfig,
+                                 COALESCE((SELECT string_agg(g.name, ' ') FROM blog_book_genre bg
+                                           JOIN blog_genre g ON g.id = bg.genre_id
+                                           WHERE bg.book_id = b.id), '')), 'C') ||
+           setweight(to_tsvector(%(config)s::regconfig, b.summary), 'D')
+    FROM blog_book b LEFT JOIN blog_author a ON a.id = b.author_id
+'''
+
+
+def search_config():
+    """Конфигурация текстового поиска PostgreSQL (по умолчанию 'simple', без стемминга)."""
+    return getattr(settings, 'BLOG_SEARCH_CONFIG', 'simple')
+
+
+def vendor(conn=None):
+    return (conn or connection).vendor
+
+
+def create_index(conn):
+    """Создает таблицу поискового индекса и заполняет ее по всем книгам."""
+    with conn.cursor() as cursor:
+        if vendor(conn) == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                "title, isbn, author, genres, summary, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '{FTS_PREFIX_LENGTHS}')"
+            )
+            cursor.execute(FTS_DOCUMENTS)
+        elif vendor(conn) == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE {PG_TABLE} ('
+                'book_id bigint PRIMARY KEY REFERENCES blog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX {PG_TABLE}_document_idx ON {PG_TABLE} USING gin (document)')
+            cursor.execute(PG_DOCUMENTS, {'config': search_config()})
+
+
+def drop_index(conn):
+    with conn.cursor() as cursor:
+        if vendor(conn) == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif vendor(conn) == 'postgresql':
+            cursor.execute(f'DROP TABLE IF EXISTS {PG_TABLE}')
+
+
+def index_books(book_ids):
+    """Перестраивает строки индекса для книг book_ids (удаленные книги из индекса убираются)."""
+    book_ids = [int(pk) for pk in book_ids]
+    if not book_ids or vendor() not in ('sqlite', 'postgresql'):
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        if vendor() == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+            cursor.execute(f'{FTS_DOCUMENTS} WHERE b.id IN ({placeholders})', book_ids)
+        else:
+            cursor.execute(
+                f'{PG_DOCUMENTS} WHERE b.id = ANY(%(ids)s) '
+                'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+                {'config': search_config(), 'ids': book_ids},
+            )
+
+
+def remove_books(book_ids):
+    book_ids = [int(pk) for pk in book_ids]
+    # На PostgreSQL строки удаляются каскадно вместе с книгой
+    if book_ids and vendor() == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(book_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+
+
+def rebuild_index():
+    """Перестраивает индекс целиком (например, после массовой загрузки в обход сигналов)."""
+    with connection.cursor() as cursor:
+        if vendor() == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(FTS_DOCUMENTS)
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif vendor() == 'postgresql':
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+            cursor.execute(PG_DOCUMENTS, {'config': search_config()})
+            cursor.execute(f'ANALYZE {PG_TABLE}')
+
+
+def parse_terms(query):
+    """Слова запроса в нижнем регистре (не больше MAX_TERMS)."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def fts_score(terms, columns):
+    """
+    Релевантность: сумма по словам запроса веса лучшего столбца, в котором слово найдено.
+
+    Слово ищется как начало слова в столбце (строковой операцией, без разбиения на слова),
+    поэтому оценка приблизительна, но вычисляется за микросекунды.
+    """
+    values = [' ' + (value or '').lower() for value in columns]
+    score = 0.0
+    for term in terms:
+        needle = ' ' + term
+        score += max((weight for weight, value in zip(FTS_WEIGHTS.values(), values) if needle in value),
+                     default=SUMMARY_WEIGHT)
+    return score
+
+
+def _top(hits, limit):
+    return sorted(hits.items(), key=lambda hit: (-hit[1], hit[0]))[:limit]
+
+
+def search_books(query, limit=SEARCH_LIMIT, prefix=True):
+    """
+    Список пар (id книги, релевантность), упорядоченный по убыванию релевантности.
+
+    Все слова запроса должны встречаться в книге; при prefix=True последнее слово
+    может быть началом слова (для подсказок при вводе).
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return []
+    if vendor() == 'sqlite':
+        return _search_sqlite(terms, limit, prefix)
+    if vendor() == 'postgresql':
+        return _search_postgresql(terms, limit, prefix)
+    return _search_fallback(terms, limit)
+
+
+def _search_sqlite(terms, limit, prefix):
+    match = ' '.join(f'"{term}"' for term in terms) + ('*' if prefix else '')
+    stage = (f'SELECT * FROM (SELECT rowid, {", ".join(FTS_WEIGHTS)} FROM {FTS_TABLE} '
+             f'WHERE {FTS_TABLE} MATCH %s LIMIT %s)')
+    hits = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{stage} UNION ALL {stage}',
+            [f'{{{" ".join(PRIMARY_COLUMNS)}}} : ({match})', SEARCH_CANDIDATES, match, SEARCH_CANDIDATES],
+        )
+        for pk, *columns in cursor.fetchall():
+            if pk not in hits:
+                hits[pk] = fts_score(terms, columns)
+    return _top(hits, limit)
+
+
+def _search_postgresql(terms, limit, prefix):
+    suffix = ':*' if prefix else ''
+    primary = ' & '.join(f'{term}{suffix if num == len(terms) - 1 else ":"}{PRIMARY_WEIGHTS}'
+                         for num, term in enumerate(terms))
+    stage = (f'(SELECT book_id, document, query FROM {PG_TABLE}, to_tsquery(%s::regconfig, %s) query '
+             f'WHERE document @@ query LIMIT %s)')
+    hits = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT book_id, ts_rank_cd(document, query) AS rank FROM ({stage} UNION ALL {stage}) candidates',
+            [search_config(), primary, SEARCH_CANDIDATES, search_config(), ' & '.join(terms) + suffix,
+             SEARCH_CANDIDATES],
+        )
+        for pk, rank in cursor.fetchall():
+            hits.setdefault(pk, float(rank))
+    return _top(hits, limit)
+
+
+def _search_fallback(terms, limit):
+    condition = Q()
+    for term in terms:
+        condition &= (Q(title__icontains=term) | Q(summary__icontains=term) | Q(isbn__icontains=term)
+                      | Q(author__first_name__icontains=term) | Q(author__last_name__icontains=term)
+                      | Q(genre__name__icontains=term))
+    ids = Book.objects.filter(condition).distinct().order_by('title', 'id').values_list('pk', flat=True)
+    return [(pk, 0.0) for pk in ids[:limit]]
+
+
+def ranked_books(queryset, query, limit=SEARCH_LIMIT, prefix=True):
+    """Книги из queryset, найденные по запросу, в порядке релевантности (с атрибутом rank)."""
+    hits = search_books(query, limit, prefix)
+    books = queryset.in_bulk([pk for pk, _ in hits])
+    result = []
+    for pk, rank in hits:
+        if pk in books:
+            books[pk].rank = rank
+            result.append(books[pk])
+    return result
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
 
+from .models import Author, Book, BookInstance, Genre, Language
+
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
@@ -11,4 +13,84 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
 class GroupSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Group
-        fields = ['url', 'name']
\ No newline at end of file
+        fields = ['url', 'name']
+
+
+def requested_fields(request):
+    """Имена полей из параметра ?fields=a,b,c (None, если параметр не задан)."""
+    if request is None:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля, перечисленные в ?fields=."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class AuthorSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Author
+        fields = ['id', 'first_name', 'last_name']
+
+
+class BookSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ['id', 'title']
+
+
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = AuthorSummarySerializer(read_only=True)
+    language = serializers.StringRelatedField()
+    genres = serializers.StringRelatedField(source='genre', many=True)
+    copies = serializers.IntegerField(source='num_copies', read_only=True)
+    available = serializers.IntegerField(source='num_available', read_only=True)
+
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'summary', 'isbn', 'author', 'language', 'genres', 'copies', 'available']
+
+
+class BookSearchSerializer(BookSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['rank']
+
+
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    books = serializers.PrimaryKeyRelatedField(source='book_set', many=True, read_only=True)
+
+    class Meta:
+        model = Author
+        fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death', 'books']
+
+
+class BookInstanceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    book = BookSummarySerializer(read_only=True)
+
+    class Meta:
+        model = BookInstance
+        fields = ['id', 'book', 'imprint', 'status', 'due_back']
+
+
+class GenreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Genre
+        fields = ['id', 'name']
+
+
+class LanguageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Language
+        fields = ['id', 'name']
@@ -0,0 +1,54 @@
+"""Удаление истекших сессий пачками.
+
+Встроенная команда clearsessions удаляет все истекшие строки django_session
+одним DELETE, который на большой таблице надолго блокирует ее (на SQLite - всю
+базу). prune_expired_sessions удаляет их пачками по batch_size строк, каждую в
+своей короткой транзакции, выбирая ключи по индексу expire_date.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def stores_sessions_in_db(store=None):
+    """True, если сессии текущего SESSION_ENGINE хранятся в БД (db, cached_db)."""
+    store = store or session_store()
+    return hasattr(store, 'get_model_class')
+
+
+def prune_expired_sessions(batch_size=1000, pause=0, max_batches=None, now=None):
+    """
+    Удаляет сессии, истекшие к моменту now, пачками по batch_size.
+
+    Между пачками выдерживается пауза pause секунд, чтобы не мешать записи сессий
+    из запросов. Возвращает число удаленных сессий.
+    """
+    store = session_store()
+    if not stores_sessions_in_db(store):
+        # Кэш сам удаляет истекшие записи, подписанные cookie на сервере не хранятся
+        return 0
+    model = store.get_model_class()
+    now = now or timezone.now()
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            keys = list(
+                model.objects.filter(expire_date__lt=now)
+                .order_by('expire_date').values_list('pk', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            deleted += model.objects.filter(pk__in=keys, expire_date__lt=now).delete()[0]
+        batches += 1
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
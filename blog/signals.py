@@ -0,0 +1,294 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import auth_backends, holds, loan_summary, search
+from .autocomplete import index_for_model
+from .models import Author, Book, BookInstance, Genre, Language, LibraryStats
+
+
+# Счетчик в LibraryStats для каждой модели, количество которой выводится на главной странице.
+COUNTER_FIELDS = {
+    Book: 'num_books',
+    Author: 'num_authors',
+    Genre: 'num_genres',
+}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def increment_counter(sender, instance, created, **kwargs):
+    """Увеличивает счетчик при создании книги, автора или жанра."""
+    if created:
+        LibraryStats.adjust(**{COUNTER_FIELDS[sender]: 1})
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def decrement_counter(sender, instance, **kwargs):
+    """Уменьшает счетчик при удалении книги, автора или жанра."""
+    LibraryStats.adjust(**{COUNTER_FIELDS[sender]: -1})
+
+
+@receiver(post_save, sender=BookInstance)
+def assign_copy_to_holds(sender, instance, created, **kwargs):
+    """Откладывает экземпляр, ставший доступным, для очереди заявок на книгу (после фиксации транзакции).
+
+    Регистрируется раньше update_instance_counters, который перезаписывает _loaded_status.
+    """
+    if instance.status != 'a' or instance.book_id is None:
+        return
+    if not created and getattr(instance, '_loaded_status', None) == 'a':
+        return
+    book_id = instance.book_id
+    transaction.on_commit(lambda: holds.assign_waiting([book_id]))
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_loan_summaries(sender, instance, **kwargs):
+    """Сбрасывает сводки "мои книги" (blog/loan_summary.py) текущего и прежнего читателя,
+    если экземпляр выдан или был выдан.
+
+    Регистрируется раньше update_instance_counters, который перезаписывает _loaded_status.
+    """
+    old_status = getattr(instance, '_loaded_status', None)
+    if instance.status == 'o' or old_status in ('o', DEFERRED):
+        old_borrower_id = getattr(instance, '_loaded_borrower_id', None)
+        loan_summary.invalidate_on_commit({instance.borrower_id, old_borrower_id} - {DEFERRED})
+    instance._loaded_borrower_id = instance.borrower_id
+
+
+# Поля экземпляра, прежние значения которых нужны сигналам ниже (см. BookInstance.from_db)
+TRACKED_INSTANCE_FIELDS = {'status': '_loaded_status', 'borrower_id': '_loaded_borrower_id',
+                           'book_id': '_loaded_book_id'}
+
+
+@receiver(pre_save, sender=BookInstance)
+@receiver(pre_delete, sender=BookInstance)
+def load_deferred_fields(sender, instance, **kwargs):
+    """Читает прежние статус, читателя и книгу экземпляра, загруженного без них (.only()/.defer()),
+    одним запросом по pk."""
+    deferred = [field for field, attr in TRACKED_INSTANCE_FIELDS.items()
+                if getattr(instance, attr, None) is DEFERRED]
+    if not deferred:
+        return
+    values = BookInstance.objects.filter(pk=instance.pk).values(*deferred).first() or {}
+    for field in deferred:
+        setattr(instance, TRACKED_INSTANCE_FIELDS[field], values.get(field))
+        if field not in instance.__dict__:
+            # Поле не менялось; без этого обращение к нему загрузило бы его еще раз
+            setattr(instance, field, values.get(field))
+
+
+@receiver(post_save, sender=BookInstance)
+def update_instance_counters(sender, instance, created, **kwargs):
+    """Обновляет счетчики экземпляров с учетом смены статуса."""
+    if created:
+        LibraryStats.adjust(num_instances=1, num_instances_available=int(instance.status == 'a'))
+    else:
+        old_status = getattr(instance, '_loaded_status', None)
+        LibraryStats.adjust(num_instances_available=int(instance.status == 'a') - int(old_status == 'a'))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=BookInstance)
+def decrement_instance_counters(sender, instance, **kwargs):
+    """Уменьшает счетчики экземпляров при удалении."""
+    status = getattr(instance, '_loaded_status', None)
+    if status is None:
+        status = instance.status
+    LibraryStats.adjust(num_instances=-1, num_instances_available=-int(status == 'a'))
+
+
+# Версии (updated_at) для условных запросов. Страница книги выводит ее экземпляры,
+# жанры, язык и автора, а страница автора - его книги с количеством экземпляров,
+# поэтому изменение любой из этих записей обновляет версии зависимых страниц.
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_book_of_instance(sender, instance, **kwargs):
+    """Обновляет версию книги (и ее автора) при изменении экземпляра, а при переносе - и прежней книги."""
+    book_ids = {instance.book_id, getattr(instance, '_loaded_book_id', None)} - {None, DEFERRED}
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).touch()
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def touch_author_of_book(sender, instance, **kwargs):
+    """Обновляет версию автора книги, а при смене автора - и прежнего автора."""
+    author_ids = {instance.author_id, getattr(instance, '_loaded_author_id', None)} - {None, DEFERRED}
+    if author_ids:
+        Author.objects.filter(pk__in=author_ids).update(updated_at=timezone.now())
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_save, sender=Book)
+def invalidate_loan_summaries_of_book(sender, instance, created, **kwargs):
+    """Сбрасывает сводки читателей, которым выданы экземпляры книги: в сводке ее название."""
+    if not created:
+        loan_summary.invalidate_on_commit(
+            BookInstance.objects.filter(book=instance, status__exact='o')
+            .order_by().values_list('borrower_id', flat=True).distinct()
+        )
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_books_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновляет версии книг при изменении их жанров с любой стороны связи."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        Book.objects.filter(pk=instance.pk).touch()
+    elif action == 'pre_clear':
+        instance.book_set.all().touch()
+    else:
+        Book.objects.filter(pk__in=pk_set).touch()
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def touch_books_of_author(sender, instance, **kwargs):
+    """Обновляет версии книг автора: его имя выводится в списке книг и на странице книги."""
+    if not kwargs.get('created'):
+        Book.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Genre)
+@receiver(pre_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(pre_delete, sender=Language)
+def touch_books_of_genre_or_language(sender, instance, **kwargs):
+    """Обновляет версии книг, на страницах которых выводится название жанра или языка."""
+    if not kwargs.get('created'):
+        books = Book.objects.filter(genre=instance) if sender is Genre else Book.objects.filter(language=instance)
+        books.touch()
+
+
+# Поисковый индекс (blog/search.py) хранит название, ISBN и описание книги,
+# имя ее автора и названия жанров.
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    """Переиндексирует книгу после сохранения."""
+    search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    """Убирает удаленную книгу из поискового индекса."""
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_books_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Переиндексирует книги при изменении их жанров с любой стороны связи."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(instance._search_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_books_of_author_or_genre(sender, instance, created, **kwargs):
+    """Переиндексирует книги после переименования их автора или жанра."""
+    if not created:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_books_of_author_or_genre(sender, instance, **kwargs):
+    """Запоминает книги удаляемого автора или жанра: после удаления связи с ними уже обнулены."""
+    instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_books_of_deleted_author_or_genre(sender, instance, **kwargs):
+    """Переиндексирует книги удаленного автора или жанра."""
+    search.index_books(instance._search_book_ids)
+
+
+# Индексы подсказок при вводе (blog/autocomplete.py) хранятся в памяти процесса,
+# поэтому обновляются только после фиксации транзакции.
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Genre)
+def update_autocomplete_index(sender, instance, **kwargs):
+    """Добавляет или обновляет объект в индексе подсказок."""
+    index = index_for_model(sender)
+    transaction.on_commit(lambda: index.add(instance))
+    if not index.versioned:
+        # Другие процессы не найдут изменение по updated_at
+        _invalidate_now_and_on_commit(index)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Genre)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    """Убирает удаленный объект из индекса подсказок."""
+    pk = instance.pk
+    index = index_for_model(sender)
+    transaction.on_commit(lambda: index.discard(pk))
+    _invalidate_now_and_on_commit(index)
+
+
+def _invalidate_now_and_on_commit(index):
+    # Второй сброс после фиксации - для индекса, построенного другим процессом до нее
+    index.invalidate()
+    transaction.on_commit(index.invalidate)
+
+
+# Снимки разрешений пользователей (blog/auth_backends.py).
+
+@receiver(post_save, sender=User)
+def invalidate_permissions_of_user(sender, instance, created, update_fields=None, **kwargs):
+    """Сбрасывает снимок разрешений пользователя: могли измениться is_active или is_superuser."""
+    # Вход в систему сохраняет только last_login, разрешения от этого не меняются
+    if not created and update_fields != frozenset({'last_login'}):
+        auth_backends.invalidate_users([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_permissions_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает снимки при изменении разрешений или групп пользователя с любой стороны связи."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        auth_backends.invalidate_users([instance.pk])
+    elif action == 'pre_clear':
+        auth_backends.invalidate_all()
+    else:
+        auth_backends.invalidate_users(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_on_group_change(sender, action, **kwargs):
+    """Сбрасывает все снимки при изменении разрешений группы."""
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        auth_backends.invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permissions_on_group_or_permission_change(sender, **kwargs):
+    """Сбрасывает все снимки при удалении группы или изменении разрешения."""
+    auth_backends.invalidate_all()
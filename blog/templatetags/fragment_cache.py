@@ -0,0 +1,50 @@
+from django import template
+
+from blog.fragments import fragment_key, get_or_render
+
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+
+    def __init__(self, nodelist, name, obj, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = fragment_key(
+            self.name.resolve(context),
+            self.obj.resolve(context),
+            [var.resolve(context) for var in self.vary_on],
+        )
+        if key is None:
+            return self.nodelist.render(context)
+        return get_or_render(key, lambda: self.nodelist.render(context))
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """
+    Кэширует содержимое блока по версии объекта (см. blog/fragments.py).
+
+    Использование::
+
+        {% load fragment_cache %}
+        {% fragment_cache 'book-row' book [vary_on ...] %}
+            .. разметка, зависящая только от book и его связанных объектов ..
+        {% endfragment_cache %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least 2 arguments.")
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from blog.admin import BooksInline, BooksInstanceInline
+from blog.benchmarks import seed_library
+from blog.models import Author, Book, BookInstance, Genre, Language
+
+from .utils import QueryBudgetMixin
+
+
+class AdminQueryTest(QueryBudgetMixin, TestCase):
+    '''Число запросов страниц администратора не зависит от числа строк (10 000 книг и экземпляров).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_library(authors=50, books=10000, copies=10000, users=50)
+        cls.admin = User.objects.create_superuser(username='admin', password='lhbnoFdb49', email='admin@example.com')
+        cls.author = Author.objects.create(first_name='Terry', last_name='Pratchett')
+        cls.language = Language.objects.get(name='Benchmark')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976',
+                                       author=cls.author, language=cls.language)
+        cls.book.genre.add(cls.genre)
+        for num in range(30):
+            BookInstance.objects.create(book=cls.book, imprint=f'Imprint {num}', status='a')
+            Book.objects.create(title=f'Discworld {num}', summary='Disc', isbn=f'DISC{num}',
+                                author=cls.author, language=cls.language)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_book_changelist(self):
+        # сессия, пользователь, два COUNT(*) и страница книг с авторами и жанрами
+        with self.assertMaxQueries(5):
+            resp = self.client.get(reverse('admin:blog_book_changelist'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['cl'].result_list), 100)
+
+        with self.assertMaxQueries(5):
+            resp = self.client.get(reverse('admin:blog_book_changelist'), {'q': '', 'p': 3})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_book_changelist_shows_genres(self):
+        resp = self.client.get(reverse('admin:blog_book_changelist'), {'author__id__exact': self.author.pk})
+        self.assertContains(resp, '<td class="field-display_genre">Fantasy</td>', html=True)
+
+    def test_bookinstance_changelist(self):
+        with self.assertMaxQueries(5):
+            resp = self.client.get(reverse('admin:blog_bookinstance_changelist'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['cl'].result_list), 100)
+
+        resp = self.client.get(reverse('admin:blog_bookinstance_changelist'), {'book__id__exact': self.book.pk})
+        self.assertContains(resp, 'Small Gods')
+
+    def test_author_change_caps_inline(self):
+        # Запросы на строку вставки (выбранные жанры) ограничены max_rows
+        with self.assertMaxQueries(BooksInline.max_rows + 15):
+            resp = self.client.get(reverse('admin:blog_author_change', args=[self.author.pk]))
+        self.assertEqual(resp.status_code, 200)
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual(formset.initial_form_count(), BooksInline.max_rows)
+
+    def test_book_change_caps_inline(self):
+        with self.assertMaxQueries(BooksInstanceInline.max_rows + 15):
+            resp = self.client.get(reverse('admin:blog_book_change', args=[self.book.pk]))
+        self.assertEqual(resp.status_code, 200)
+        formset = resp.context['inline_admin_formsets'][0].formset
+        self.assertEqual(formset.initial_form_count(), BooksInstanceInline.max_rows)
+
+    def test_book_change_saves_capped_inline(self):
+        copies = list(BookInstance.objects.filter(book=self.book).order_by('due_back', 'pk')[:BooksInstanceInline.max_rows])
+        data = {
+            'title': 'Small Gods', 'summary': 'Omnia', 'isbn': '9780552152976', 'author': self.author.pk,
+            'genre': [self.genre.pk], 'language': self.language.pk,
+            'bookinstance_set-TOTAL_FORMS': len(copies), 'bookinstance_set-INITIAL_FORMS': len(copies),
+        }
+        for num, copy in enumerate(copies):
+            data.update({
+                f'bookinstance_set-{num}-id': copy.pk, f'bookinstance_set-{num}-book': self.book.pk,
+                f'bookinstance_set-{num}-imprint': copy.imprint, f'bookinstance_set-{num}-status': 'm',
+            })
+        resp = self.client.post(reverse('admin:blog_book_change', args=[self.book.pk]), data)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(BookInstance.objects.filter(book=self.book, status='m').count(), len(copies))
+        self.assertEqual(BookInstance.objects.filter(book=self.book, status='a').count(), 30 - len(copies))
+
+
+class DisplayGenreTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976')
+        cls.book.genre.add(*(Genre.objects.create(name=name) for name in ('Fantasy', 'Satire', 'Religion', 'Comedy')))
+        Book.objects.create(title='Unsorted', summary='No genres', isbn='UNSORTED')
+
+    def test_annotated_genre_names(self):
+        books = list(Book.objects.with_genre_names())
+        with self.assertNumQueries(0):
+            self.assertEqual([book.display_genre() for book in books], ['Fantasy, Satire, Religion', ''])
+
+    def test_prefetched_and_plain(self):
+        books = list(Book.objects.prefetch_related('genre'))
+        with self.assertNumQueries(0):
+            self.assertEqual(books[0].display_genre(), 'Fantasy, Satire, Religion')
+        self.assertEqual(Book.objects.get(pk=self.book.pk).display_genre(), 'Fantasy, Satire, Religion')
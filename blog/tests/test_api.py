@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from blog.models import Author, Book, BookInstance, Genre, Language
+from blog.tests.utils import QueryBudgetMixin
+
+
+class CatalogApiTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name='Science fiction'), Genre.objects.create(name='Adventure')]
+        for author_num in range(3):
+            author = Author.objects.create(first_name=f'First {author_num}', last_name=f'Last {author_num}')
+            for book_num in range(5):
+                book = Book.objects.create(title=f'Book {author_num}-{book_num}', summary='Summary',
+                                           isbn=f'ISBN{author_num}{book_num}', author=author, language=language)
+                book.genre.set(genres)
+                BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+
+    def test_book_list(self):
+        resp = self.client.get('/api/books/')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNotNone(data['next'])
+        self.assertNotIn('count', data)
+        book = data['results'][0]
+        self.assertEqual(set(book['genres']), {'Science fiction', 'Adventure'})
+        self.assertEqual(book['language'], 'English')
+        self.assertEqual((book['copies'], book['available']), (2, 1))
+        self.assertEqual(set(book['author']), {'id', 'first_name', 'last_name'})
+
+    def test_cursor_walks_all_books(self):
+        url, titles = '/api/books/', []
+        while url:
+            data = self.client.get(url).json()
+            titles += [book['title'] for book in data['results']]
+            url = data['next']
+        self.assertEqual(len(titles), 15)
+        self.assertEqual(len(set(titles)), 15)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        endpoints = {
+            '/api/books/': 2,
+            '/api/authors/': 2,
+            '/api/bookinstances/': 1,
+            '/api/genres/': 1,
+            '/api/languages/': 1,
+        }
+        for url, budget in endpoints.items():
+            with self.subTest(url=url):
+                with self.assertMaxQueries(budget):
+                    resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+
+    def test_sparse_fields(self):
+        with self.assertMaxQueries(1) as queries:
+            resp = self.client.get('/api/books/', {'fields': 'id,title'})
+        self.assertEqual(set(resp.json()['results'][0]), {'id', 'title'})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('summary', sql)
+        self.assertNotIn('blog_author', sql)
+
+    def test_sparse_fields_with_relation(self):
+        with self.assertMaxQueries(1):
+            resp = self.client.get('/api/bookinstances/', {'fields': 'book,status'})
+        item = resp.json()['results'][0]
+        self.assertEqual(set(item), {'book', 'status'})
+        self.assertTrue(item['book']['title'].startswith('Book'))
+
+    def test_book_detail(self):
+        book = Book.objects.first()
+        resp = self.client.get(f'/api/books/{book.pk}/')
+        self.assertEqual(resp.json()['isbn'], book.isbn)
+
+    def test_api_is_read_only(self):
+        resp = self.client.post('/api/genres/', {'name': 'Horror'})
+        self.assertEqual(resp.status_code, 405)
+
+    def test_users_still_require_login(self):
+        self.assertEqual(self.client.get('/api/users/').status_code, 403)
+        User.objects.create_user(username='testuser1', password='lhbnoFdb49')
+        self.client.login(username='testuser1', password='lhbnoFdb49')
+        self.assertEqual(self.client.get('/api/users/').status_code, 200)
@@ -0,0 +1,103 @@
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+
+from blog import async_views, visits
+from blog.models import Author, Book, BookInstance, VisitCount
+
+
+@override_settings(ROOT_URLCONF='website.urls_async', BLOG_VISITS_FLUSH_SIZE=1000, BLOG_VISITS_FLUSH_INTERVAL=3600)
+class AsyncCatalogueViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Terry', last_name='Pratchett')
+        for num in range(13):
+            book = Book.objects.create(title=f'Discworld {num:02}', summary='Summary', isbn=f'978{num:010}',
+                                       author=cls.author)
+            BookInstance.objects.create(book=book, imprint='Corgi', status='a')
+        cls.book = Book.objects.first()
+        cls.user = User.objects.create_user(username='reader', password='lhbnoFdb49')
+
+    def setUp(self):
+        visits.buffer.reset()
+
+    def urls(self):
+        return [
+            reverse('index'), reverse('books'), reverse('books') + '?page=2',
+            self.book.get_absolute_url(), reverse('authors'), self.author.get_absolute_url(),
+        ]
+
+    def test_routes_use_async_views(self):
+        self.assertIs(resolve(reverse('index')).func, async_views.index)
+        self.assertIs(resolve(reverse('books')).func, async_views.book_list)
+        self.assertIs(resolve(self.author.get_absolute_url()).func, async_views.author_detail)
+        self.assertEqual(resolve(reverse('search')).func.view_class.__name__, 'BookSearchView')
+
+    async def test_pages_match_sync_views(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                resp = await self.async_client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                with override_settings(ROOT_URLCONF='website.urls'):
+                    expected = await sync_to_async(self.client.get)(url)
+                self.assertEqual(resp.content.decode(), expected.content.decode())
+                self.assertEqual(resp.get('ETag'), expected.get('ETag'))
+
+    async def test_conditional_get(self):
+        url = self.book.get_absolute_url()
+        resp = await self.async_client.get(url)
+        self.assertIn('ETag', resp)
+        self.assertIn('Last-Modified', resp)
+        # AsyncClient в Django 4.1 принимает заголовки под их HTTP-именами
+        resp = await self.async_client.get(url, **{'If-None-Match': resp['ETag']})
+        self.assertEqual(resp.status_code, 304)
+
+    async def test_not_found(self):
+        for url in (reverse('book-detail', kwargs={'pk': 9999}), reverse('author-detail', kwargs={'pk': 9999}),
+                    reverse('books') + '?page=9', reverse('books') + '?page=x'):
+            with self.subTest(url=url):
+                resp = await self.async_client.get(url)
+                self.assertEqual(resp.status_code, 404)
+
+    async def test_last_page(self):
+        resp = await self.async_client.get(reverse('books') + '?page=last')
+        self.assertEqual(resp.context['page_obj'].number, 2)
+        self.assertEqual(len(resp.context['book_list']), 3)
+
+    @override_settings(BLOG_KEYSET_PAGINATION=True)
+    async def test_keyset_pagination(self):
+        resp = await self.async_client.get(reverse('books'))
+        self.assertTrue(resp.context['is_paginated'])
+        resp = await self.async_client.get(reverse('books'), {'cursor': resp.context['page_obj'].next_cursor})
+        self.assertEqual([book.title for book in resp.context['book_list']],
+                         ['Discworld 10', 'Discworld 11', 'Discworld 12'])
+
+    async def test_index_counts_visits(self):
+        resp = await self.async_client.get(reverse('index'))
+        self.assertIn('public', resp['Cache-Control'])
+        self.assertIsNone(resp.context['num_visits'])
+        self.assertEqual(resp.context['num_books'], 13)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        for expected in range(2):
+            resp = await self.async_client.get(reverse('index'))
+            self.assertEqual(resp.context['num_visits'], expected)
+        self.assertIn('private', resp['Cache-Control'])
+        await sync_to_async(visits.buffer.flush)()
+        self.assertEqual((await VisitCount.objects.aget(user=self.user)).count, 2)
+
+
+class BenchAsyncViewsCommandTest(TestCase):
+
+    def test_command_reports_both_servers(self):
+        out = StringIO()
+        call_command('bench_async_views', books=10, requests=2, concurrency=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('asgi req/s', lines[0])
+        self.assertEqual(len(lines), 6)
+        self.assertFalse(Book.objects.exists())
@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission, User, update_last_login
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from blog.auth_backends import check_local_cache
+from blog.fragments import get_cache
+
+
+class CachedPermissionsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='librarian', password='lhbnoFdb49')
+        cls.permission = Permission.objects.get(codename='can_mark_returned')
+        cls.group = Group.objects.create(name='Librarians')
+
+    def setUp(self):
+        get_cache().clear()
+
+    def has_perm(self, perm='blog.can_mark_returned'):
+        # Новый объект пользователя, как в каждом запросе к сайту
+        return User.objects.get(pk=self.user.pk).has_perm(perm)
+
+    def assert_has_perm(self, expected, perm='blog.can_mark_returned'):
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        self.assertIs(self.has_perm(perm), expected)
+
+    def test_permissions_are_cached_after_warm_up(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(2):
+            self.assertFalse(user.has_perm('blog.can_mark_returned'))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('blog.can_mark_returned'))
+            self.assertFalse(user.has_module_perms('blog'))
+
+    def test_user_permission_changes_invalidate(self):
+        self.assert_has_perm(False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_permissions.add(self.permission)
+        self.assert_has_perm(True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.permission.user_set.remove(self.user)
+        self.assert_has_perm(False)
+
+    def test_group_changes_invalidate(self):
+        self.user.groups.add(self.group)
+        self.assert_has_perm(False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(self.permission)
+        self.assert_has_perm(True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.clear()
+        self.assert_has_perm(False)
+
+        self.user.groups.add(self.group)
+        self.assert_has_perm(True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assert_has_perm(False)
+
+    def test_user_flags_invalidate_but_login_does_not(self):
+        self.user.user_permissions.add(self.permission)
+        self.assert_has_perm(True)
+        update_last_login(None, self.user)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.has_perm())
+
+        self.user.is_active = False
+        self.user.save()
+        self.assert_has_perm(False)
+        self.user.is_active = True
+        self.user.is_superuser = True
+        self.user.save()
+        self.assert_has_perm(True, 'blog.delete_book')
+
+    def test_librarian_page_checks_permissions_without_queries(self):
+        self.user.user_permissions.add(self.permission)
+        self.client.force_login(self.user)
+        self.client.get(reverse('all-borrowed'))
+        # Сессия, пользователь и количество выдач (список пуст)
+        with self.assertNumQueries(3) as queries:
+            resp = self.client.get(reverse('all-borrowed'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(any('auth_permission' in query['sql'] for query in queries.captured_queries))
+
+
+class LocalCacheCheckTest(SimpleTestCase):
+
+    def check(self, workers, timeout):
+        with mock.patch.dict('os.environ', {'WEB_CONCURRENCY': str(workers)}), \
+                override_settings(BLOG_PERMISSION_CACHE_TIMEOUT=timeout):
+            return [warning.id for warning in check_local_cache(None)]
+
+    def test_long_timeout_on_local_cache_with_several_workers(self):
+        self.assertEqual(self.check(workers=4, timeout=300), ['blog.W001'])
+        self.assertEqual(self.check(workers=4, timeout=5), [])
+        self.assertEqual(self.check(workers=1, timeout=300), [])
+
+    @override_settings(CACHES={'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                               'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache(self):
+        self.assertEqual(self.check(workers=4, timeout=300), [])
@@ -0,0 +1,147 @@
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.autocomplete import INDEXES
+from blog.models import Author, Book, Genre, Language
+
+
+class PrefixIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ursula = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.ursa = Author.objects.create(first_name='Ursa', last_name='Major')
+        cls.terry = Author.objects.create(first_name='Terry', last_name='Pratchett')
+        Genre.objects.create(name='Science Fiction')
+
+    def setUp(self):
+        for index in INDEXES.values():
+            index.reset()
+
+    def search(self, name, query):
+        return [text for _, text in INDEXES[name].search(query)]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.search('authors', 'urs'), ['Major, Ursa', 'Le Guin, Ursula'])
+        self.assertEqual(self.search('authors', 'URSULA l'), ['Le Guin, Ursula'])
+        self.assertEqual(self.search('authors', 'pratchett'), ['Pratchett, Terry'])
+        self.assertEqual(self.search('genres', 'fict'), ['Science Fiction'])
+        self.assertEqual(self.search('authors', 'x'), [])
+        self.assertEqual(self.search('authors', ''), [])
+
+    def test_lookups_after_build_do_not_query(self):
+        with self.assertNumQueries(1):
+            INDEXES['authors'].search('urs')
+        with self.assertNumQueries(0):
+            INDEXES['authors'].search('ter')
+
+    def test_signals_update_built_index(self):
+        INDEXES['authors'].search('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.terry.first_name = 'Terence'
+            self.terry.save()
+            author = Author.objects.create(first_name='Ursine', last_name='Bear')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('authors', 'urs'), ['Major, Ursa', 'Bear, Ursine', 'Le Guin, Ursula'])
+            self.assertEqual(self.search('authors', 'terence'), ['Pratchett, Terence'])
+            self.assertEqual(self.search('authors', 'terry'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.delete()
+        self.assertEqual(self.search('authors', 'ursi'), [])
+
+    @override_settings(BLOG_AUTOCOMPLETE_REFRESH=0)
+    def test_refresh_picks_up_changes_from_other_processes(self):
+        INDEXES['authors'].search('a')
+        # update() не вызывает сигналы, как и изменения в другом процессе
+        Author.objects.filter(pk=self.ursa.pk).update(first_name='Ursla', updated_at=timezone.now())
+        self.assertEqual(self.search('authors', 'major'), ['Major, Ursla'])
+        Author.objects.filter(pk=self.terry.pk).delete()
+        self.assertEqual(self.search('authors', 'ter'), [])
+
+    @override_settings(BLOG_AUTOCOMPLETE_REFRESH=0)
+    def test_refresh_checks_version_without_counting(self):
+        self.search('genres', 'a')
+        self.search('authors', 'a')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('genres', 'science'), ['Science Fiction'])
+        # Только выборка по индексу updated_at
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search('authors', 'terry'), ['Pratchett, Terry'])
+
+        # Удаление и добавление не меняют числа жанров, но меняют версию индекса
+        Genre.objects.filter(name='Science Fiction').delete()
+        Genre.objects.create(name='Satire')
+        self.assertEqual(self.search('genres', 'science'), [])
+        self.assertEqual(self.search('genres', 'sat'), ['Satire'])
+
+    def test_book_index(self):
+        book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976', author=self.terry)
+        self.assertEqual(INDEXES['books'].search('small'), [(book.pk, 'Small Gods')])
+        self.assertEqual(INDEXES['books'].search('978055'), [(book.pk, 'Small Gods')])
+
+
+class AutocompleteViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(30):
+            Author.objects.create(first_name=f'Name{num}', last_name=f'Surname{num}')
+        cls.user = User.objects.create_user(username='librarian', password='lhbnoFdb49', is_staff=True)
+        cls.user.user_permissions.add(*Permission.objects.filter(
+            codename__in=['can_mark_returned', 'add_book', 'change_book', 'view_book'],
+        ))
+
+    def setUp(self):
+        for index in INDEXES.values():
+            index.reset()
+
+    def test_select2_response(self):
+        resp = self.client.get(reverse('autocomplete', kwargs={'index': 'authors'}), {'term': 'surname1'})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['pagination'], {'more': False})
+        self.assertEqual(len(data['results']), 11)
+        self.assertEqual(data['results'][0]['text'], 'Surname1, Name1')
+
+        resp = self.client.get(reverse('autocomplete', kwargs={'index': 'authors'}), {'q': 'surname'})
+        self.assertEqual(len(resp.json()['results']), 20)
+
+    def test_unknown_index(self):
+        resp = self.client.get(reverse('autocomplete', kwargs={'index': 'users'}), {'term': 'a'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_book_form_does_not_embed_authors(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('book-create'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, reverse('autocomplete', kwargs={'index': 'authors'}))
+        self.assertContains(resp, reverse('autocomplete', kwargs={'index': 'genres'}))
+        self.assertNotContains(resp, 'Surname7')
+
+    def test_book_form_renders_only_selected_author(self):
+        author = Author.objects.get(last_name='Surname3')
+        book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG', author=author)
+        genre = Genre.objects.create(name='Fantasy')
+        language = Language.objects.create(name='English')
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('book-update', kwargs={'pk': book.pk}))
+        self.assertContains(resp, 'Surname3, Name3')
+        self.assertNotContains(resp, 'Surname4')
+
+        resp = self.client.post(reverse('book-update', kwargs={'pk': book.pk}), {
+            'title': 'Book Title', 'summary': 'My book', 'isbn': 'ABCDEFG',
+            'author': Author.objects.get(last_name='Surname4').pk, 'genre': [genre.pk],
+            'language': language.pk,
+        })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Book.objects.get(pk=book.pk).author.last_name, 'Surname4')
+
+    def test_admin_uses_autocomplete(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('admin:blog_book_add'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, reverse('autocomplete', kwargs={'index': 'authors'}))
+        self.assertNotContains(resp, 'Surname7')
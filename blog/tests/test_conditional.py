@@ -0,0 +1,136 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from blog.models import Author, Book, BookInstance, Genre, Language
+
+
+class ConditionalResponseTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.other_author = Author.objects.create(first_name='Jane', last_name='Doe')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(
+            title='Book Title', summary='My book', isbn='ABCDEFG', author=cls.author, language=cls.language,
+        )
+        cls.book.genre.add(cls.genre)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+
+    def urls(self):
+        return {
+            'book-detail': reverse('book-detail', kwargs={'pk': self.book.pk}),
+            'author-detail': reverse('author-detail', kwargs={'pk': self.author.pk}),
+            'books': reverse('books'),
+            'authors': reverse('authors'),
+        }
+
+    def revalidate(self, url, resp, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'], **headers)
+
+    def test_unchanged_pages_return_304_with_one_query(self):
+        for name, url in self.urls().items():
+            with self.subTest(view=name):
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                self.assertTrue(resp.has_header('ETag'))
+                self.assertTrue(resp.has_header('Last-Modified'))
+                with self.assertNumQueries(1):
+                    resp = self.revalidate(url, resp)
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp.content, b'')
+
+    def test_list_version_does_not_count_rows(self):
+        for name in ('books', 'authors'):
+            with self.subTest(view=name):
+                url = self.urls()[name]
+                resp = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.revalidate(url, resp).status_code, 304)
+                self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_if_modified_since(self):
+        url = self.urls()['book-detail']
+        resp = self.client.get(url)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)
+
+        past = http_date((self.book.updated_at - datetime.timedelta(days=1)).timestamp())
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=past)
+        self.assertEqual(resp.status_code, 200)
+
+    def assertChangeInvalidates(self, names, change):
+        urls = self.urls()
+        responses = {name: self.client.get(urls[name]) for name in names}
+        change()
+        for name in names:
+            with self.subTest(view=name):
+                self.assertEqual(self.revalidate(urls[name], responses[name]).status_code, 200)
+
+    def test_copy_change_invalidates_book_and_author(self):
+        def change():
+            self.copy.status = 'o'
+            self.copy.save()
+        self.assertChangeInvalidates(['book-detail', 'author-detail', 'books'], change)
+
+    def test_moving_copy_invalidates_both_books(self):
+        other = Book.objects.create(title='Other Title', summary='Other book', isbn='HIJKLMN')
+        urls = [reverse('book-detail', kwargs={'pk': pk}) for pk in (self.book.pk, other.pk)]
+        responses = [self.client.get(url) for url in urls]
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        copy.book = other
+        copy.save()
+        for url, resp in zip(urls, responses):
+            with self.subTest(url=url):
+                resp = self.revalidate(url, resp)
+                self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(self.client.get(urls[0]), 'Imprint')
+        self.assertContains(self.client.get(urls[1]), 'Imprint')
+
+    def test_genre_change_invalidates_book(self):
+        self.assertChangeInvalidates(['book-detail'], lambda: Genre.objects.get(pk=self.genre.pk).save())
+        self.assertChangeInvalidates(['book-detail', 'books'], lambda: self.book.genre.clear())
+        self.assertChangeInvalidates(['book-detail'], lambda: self.genre.book_set.add(self.book))
+
+    def test_language_rename_invalidates_book(self):
+        def change():
+            self.language.name = 'British English'
+            self.language.save()
+        self.assertChangeInvalidates(['book-detail'], change)
+
+    def test_author_rename_invalidates_book_pages(self):
+        def change():
+            self.author.last_name = 'Smythe'
+            self.author.save()
+        self.assertChangeInvalidates(['book-detail', 'books', 'author-detail', 'authors'], change)
+
+    def test_author_change_invalidates_previous_author(self):
+        def change():
+            book = Book.objects.get(pk=self.book.pk)
+            book.author = self.other_author
+            book.save()
+        self.assertChangeInvalidates(['author-detail'], change)
+
+    def test_deletion_invalidates_list(self):
+        self.assertChangeInvalidates(['authors'], lambda: self.other_author.delete())
+
+    def test_etag_differs_per_user(self):
+        url = self.urls()['book-detail']
+        anonymous = self.client.get(url)
+        self.client.force_login(self.user)
+        resp = self.revalidate(url, anonymous)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header('Last-Modified'))
+        self.assertEqual(self.revalidate(url, resp).status_code, 304)
+
+    def test_missing_object_is_404(self):
+        resp = self.client.get(reverse('book-detail', kwargs={'pk': 9999}), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(resp.status_code, 404)
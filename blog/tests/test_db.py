@@ -0,0 +1,437 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from blog.db import pool, routers
+from blog.db.config import databases, replica_weights
+from blog.db.pool import ConnectionPool
+from blog.db.routers import ReplicaRouter, RequestRouting, WeightedRoundRobin
+from blog.fragments import get_cache
+from blog.models import Author, Book, BookInstance, LibraryStats
+
+SQLITE = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+
+
+class DatabaseConfigTest(SimpleTestCase):
+
+    def test_default_database_with_health_checks(self):
+        config = databases(SQLITE, env={})
+        self.assertEqual(list(config), ['default'])
+        self.assertEqual(config['default']['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['default']['CONN_MAX_AGE'], 500)
+        self.assertIs(config['default']['CONN_HEALTH_CHECKS'], True)
+        self.assertNotIn('POOL', config['default'])
+
+    def test_database_url_and_flags(self):
+        config = databases(SQLITE, env={
+            'DATABASE_URL': 'postgres://user:secret@db:5432/library',
+            'BLOG_DB_CONN_MAX_AGE': '60',
+            'BLOG_DB_CONN_HEALTH_CHECKS': 'off',
+        })['default']
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['HOST'], config['NAME']), ('db', 'library'))
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertIs(config['CONN_HEALTH_CHECKS'], False)
+
+    def test_pool_replaces_engine(self):
+        config = databases(SQLITE, env={
+            'DATABASE_URL': 'postgres://user:secret@db:5432/library',
+            'BLOG_DB_POOL_SIZE': '8',
+            'BLOG_DB_POOL_TIMEOUT': '2.5',
+        })['default']
+        self.assertEqual(config['ENGINE'], 'blog.db.backends.postgresql')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['POOL'], {'SIZE': 8, 'TIMEOUT': 2.5, 'MAX_IDLE': 300, 'CHECK_INTERVAL': 30})
+
+    def test_pool_for_unsupported_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            databases(SQLITE, env={'DATABASE_URL': 'mysql://user@db/library', 'BLOG_DB_POOL_SIZE': '4'})
+
+    def test_replica_mirrors_default_in_tests(self):
+        config = databases(SQLITE, env={
+            'DATABASE_URL': 'postgres://user@primary/library',
+            'DATABASE_REPLICA_URL': 'postgres://user@replica/library',
+        })
+        self.assertEqual(config['replica']['HOST'], 'replica')
+        self.assertEqual(config['replica']['TEST'], {'MIRROR': 'default'})
+        self.assertIs(config['replica']['CONN_HEALTH_CHECKS'], True)
+
+    def test_weighted_replicas(self):
+        env = {
+            'DATABASE_REPLICA_URLS': 'postgres://user@replica1/library, postgres://user@replica2/library',
+            'BLOG_DB_REPLICA_WEIGHTS': '3,1',
+        }
+        config = databases(SQLITE, env=env)
+        self.assertEqual(list(config), ['default', 'replica', 'replica_2'])
+        self.assertEqual(config['replica_2']['HOST'], 'replica2')
+        self.assertEqual(replica_weights(config, env), {'replica': 3, 'replica_2': 1})
+        self.assertEqual(replica_weights(config, {}), {'replica': 1, 'replica_2': 1})
+        with self.assertRaises(ImproperlyConfigured):
+            replica_weights(config, {'BLOG_DB_REPLICA_WEIGHTS': '1'})
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def test_released_connection_is_reused(self):
+        connections = ConnectionPool(size=2)
+        first, reused = connections.acquire(FakeConnection)
+        self.assertFalse(reused)
+        connections.release(first)
+        self.assertEqual(connections.acquire(FakeConnection), (first, True))
+        self.assertEqual(connections.stats()['created'], 1)
+
+    def test_exhausted_pool_times_out(self):
+        connections = ConnectionPool(size=1, timeout=0.05)
+        connections.acquire(FakeConnection)
+        with self.assertRaises(OperationalError):
+            connections.acquire(FakeConnection)
+        self.assertEqual(connections.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        connections = ConnectionPool(size=1, timeout=5)
+        first, _ = connections.acquire(FakeConnection)
+        timer = threading.Timer(0.05, connections.release, [first])
+        timer.start()
+        self.assertEqual(connections.acquire(FakeConnection), (first, True))
+        timer.join()
+        self.assertEqual(connections.stats()['waits'], 1)
+
+    def test_failed_check_replaces_connection(self):
+        connections = ConnectionPool(size=1)
+        broken, _ = connections.acquire(FakeConnection)
+        connections.release(broken)
+        fresh, reused = connections.acquire(FakeConnection, check=lambda conn: False)
+        self.assertFalse(reused)
+        self.assertIsNot(fresh, broken)
+        self.assertTrue(broken.closed)
+
+    def test_recently_released_connection_is_not_checked(self):
+        connections = ConnectionPool(size=1, check_interval=0.05)
+        checked = []
+
+        def check(conn):
+            checked.append(conn)
+            return True
+
+        first, _ = connections.acquire(FakeConnection)
+        connections.release(first)
+        self.assertEqual(connections.acquire(FakeConnection, check=check), (first, True))
+        self.assertEqual(checked, [])
+        connections.release(first)
+        time.sleep(0.06)
+        self.assertEqual(connections.acquire(FakeConnection, check=check), (first, True))
+        self.assertEqual(checked, [first])
+
+    def test_idle_connection_expires(self):
+        connections = ConnectionPool(size=2, max_idle=0.01)
+        old, _ = connections.acquire(FakeConnection)
+        connections.release(old)
+        time.sleep(0.02)
+        self.assertIsNot(connections.acquire(FakeConnection)[0], old)
+        self.assertTrue(old.closed)
+
+    def test_failed_connect_frees_slot(self):
+        connections = ConnectionPool(size=1, timeout=0)
+
+        def refuse():
+            raise OperationalError('connection refused')
+
+        with self.assertRaises(OperationalError):
+            connections.acquire(refuse)
+        self.assertEqual(connections.stats()['in_use'], 0)
+        connections.acquire(FakeConnection)
+
+
+class PooledBackendMixin:
+    """Обертки пулового бэкенда вне connections, чтобы не затрагивать тестовую базу."""
+    engine = None
+
+    def settings_dict(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        # Пустая 'default' - фиктивный бэкенд, который ConnectionHandler требует всегда
+        self.handler = ConnectionHandler({'default': {}, 'pooled': {
+            **self.settings_dict(),
+            'ENGINE': self.engine,
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': {'SIZE': 2, 'TIMEOUT': 0.05},
+        }})
+        self.addCleanup(pool.close_pools)
+
+    def wrapper(self):
+        wrapper = self.handler.create_connection('pooled')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_connection_returns_to_pool(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+        self.assertIs(second.connection, raw)
+        self.assertEqual(pool.pool_stats()['pooled']['created'], 1)
+
+    def test_pool_size_limits_connections(self):
+        self.wrapper().ensure_connection()
+        self.wrapper().ensure_connection()
+        with self.assertRaises(OperationalError):
+            self.wrapper().ensure_connection()
+
+
+class PooledSQLiteBackendTest(PooledBackendMixin, SimpleTestCase):
+    engine = 'blog.db.backends.sqlite3'
+
+    def settings_dict(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return {'NAME': os.path.join(directory.name, 'pool.sqlite3')}
+
+    def test_open_transaction_is_rolled_back(self):
+        first = self.wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (name TEXT)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute("INSERT INTO item VALUES ('uncommitted')")
+        first.close()
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_broken_idle_connection_is_replaced(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        # Соединение, разорванное, пока оно было в пуле
+        raw.close()
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIsNot(second.connection, raw)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL (DATABASE_URL=postgres://...)')
+class PooledPostgreSQLBackendTest(PooledBackendMixin, SimpleTestCase):
+    """Пул поверх тестовой базы PostgreSQL, например локального контейнера postgres."""
+    engine = 'blog.db.backends.postgresql'
+
+    def settings_dict(self):
+        return {name: connection.settings_dict[name] for name in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')}
+
+    def test_reused_connection_keeps_isolation_level(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        isolation_level = first.isolation_level
+        first.close()
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertEqual(second.isolation_level, isolation_level)
+
+
+class WeightedRoundRobinTest(SimpleTestCase):
+
+    def test_equal_weights_alternate(self):
+        selector = WeightedRoundRobin()
+        self.assertEqual([selector.choose({'a': 1, 'b': 1}) for _ in range(4)], ['a', 'b', 'a', 'b'])
+
+    def test_weights_are_interleaved(self):
+        selector = WeightedRoundRobin()
+        self.assertEqual([selector.choose({'a': 3, 'b': 1}) for _ in range(8)], ['a', 'a', 'b', 'a'] * 2)
+
+
+@override_settings(BLOG_DATABASE_REPLICAS={'replica': 1})
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def route(self, use_replicas=True):
+        token = routers._routing.set(RequestRouting(use_replicas))
+        self.addCleanup(routers._routing.reset, token)
+
+    def test_outside_request_reads_from_default(self):
+        self.assertIsNone(self.router.db_for_read(Book))
+
+    def test_only_catalogue_is_replicated(self):
+        self.route()
+        self.assertEqual(self.router.db_for_read(Book), 'replica')
+        self.assertEqual(self.router.db_for_read(Author), 'replica')
+        self.assertIsNone(self.router.db_for_read(BookInstance))
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_write_pins_rest_of_request(self):
+        self.route()
+        self.assertEqual(self.router.db_for_read(Book), 'replica')
+        self.router.db_for_write(User)
+        self.assertEqual(self.router.db_for_read(Book), 'replica')
+        self.router.db_for_write(BookInstance)
+        self.assertIsNone(self.router.db_for_read(Book))
+
+    def test_unsafe_request_reads_from_default(self):
+        self.route(use_replicas=False)
+        self.assertIsNone(self.router.db_for_read(Book))
+
+    def test_replica_instance_is_saved_to_default(self):
+        author = Author(first_name='Name', last_name='Surname')
+        author._state.db = 'replica'
+        self.assertEqual(self.router.db_for_write(Author, instance=author), 'default')
+        self.assertIsNone(self.router.db_for_write(Author))
+
+    def test_replica_is_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica', 'blog'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'blog'))
+
+    @override_settings(BLOG_DATABASE_REPLICAS={})
+    def test_without_replicas(self):
+        self.route()
+        self.assertIsNone(self.router.db_for_read(Book))
+
+
+@override_settings(BLOG_DATABASE_PIN_SECONDS=5)
+class ReplicaDatabasesTest(TestCase):
+    """Реплики - отдельные базы SQLite, созданные копией схемы тестовой базы.
+
+    На каждой реплике своя книга, поэтому по странице видно, из какой базы она прочитана.
+    Реплики подключаются после setUpClass: транзакции TestCase их не охватывают, а
+    файлы удаляются в tearDownClass.
+    """
+    replica_aliases = ('replica_a', 'replica_b')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        source = connections['default']
+        source.ensure_connection()
+        paths = {alias: os.path.join(cls.directory.name, f'{alias}.sqlite3') for alias in cls.replica_aliases}
+        for path in paths.values():
+            target = sqlite3.connect(path)
+            source.connection.backup(target)
+            target.close()
+        super().setUpClass()
+        for alias, path in paths.items():
+            connections.settings[alias] = connections.configure_settings({
+                'default': connections.settings['default'],
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+            })[alias]
+            # bulk_create - без сигналов, которые писали бы в основную базу
+            author, = Author.objects.using(alias).bulk_create([Author(first_name='Replica', last_name=alias)])
+            Book.objects.using(alias).bulk_create([
+                Book(title=f'Book on {alias}', summary='Summary', isbn=alias, author=author),
+            ])
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in cls.replica_aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Primary', last_name='Author')
+        Book.objects.create(title='Primary book', summary='Summary', isbn='0000000000001', author=author)
+        cls.librarian = User.objects.create_user(username='librarian', password='lhbnoFdb49')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+    def setUp(self):
+        routers.round_robin.reset()
+        # Фрагменты строк списка кэшируются по id и updated_at, которые у баз могут совпасть
+        get_cache().clear()
+
+    def served_by(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        content = resp.content.decode()
+        sources = [alias for alias in self.replica_aliases if f'Book on {alias}' in content]
+        if 'Primary book' in content:
+            sources.append('default')
+        self.assertEqual(len(sources), 1, content)
+        return sources[0]
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 1, 'replica_b': 1})
+    def test_round_robin(self):
+        served = [self.served_by(self.client.get(reverse('books'))) for _ in range(4)]
+        self.assertEqual(served, ['replica_a', 'replica_b', 'replica_a', 'replica_b'])
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 3, 'replica_b': 1})
+    def test_weighted_round_robin(self):
+        served = [self.served_by(self.client.get(reverse('books'))) for _ in range(4)]
+        self.assertEqual(served, ['replica_a', 'replica_a', 'replica_b', 'replica_a'])
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 0, 'replica_b': 1}, BLOG_DATABASE_REPLICA_SELECTION='random')
+    def test_weighted_random(self):
+        for _ in range(3):
+            self.assertEqual(self.served_by(self.client.get(reverse('books'))), 'replica_b')
+
+    @override_settings(BLOG_DATABASE_REPLICAS={})
+    def test_without_replicas(self):
+        self.assertEqual(self.served_by(self.client.get(reverse('books'))), 'default')
+
+    @override_settings(ROOT_URLCONF='website.urls_async', BLOG_DATABASE_REPLICAS={'replica_b': 1})
+    async def test_async_views(self):
+        resp = await AsyncClient().get(reverse('books'))
+        self.assertEqual(self.served_by(resp), 'replica_b')
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 1})
+    def test_write_pins_client_to_primary(self):
+        self.client.force_login(self.librarian)
+        self.assertNotIn('db_primary', self.client.get(reverse('authors')).cookies)
+
+        resp = self.client.post(reverse('author-create'), {'first_name': 'Ursula', 'last_name': 'Le Guin'})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp.cookies['db_primary']['max-age'], 5)
+        # Сразу после записи клиент читает свои изменения из основной базы
+        self.assertContains(self.client.get(resp.url), 'Le Guin')
+        self.assertEqual(self.served_by(self.client.get(reverse('books'))), 'default')
+
+        # По истечении cookie чтения снова идут на реплику
+        del self.client.cookies['db_primary']
+        self.assertEqual(self.served_by(self.client.get(reverse('books'))), 'replica_a')
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 1}, BLOG_VISITS_FLUSH_SIZE=1)
+    def test_bookkeeping_writes_do_not_pin_client(self):
+        self.client.force_login(self.librarian)
+        # Главная страница записывает счетчик посещений и пересчитывает LibraryStats
+        LibraryStats.objects.all().delete()
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('db_primary', resp.cookies)
+        self.assertEqual(self.served_by(self.client.get(reverse('books'))), 'replica_a')
+
+    @override_settings(BLOG_DATABASE_REPLICAS={'replica_a': 1})
+    def test_stats_rebuild_reads_primary(self):
+        Book.objects.create(title='Second primary book', summary='Summary', isbn='0000000000002')
+        token = routers._routing.set(RequestRouting(use_replicas=True))
+        try:
+            self.assertEqual(LibraryStats.rebuild().num_books, 2)
+        finally:
+            routers._routing.reset(token)
@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from blog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='lhbnoFdb49')
+        cls.librarian = User.objects.create_user(username='librarian', password='Jnsvnd549e')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name='Science fiction'), Genre.objects.create(name='Adventure')]
+        for num in range(3):
+            book = Book.objects.create(title=f'Dune {num}', summary='Spice', isbn=f'978000000000{num}',
+                                       author=author, language=language)
+            book.genre.set(genres)
+            for status in ('a', 'o', 'o'):
+                BookInstance.objects.create(book=book, imprint='Chilton', status=status)
+        Book.objects.create(title='Orphan', summary='No author', isbn='9780000000009')
+
+    def export_lines(self, **options):
+        out = StringIO()
+        call_command('export_catalog', stdout=out, **options)
+        return out.getvalue().splitlines()
+
+    def test_export_requires_permission(self):
+        resp = self.client.get(reverse('catalog-export'))
+        self.assertEqual(resp.status_code, 302)
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('catalog-export'))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_export_csv_streams(self):
+        self.client.force_login(self.librarian)
+        resp = self.client.get(reverse('catalog-export'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+
+        content = b''.join(resp.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['author_last_name'], 'Herbert')
+        self.assertEqual(set(rows[0]['genres'].split('|')), {'Science fiction', 'Adventure'})
+        self.assertEqual((rows[0]['copies'], rows[0]['available'], rows[0]['on_loan']), ('3', '1', '2'))
+        self.assertEqual(rows[3]['author_last_name'], '')
+
+    def test_export_ndjson(self):
+        self.client.force_login(self.librarian)
+        resp = self.client.get(reverse('catalog-export'), {'format': 'ndjson'})
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        row = json.loads(lines[1])
+        self.assertEqual(row['title'], 'Dune 1')
+        self.assertEqual(sorted(copy['status'] for copy in row['instances']), ['a', 'o', 'o'])
+        self.assertEqual({copy['imprint'] for copy in row['instances']}, {'Chilton'})
+        self.assertEqual(json.loads(lines[3])['instances'], [])
+
+    def test_unknown_format(self):
+        self.client.force_login(self.librarian)
+        resp = self.client.get(reverse('catalog-export'), {'format': 'xml'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_export_queries_do_not_grow_with_books(self):
+        # Жанры подгружаются одним запросом на порцию iterator(), а не на каждую книгу
+        with self.assertNumQueries(2):
+            rows = self.export_lines(chunk_size=100)
+        self.assertEqual(len(rows), 5)
+        # В NDJSON экземпляры - еще один запрос на порцию
+        with self.assertNumQueries(3):
+            rows = self.export_lines(chunk_size=100, format='ndjson')
+        self.assertEqual(len(rows), 4)
+
+    def test_command_round_trips_through_import(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('export_catalog', output=path)
+        Book.objects.filter(isbn='9780000000000').update(title='Changed')
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(Book.objects.get(isbn='9780000000000').title, 'Dune 0')
+        self.assertEqual(Book.objects.count(), 4)
+
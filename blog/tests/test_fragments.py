@@ -0,0 +1,95 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog.fragments import STATS_KEYS, fragment_key, get_cache, get_stats, reset_stats, stats_buffer
+from blog.models import Author, Book, BookInstance, Genre
+
+
+class FragmentCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG', author=cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='First Imprint', status='a')
+
+    def setUp(self):
+        get_cache().clear()
+        reset_stats()
+
+    def test_key_follows_version(self):
+        book = Book.objects.get(pk=self.book.pk)
+        key = fragment_key('book-row', book)
+        self.assertIn(str(book.pk), key)
+        self.assertEqual(key, fragment_key('book-row', Book.objects.get(pk=book.pk)))
+        self.assertNotEqual(key, fragment_key('book-copies', book))
+        self.assertIsNone(fragment_key('book-row', Book(title='Unsaved')))
+
+        self.copy.save()
+        self.assertNotEqual(key, fragment_key('book-row', Book.objects.get(pk=self.book.pk)))
+
+    def test_tag_counts_hits_and_misses(self):
+        template = Template("{% load fragment_cache %}{% fragment_cache 'title' book %}{{ book.title }}{% endfragment_cache %}")
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(template.render(Context({'book': book})), 'Book Title')
+        book.title = 'Changed without saving'
+        self.assertEqual(template.render(Context({'book': book})), 'Book Title')
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+        out = StringIO()
+        call_command('fragment_cache_stats', '--reset', stdout=out)
+        self.assertIn('Hits: 1, misses: 1, hit ratio: 50.0%', out.getvalue())
+        self.assertEqual(get_stats(), {'hits': 0, 'misses': 0})
+
+    @override_settings(BLOG_FRAGMENT_STATS_FLUSH_SIZE=3, BLOG_FRAGMENT_STATS_FLUSH_INTERVAL=3600)
+    def test_counters_are_flushed_in_batches(self):
+        cache = get_cache()
+        stats_buffer.add('hits')
+        stats_buffer.add('misses')
+        # Пока пачка не набралась, счетчики в кэше не меняются
+        self.assertEqual(cache.get_many(STATS_KEYS.values()), {})
+        stats_buffer.add('hits')
+        self.assertEqual(cache.get_many(STATS_KEYS.values()), {STATS_KEYS['hits']: 2, STATS_KEYS['misses']: 1})
+        stats_buffer.add('misses')
+        self.assertEqual(get_stats(), {'hits': 2, 'misses': 2})
+
+    def test_author_bibliography_hit_skips_query(self):
+        url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        with self.assertNumQueries(3):
+            # Версия для ETag, автор и его книги с количеством экземпляров
+            self.client.get(url)
+        with self.assertNumQueries(2):
+            # Версия для ETag и автор; список книг берется из кэша
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Book Title')
+        self.assertEqual(get_stats()['hits'], 1)
+
+    def test_copies_panel_follows_copy_changes(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.pk})
+        self.assertContains(self.client.get(url), 'First Imprint')
+        self.copy.imprint = 'Second Imprint'
+        self.copy.save()
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Second Imprint')
+        self.assertNotContains(resp, 'First Imprint')
+
+    def test_bibliography_follows_new_copies(self):
+        url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        self.assertContains(self.client.get(url), 'Book Title</a> (1)')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o')
+        self.assertContains(self.client.get(url), 'Book Title</a> (2)')
+
+    def test_book_row_follows_author_rename(self):
+        self.assertContains(self.client.get(reverse('books')), 'Smith, John')
+        self.author.first_name = 'Jack'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('books')), 'Smith, Jack')
+
+    def test_genre_change_bumps_version(self):
+        key = fragment_key('book-copies', Book.objects.get(pk=self.book.pk))
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertNotEqual(key, fragment_key('book-copies', Book.objects.get(pk=self.book.pk)))
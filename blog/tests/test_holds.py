@@ -0,0 +1,145 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from blog import holds, loans
+from blog.models import Book, BookInstance, Hold, LibraryStats
+
+
+class HoldQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976')
+        cls.readers = [User.objects.create_user(username=f'reader{num}') for num in range(4)]
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint=f'Corgi {num}', status='o')
+                      for num in range(2)]
+
+    def setUp(self):
+        LibraryStats.rebuild()
+
+    def test_holds_wait_in_fifo_order(self):
+        queue = [holds.place_hold(self.book, reader) for reader in self.readers]
+        self.assertEqual({hold.status for hold in queue}, {Hold.WAITING})
+        with self.assertRaises(ValidationError):
+            holds.place_hold(self.book, self.readers[0])
+
+        loans.apply_loans(loans.RETURN, [self.copies[1].pk])
+        first = Hold.objects.get(pk=queue[0].pk)
+        self.assertEqual((first.status, first.copy_id), (Hold.READY, self.copies[1].pk))
+        copy = BookInstance.objects.get(pk=self.copies[1].pk)
+        self.assertEqual((copy.status, copy.borrower), ('r', self.readers[0]))
+        self.assertEqual(LibraryStats.load().num_instances_available, 0)
+
+        # Отложенный экземпляр выдается только читателю заявки
+        result = loans.apply_loans(loans.CHECKOUT, [copy.pk], borrower=self.readers[1])
+        self.assertEqual(result.updated, [])
+        loans.apply_loans(loans.CHECKOUT, [copy.pk], borrower=self.readers[0])
+        self.assertEqual(Hold.objects.get(pk=queue[0].pk).status, Hold.FULFILLED)
+        self.assertEqual(LibraryStats.load().num_instances_available, 0)
+
+        loans.apply_loans(loans.RETURN, [self.copies[0].pk])
+        self.assertEqual(Hold.objects.get(pk=queue[1].pk).status, Hold.READY)
+        self.assertEqual(Hold.objects.get(pk=queue[2].pk).status, Hold.WAITING)
+
+    def test_place_hold_reserves_available_copy(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Gollancz', status='a')
+        hold = holds.place_hold(self.book, self.readers[0])
+        self.assertEqual((hold.status, hold.copy_id), (Hold.READY, copy.pk))
+        self.assertEqual(holds.place_hold(self.book, self.readers[1]).status, Hold.WAITING)
+
+    def test_cancel_passes_copy_to_next_hold(self):
+        first = holds.place_hold(self.book, self.readers[0])
+        second = holds.place_hold(self.book, self.readers[1])
+        loans.apply_loans(loans.RETURN, [self.copies[0].pk])
+        first.refresh_from_db()
+
+        self.assertTrue(holds.cancel_hold(first))
+        self.assertFalse(holds.cancel_hold(first))
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.copy_id), (Hold.READY, self.copies[0].pk))
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[0].pk).borrower, self.readers[1])
+
+        self.assertTrue(holds.cancel_hold(second))
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        self.assertEqual((copy.status, copy.borrower), ('a', None))
+        self.assertEqual(LibraryStats.load().num_instances_available, 1)
+
+    def test_cancel_changes_book_version(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Gollancz', status='a')
+        hold = holds.place_hold(self.book, self.readers[0])
+        long_ago = timezone.now() - datetime.timedelta(days=1)
+        Book.objects.filter(pk=self.book.pk).update(updated_at=long_ago)
+
+        self.assertTrue(holds.cancel_hold(hold))
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'a')
+        self.assertGreater(Book.objects.get(pk=self.book.pk).updated_at, long_ago)
+
+    def test_copy_saved_as_available_goes_to_queue(self):
+        hold = holds.place_hold(self.book, self.readers[0])
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.status = 'a'
+            copy.borrower = None
+            copy.save()
+        hold.refresh_from_db()
+        self.assertEqual((hold.status, hold.copy_id), (Hold.READY, copy.pk))
+
+
+class ParallelHoldTest(TransactionTestCase):
+    '''Заявки и возвраты из пула потоков: каждый экземпляр достается не больше чем одной заявке.'''
+
+    readers_count = 24
+    copies_count = 6
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976')
+        self.readers = [User.objects.create_user(username=f'reader{num}') for num in range(self.readers_count)]
+        self.copies = [BookInstance.objects.create(book=self.book, imprint=f'Corgi {num}', status='a')
+                       for num in range(self.copies_count)]
+
+    def run_parallel(self, func, items):
+        def task(item):
+            try:
+                return func(item)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(task, items))
+
+    def assertConsistent(self):
+        ready = list(Hold.objects.filter(status=Hold.READY))
+        copy_ids = [hold.copy_id for hold in ready]
+        self.assertEqual(len(copy_ids), len(set(copy_ids)))
+        for hold in ready:
+            copy = BookInstance.objects.get(pk=hold.copy_id)
+            self.assertEqual((copy.status, copy.borrower_id), ('r', hold.user_id))
+        self.assertEqual(BookInstance.objects.filter(status='r').count(), len(ready))
+        # Пока есть ожидающие заявки, свободных экземпляров не остается
+        if Hold.objects.filter(status=Hold.WAITING).exists():
+            self.assertFalse(BookInstance.objects.filter(status='a').exists())
+        self.assertEqual(LibraryStats.load().num_instances_available, LibraryStats.rebuild().num_instances_available)
+        return ready
+
+    def test_parallel_holds_and_returns(self):
+        LibraryStats.rebuild()
+        self.run_parallel(lambda reader: holds.place_hold(self.book, reader), self.readers)
+        ready = self.assertConsistent()
+        self.assertEqual(len(ready), self.copies_count)
+        self.assertEqual(Hold.objects.filter(status=Hold.WAITING).count(), self.readers_count - self.copies_count)
+
+        # Читатели забирают книги и параллельно возвращают их; экземпляры уходят следующим в очереди
+        for hold in ready:
+            loans.apply_loans(loans.CHECKOUT, [hold.copy_id], borrower=hold.user)
+        self.run_parallel(lambda copy: loans.apply_loans(loans.RETURN, [copy.pk]), self.copies)
+        ready = self.assertConsistent()
+        self.assertEqual(len(ready), self.copies_count)
+        # Экземпляры получили следующие по порядку подачи заявки
+        waiting = list(Hold.objects.filter(status=Hold.WAITING))
+        self.assertLess(max(hold.created_at for hold in ready), min(hold.created_at for hold in waiting))
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from blog.importer import MAX_COPIES, LookupCache
+from blog.models import Author, Book, BookInstance, Genre, Language, LibraryStats
+
+
+CSV_DATA = """isbn,title,summary,author_first_name,author_last_name,language,genres,copies,imprint,status
+9780000000001,Dune,Spice,Frank,Herbert,English,Science fiction|Adventure,3,Chilton,a
+9780000000002,Children of Dune,More spice,Frank,Herbert,English,Science fiction,1,Putnam,o
+9780000000003,,No title,Anon,Ymous,English,,1,,a
+9780000000004,Solaris,Ocean,Stanislaw,Lem,Polish,Science fiction,2,,m
+"""
+
+
+class ImportCatalogCommandTest(TestCase):
+
+    def write_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_file(self, path, **options):
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        output = self.import_file(self.write_file('.csv', CSV_DATA), batch_size=2)
+        self.assertIn('3 books created', output)
+        self.assertIn('1 skipped', output)
+        self.assertIn('rows/s', output)
+
+        dune = Book.objects.get(isbn='9780000000001')
+        self.assertEqual(str(dune.author), 'Herbert, Frank')
+        self.assertEqual(dune.language.name, 'English')
+        self.assertEqual(sorted(genre.name for genre in dune.genre.all()), ['Adventure', 'Science fiction'])
+        self.assertEqual(dune.bookinstance_set.filter(status='a').count(), 3)
+
+        # Справочники не дублируются между пачками
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 2)
+
+    def test_reimport_updates_by_isbn_without_duplicating_copies(self):
+        path = self.write_file('.csv', CSV_DATA)
+        self.import_file(path)
+        updated = CSV_DATA.replace('Dune,Spice', 'Dune,Updated spice').replace('Science fiction|Adventure', 'Classic')
+        output = self.import_file(self.write_file('.csv', updated))
+        self.assertIn('0 books created, 3 updated', output)
+
+        dune = Book.objects.get(isbn='9780000000001')
+        self.assertEqual(dune.summary, 'Updated spice')
+        self.assertEqual([genre.name for genre in dune.genre.all()], ['Classic'])
+        self.assertEqual(BookInstance.objects.count(), 6)
+
+    def test_import_jsonl(self):
+        lines = [
+            {'isbn': '9780000000010', 'title': 'Roadside Picnic', 'author_first_name': 'Arkady',
+             'author_last_name': 'Strugatsky', 'genres': ['Science fiction'], 'copies': 2, 'status': 'a'},
+            {'isbn': '9780000000011', 'title': 'Hard to Be a God', 'author_first_name': 'Arkady',
+             'author_last_name': 'Strugatsky', 'genres': 'Science fiction|Satire'},
+        ]
+        path = self.write_file('.jsonl', '\n'.join(json.dumps(line) for line in lines) + '\n')
+        self.import_file(path)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Book.objects.get(isbn='9780000000011').genre.count(), 2)
+
+    def test_malformed_and_too_long_rows_are_skipped(self):
+        lines = [
+            json.dumps({'isbn': '9780000000010', 'title': 'Roadside Picnic'}),
+            '{"isbn": "9780000000011", "title": ',
+            json.dumps(['not', 'an', 'object']),
+            json.dumps({'isbn': '9780000000012', 'title': 'T' * 201}),
+            json.dumps({'isbn': '9780000000013', 'title': 'Genre', 'genres': ['G' * 201]}),
+            json.dumps({'isbn': '9780000000014', 'title': 'Hard to Be a God'}),
+            json.dumps({'isbn': '9780000000015', 'title': 'Too many', 'copies': MAX_COPIES + 1}),
+            json.dumps({'isbn': '9780000000016', 'title': 'Negative', 'copies': -1}),
+        ]
+        output = self.import_file(self.write_file('.jsonl', '\n'.join(lines) + '\n'), batch_size=2)
+        self.assertIn('2 books created', output)
+        self.assertIn('6 skipped', output)
+        self.assertEqual(Genre.objects.count(), 0)
+        self.assertEqual(BookInstance.objects.count(), 0)
+
+    def test_lookup_cache_is_bounded(self):
+        authors = LookupCache(Author, ('first_name', 'last_name'), max_size=2)
+        for num in range(5):
+            keys = {(f'First{num}', f'Last{num}'), (f'First{num}', 'Shared')}
+            authors.resolve(keys, batch_size=10)
+            # Ключи текущей пачки не вытесняются
+            self.assertTrue(all(authors[key] for key in keys))
+            self.assertLessEqual(len(authors.ids), 2 + len(keys))
+        # Вытесненный автор загружается из БД, а не создается повторно
+        authors.resolve({('First0', 'Last0')}, batch_size=10)
+        self.assertEqual(Author.objects.filter(last_name='Last0').count(), 1)
+
+    def test_library_stats_follow_bulk_import(self):
+        LibraryStats.load()
+        self.import_file(self.write_file('.csv', CSV_DATA))
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_books, 3)
+        self.assertEqual(stats.num_instances, 6)
+        self.assertEqual(stats.num_instances_available, 3)
+        self.assertEqual(stats.num_authors, 2)
+        self.assertEqual(stats.num_genres, 2)
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.import_file('/nonexistent/catalog.csv')
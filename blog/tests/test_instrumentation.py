@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from blog import instrumentation
+from blog.instrumentation import RequestMetrics, RouteStats, fingerprint
+from blog.models import Author
+
+
+class RequestMetricsTest(TestCase):
+
+    def test_fingerprint_ignores_parameter_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM a WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT *  FROM a\nWHERE id IN (%s,%s)'),
+        )
+
+    @override_settings(BLOG_METRICS_DUPLICATE_THRESHOLD=3)
+    def test_repeated_queries_are_detected(self):
+        authors = [Author.objects.create(first_name='Name', last_name=f'Surname{num}') for num in range(4)]
+        metrics = RequestMetrics()
+        metrics.install()
+        try:
+            for author in authors:
+                Author.objects.get(pk=author.pk)
+            Author.objects.count()
+        finally:
+            metrics.uninstall()
+        self.assertNotIn(metrics, connection.execute_wrappers)
+        self.assertEqual(metrics.queries, 5)
+        self.assertGreater(metrics.sql_time, 0)
+        self.assertEqual(list(metrics.duplicates.values()), [4])
+        self.assertIn('dup;desc="1 repeated queries"', metrics.server_timing(0.01))
+
+    def test_percentiles_from_buckets(self):
+        stats = RouteStats()
+        for total_ms in [3] * 90 + [40] * 9 + [700]:
+            stats.add(total_ms, RequestMetrics(), 100)
+        data = stats.as_dict()
+        self.assertEqual((data['p50_ms'], data['p95_ms'], data['p99_ms'], data['max_ms']), (5, 50, 50, 700))
+        self.assertEqual(data['bytes_mean'], 100)
+        self.assertEqual(data['buckets']['le_1000'], 1)
+
+
+class PerformanceMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='lhbnoFdb49', is_staff=True)
+        cls.reader = User.objects.create_user(username='reader', password='lhbnoFdb49')
+
+    def setUp(self):
+        instrumentation.histogram.reset()
+
+    @override_settings(BLOG_METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_has_server_timing(self):
+        self.client.force_login(self.reader)
+        resp = self.client.get(reverse('books'))
+        timing = dict(
+            (part.split(';')[0], part) for part in resp['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'total', 'sql', 'tpl'})
+        self.assertRegex(timing['sql'], r'desc="[1-9]\d* queries"')
+        self.assertNotEqual(timing['tpl'], 'tpl;dur=0.0')
+        self.assertFalse(connection.execute_wrappers)
+
+        stats = instrumentation.histogram.snapshot()['books']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreater(stats['queries_mean'], 0)
+        self.assertEqual(stats['bytes_mean'], len(resp.content))
+
+    @override_settings(BLOG_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_measured(self):
+        resp = self.client.get(reverse('books'))
+        self.assertNotIn('Server-Timing', resp)
+        self.assertEqual(instrumentation.histogram.snapshot(), {})
+
+    @override_settings(BLOG_METRICS_SAMPLE_RATE=1, BLOG_METRICS_TOKEN='secret')
+    def test_metrics_endpoint_is_protected(self):
+        self.client.get(reverse('authors'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        resp = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['routes']['authors']['count'], 1)
+
+        self.client.force_login(self.staff)
+        resp = self.client.get(reverse('metrics'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('no-store', resp['Cache-Control'])
+
+    def test_template_render_time_is_recorded(self):
+        request = RequestFactory().get('/')
+        request._performance_metrics = metrics = RequestMetrics()
+        engines['django'].from_string('{{ value }}').render({'value': 1}, request)
+        self.assertGreater(metrics.template_time, 0)
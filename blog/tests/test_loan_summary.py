@@ -0,0 +1,100 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from blog import loan_summary
+from blog.fragments import get_cache
+from blog.loans import RETURN, apply_loans
+from blog.models import Author, Book, BookInstance
+
+
+class LoanSummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='lhbnoFdb49')
+        cls.other = User.objects.create_user(username='other', password='lhbnoFdb49')
+        author = Author.objects.create(first_name='Terry', last_name='Pratchett')
+        cls.book = Book.objects.create(title='Mort', summary='Death', isbn='9780552131063', author=author)
+        today = datetime.date.today()
+        cls.overdue = BookInstance.objects.create(book=cls.book, imprint='Corgi', status='o', borrower=cls.reader,
+                                                  due_back=today - datetime.timedelta(days=2))
+        cls.current = BookInstance.objects.create(book=cls.book, imprint='Gollancz', status='o', borrower=cls.reader,
+                                                  due_back=today + datetime.timedelta(days=5))
+        BookInstance.objects.create(book=cls.book, imprint='Corgi', status='o', borrower=cls.other,
+                                    due_back=today)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client.force_login(self.reader)
+
+    def test_summary_is_cached_per_user(self):
+        with self.assertNumQueries(1):
+            summary = loan_summary.get_summary(self.reader)
+        self.assertEqual([loan.id for loan in summary.loans], [self.overdue.pk, self.current.pk])
+        self.assertEqual([loan.is_overdue for loan in summary.loans], [True, False])
+        with self.assertNumQueries(0):
+            self.assertEqual(loan_summary.get_summary(self.reader).etag, summary.etag)
+
+    def test_list_page_uses_cached_summary(self):
+        self.client.get(reverse('my-borrowed'))
+        # Сессия и пользователь; выдачи берутся из кэша
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('my-borrowed'))
+        self.assertContains(resp, 'Mort', count=2)
+        self.assertContains(resp, 'text-danger', count=1)
+
+    def test_changes_to_copies_invalidate_only_their_borrowers(self):
+        other_etag = loan_summary.get_summary(self.other).etag
+        with self.captureOnCommitCallbacks(execute=True):
+            self.current.due_back += datetime.timedelta(days=7)
+            self.current.save()
+        self.assertEqual(loan_summary.get_summary(self.reader).loans[1].due_back, self.current.due_back)
+        with self.assertNumQueries(0):
+            self.assertEqual(loan_summary.get_summary(self.other).etag, other_etag)
+
+        # Передача экземпляра другому читателю сбрасывает сводки обоих
+        with self.captureOnCommitCallbacks(execute=True):
+            self.current.borrower = self.other
+            self.current.save()
+        self.assertEqual(len(loan_summary.get_summary(self.reader).loans), 1)
+        self.assertEqual(len(loan_summary.get_summary(self.other).loans), 2)
+
+    def test_batch_return_and_title_change_invalidate(self):
+        loan_summary.get_summary(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_loans(RETURN, [self.overdue.pk])
+        self.assertEqual([loan.id for loan in loan_summary.get_summary(self.reader).loans], [self.current.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Mort (Discworld)'
+            self.book.save()
+        self.assertEqual(loan_summary.get_summary(self.reader).loans[0].title, 'Mort (Discworld)')
+
+    def test_json_variant_supports_conditional_get(self):
+        resp = self.client.get(reverse('my-borrowed-json'))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['num_overdue'], 1)
+        self.assertEqual(data['loans'][0], {
+            'id': str(self.overdue.pk), 'book': self.book.pk, 'title': 'Mort', 'url': self.book.get_absolute_url(),
+            'due_back': self.overdue.due_back.isoformat(), 'is_overdue': True,
+        })
+        self.assertIn('private', resp['Cache-Control'])
+
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('my-borrowed-json'), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        etag = resp['ETag']
+        self.current.delete()
+        resp = self.client.get(reverse('my-borrowed-json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()['loans']), 1)
+
+    def test_json_requires_login(self):
+        self.client.logout()
+        resp = self.client.get(reverse('my-borrowed-json'))
+        self.assertEqual(resp.status_code, 302)
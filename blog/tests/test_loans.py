@@ -0,0 +1,126 @@
+import datetime
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+
+from blog import loans
+from blog.models import Author, Book, BookInstance, LibraryStats
+
+
+class ApplyLoansTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='lhbnoFdb49')
+        cls.author = Author.objects.create(first_name='Terry', last_name='Pratchett')
+        cls.book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976', author=cls.author)
+        cls.available = [BookInstance.objects.create(book=cls.book, imprint='Corgi', status='a') for _ in range(30)]
+        cls.maintenance = BookInstance.objects.create(book=cls.book, imprint='Corgi', status='m')
+
+    def setUp(self):
+        LibraryStats.rebuild()
+
+    def ids(self, copies):
+        return [copy.pk for copy in copies]
+
+    def test_checkout_return_and_renew(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        result = loans.apply_loans(loans.CHECKOUT, self.ids(self.available), borrower=self.reader, due_back=due_back)
+        self.assertEqual(len(result.updated), 30)
+        self.assertEqual(BookInstance.objects.filter(status='o', borrower=self.reader, due_back=due_back).count(), 30)
+        self.assertEqual(LibraryStats.load().num_instances_available, 0)
+
+        result = loans.apply_loans(loans.RENEW, self.ids(self.available[:10]))
+        self.assertEqual(BookInstance.objects.filter(due_back=loans.default_due_date()).count(), 10)
+
+        result = loans.apply_loans(loans.RETURN, self.ids(self.available[:5]))
+        self.assertEqual(len(result.updated), 5)
+        self.assertEqual(BookInstance.objects.filter(status='a', borrower=None, due_back=None).count(), 5)
+        self.assertEqual(LibraryStats.load().num_instances_available, 5)
+        self.assertEqual(LibraryStats.load().num_instances_available, LibraryStats.rebuild().num_instances_available)
+
+    def test_queries_do_not_grow_with_batch(self):
+        # выборка с блокировкой, bulk_update, счетчики, версии книг и авторов, точки сохранения
+        with self.assertNumQueries(7):
+            loans.apply_loans(loans.CHECKOUT, self.ids(self.available), borrower=self.reader)
+        # и проверка очереди заявок на возвращенные книги
+        with self.assertNumQueries(8):
+            loans.apply_loans(loans.RETURN, self.ids(self.available[:3]))
+
+    def test_skips_ineligible_copies(self):
+        missing = uuid.uuid4()
+        result = loans.apply_loans(loans.RETURN, [self.available[0].pk, self.maintenance.pk, missing])
+        self.assertEqual(result.updated, [])
+        self.assertEqual(result.skipped, {
+            self.available[0].pk: 'status Available', self.maintenance.pk: 'status Maintenance', missing: 'not found',
+        })
+        self.assertEqual(LibraryStats.load().num_instances_available, 30)
+
+    def test_validation(self):
+        with self.assertRaises(ValidationError):
+            loans.apply_loans(loans.CHECKOUT, self.ids(self.available))
+        with self.assertRaises(ValidationError):
+            loans.apply_loans(loans.RENEW, self.ids(self.available),
+                              due_back=datetime.date.today() - datetime.timedelta(days=1))
+        with self.assertRaises(ValidationError):
+            loans.apply_loans(loans.CHECKOUT, self.ids(self.available), borrower=self.reader,
+                              due_back=datetime.date.today() + datetime.timedelta(weeks=5))
+        self.assertFalse(BookInstance.objects.filter(status='o').exists())
+
+    def test_touches_book_and_author_versions(self):
+        book_version, author_version = self.book.updated_at, self.author.updated_at
+        copy = BookInstance.objects.get(pk=self.available[0].pk)
+        loans.apply_loans(loans.CHECKOUT, [copy.pk], borrower=self.reader)
+        copy.refresh_from_db()
+        self.assertGreater(copy.updated_at, book_version)
+        self.assertGreater(Book.objects.get(pk=self.book.pk).updated_at, book_version)
+        self.assertGreater(Author.objects.get(pk=self.author.pk).updated_at, author_version)
+
+
+class LoansBatchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='lhbnoFdb49', is_staff=True)
+        cls.librarian.user_permissions.add(*Permission.objects.filter(
+            codename__in=['can_mark_returned', 'view_bookinstance', 'change_bookinstance'],
+        ))
+        cls.reader = User.objects.create_user(username='reader', password='lhbnoFdb49')
+        book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976')
+        cls.copies = [BookInstance.objects.create(book=book, imprint='Corgi', status='a') for _ in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.librarian)
+
+    def test_requires_permission(self):
+        self.client.force_login(self.reader)
+        resp = self.client.get(reverse('loans-batch'))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_checkout_list_of_copies(self):
+        copies = '\n'.join(str(copy.pk) for copy in self.copies[:2])
+        resp = self.client.post(reverse('loans-batch'), {'action': 'checkout', 'copies': copies, 'borrower': 'reader'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'blog/loans_batch.html')
+        self.assertEqual(len(resp.context['result'].updated), 2)
+        self.assertEqual(BookInstance.objects.filter(status='o', borrower=self.reader).count(), 2)
+
+    def test_invalid_form(self):
+        resp = self.client.post(reverse('loans-batch'), {'action': 'checkout', 'copies': 'not-a-uuid'})
+        self.assertFormError(resp, 'form', 'copies', 'Enter valid copy UUIDs')
+        self.assertFormError(resp, 'form', 'borrower', 'Borrower is required to check out copies')
+
+        past = datetime.date.today() - datetime.timedelta(days=1)
+        resp = self.client.post(reverse('loans-batch'), {'action': 'renew', 'copies': str(self.copies[0].pk), 'due_back': past})
+        self.assertFormError(resp, 'form', 'due_back', 'Invalid date - renewal in past')
+
+    def test_admin_actions(self):
+        BookInstance.objects.filter(pk=self.copies[0].pk).update(status='o', borrower=self.reader)
+        resp = self.client.post(reverse('admin:blog_bookinstance_changelist'), {
+            'action': 'return_copies', '_selected_action': [copy.pk for copy in self.copies],
+        })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), 3)
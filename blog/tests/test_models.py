@@ -33,4 +33,106 @@ class AuthorModelTest(TestCase):
     def test_get_absolute_url(self):
         author = Author.objects.get(id=1)
         # Тест будет провален, еслиurlconf не определен.
-        self.assertEqual(author.get_absolute_url(), '/blog/author/1')
\ No newline at end of file
+        self.assertEqual(author.get_absolute_url(), '/blog/author/1')
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from blog.models import Book, BookInstance, Genre, LibraryStats
+
+
+class LibraryStatsModelTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG', author=cls.author)
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o')
+
+    def test_load_matches_counts(self):
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_books, 1)
+        self.assertEqual(stats.num_instances, 2)
+        self.assertEqual(stats.num_instances_available, 1)
+        self.assertEqual(stats.num_authors, 1)
+        self.assertEqual(stats.num_genres, 1)
+
+    def test_counters_follow_create_and_delete(self):
+        LibraryStats.load()
+        Genre.objects.create(name='Horror')
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_genres, 2)
+        self.assertEqual(stats.num_instances, 3)
+        self.assertEqual(stats.num_instances_available, 2)
+
+        BookInstance.objects.get(pk=copy.pk).delete()
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_instances, 2)
+        self.assertEqual(stats.num_instances_available, 1)
+
+    def test_counters_follow_status_change(self):
+        LibraryStats.load()
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        self.assertEqual(LibraryStats.load().num_instances_available, 2)
+
+        # Повторное сохранение без смены статуса не меняет счетчик
+        copy.save()
+        self.assertEqual(LibraryStats.load().num_instances_available, 2)
+
+        copy.status = 'm'
+        copy.save()
+        self.assertEqual(LibraryStats.load().num_instances_available, 1)
+
+    def test_deferred_status_change_is_counted(self):
+        LibraryStats.load()
+        # Прежний статус читается одним запросом, без пересчета всех счетчиков
+        with mock.patch.object(LibraryStats, 'rebuild', side_effect=AssertionError('rebuild')):
+            copy = BookInstance.objects.defer('status').get(imprint='Imprint', status='o')
+            copy.status = 'a'
+            copy.save()
+            self.assertEqual(LibraryStats.load().num_instances_available, 2)
+
+            copy = BookInstance.objects.only('id', 'book').get(pk=copy.pk)
+            copy.imprint = 'Reprint'
+            copy.save()
+            self.assertEqual(LibraryStats.load().num_instances_available, 2)
+
+            BookInstance.objects.only('id').get(pk=copy.pk).delete()
+            stats = LibraryStats.load()
+        self.assertEqual((stats.num_instances, stats.num_instances_available), (1, 1))
+
+    def test_rebuild_command_fixes_drift(self):
+        LibraryStats.objects.filter(pk=LibraryStats.SINGLETON_PK).update(num_books=100, num_instances_available=0)
+        call_command('rebuild_library_stats', stdout=StringIO())
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_books, 1)
+        self.assertEqual(stats.num_instances_available, 1)
+
+
+class BookQuerySetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG')
+        for status in ('a', 'a', 'o', 'm'):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status)
+        Book.objects.create(title='No Copies', summary='Empty', isbn='HIJKLMN')
+
+    def test_with_copy_counts(self):
+        book = Book.objects.with_copy_counts().get(pk=self.book.pk)
+        self.assertEqual(book.num_copies, 4)
+        self.assertEqual(book.num_available, 2)
+        self.assertEqual(book.num_on_loan, 1)
+        self.assertEqual(book.num_maintenance, 1)
+        self.assertEqual(book.num_reserved, 0)
+
+    def test_with_copy_counts_for_book_without_copies(self):
+        book = Book.objects.with_copy_counts().get(isbn='HIJKLMN')
+        self.assertEqual(book.num_copies, 0)
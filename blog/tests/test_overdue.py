@@ -0,0 +1,96 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from blog.models import Book, BookInstance, OverdueSweep
+from blog.overdue import sweep_overdue
+
+
+class OverdueSweepTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2026, 3, 10)
+        cls.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        cls.bob = User.objects.create_user(username='bob', email='bob@example.com')
+        cls.carol = User.objects.create_user(username='carol')
+        book = Book.objects.create(title='Small Gods', summary='Omnia', isbn='9780552152976')
+
+        def loan(borrower, days, status='o'):
+            return BookInstance.objects.create(book=book, imprint='Corgi', borrower=borrower, status=status,
+                                               due_back=cls.today + datetime.timedelta(days=days))
+
+        loan(cls.alice, -5)
+        loan(cls.alice, -1)
+        loan(cls.bob, -2)
+        loan(cls.carol, -3)
+        loan(cls.bob, 0)
+        loan(cls.bob, 3)
+        loan(cls.alice, -10, status='a')
+
+    def test_overdue_queryset(self):
+        self.assertEqual(BookInstance.objects.overdue(today=self.today).count(), 4)
+        since = self.today - datetime.timedelta(days=2)
+        self.assertEqual(BookInstance.objects.overdue(today=self.today, since=since).count(), 2)
+        for copy in BookInstance.objects.overdue():
+            self.assertTrue(copy.is_overdue)
+
+    def test_sweep_groups_per_borrower(self):
+        # отметка (с созданием строки), одна выборка просроченных выдач, сохранение отметки
+        with self.assertNumQueries(8):
+            result = sweep_overdue(today=self.today)
+        self.assertEqual(result.num_loans, 4)
+        self.assertEqual([summary.borrower.username for summary in result.summaries], ['alice', 'carol', 'bob'])
+        self.assertEqual((result.sent, result.without_email), (2, 1))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Просроченные книги: 2')
+        self.assertIn('Small Gods', mail.outbox[0].body)
+        self.assertEqual(OverdueSweep.load().swept_until, self.today)
+
+    def test_mail_is_sent_after_commit(self):
+        depth = len(connection.savepoint_ids)
+        send_messages = EmailBackend.send_messages
+        seen = []
+
+        def check_state(backend, messages):
+            # Транзакция с блокировкой отметки уже зафиксирована, отметка сдвинута
+            seen.append((len(connection.savepoint_ids), OverdueSweep.load().swept_until))
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=check_state):
+            sweep_overdue(today=self.today, batch_size=1)
+        self.assertEqual(seen, [(depth, self.today)] * 2)
+
+    def test_sweep_is_incremental(self):
+        sweep_overdue(today=self.today)
+        mail.outbox = []
+        result = sweep_overdue(today=self.today)
+        self.assertEqual((result.num_loans, len(mail.outbox)), (0, 0))
+
+        # Через день просрочен только экземпляр со сроком "сегодня"
+        result = sweep_overdue(today=self.today + datetime.timedelta(days=1))
+        self.assertEqual(result.num_loans, 1)
+        self.assertEqual(mail.outbox[0].to, ['bob@example.com'])
+
+        result = sweep_overdue(today=self.today + datetime.timedelta(days=1), full=True, send=False)
+        self.assertEqual(result.num_loans, 5)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('sweep_overdue', date=self.today, dry_run=True, stdout=out)
+        self.assertIn('4 loans, 3 borrowers', out.getvalue())
+        self.assertIn('alice: 2', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIsNone(OverdueSweep.load().swept_until)
+
+        out = StringIO()
+        call_command('sweep_overdue', date=self.today, batch_size=1, stdout=out)
+        self.assertIn('Sent 2 reminders, 1 borrowers without e-mail.', out.getvalue())
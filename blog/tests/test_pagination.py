@@ -0,0 +1,117 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog.models import Author, Book, BookInstance
+from blog.pagination import InvalidCursor, KeysetPaginator
+from blog.tests.utils import QueryBudgetMixin
+
+
+class KeysetPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Повторяющиеся даты и пустые due_back проверяют разрешение равенств и NULL
+        cls.book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG')
+        today = datetime.date.today()
+        for num in range(23):
+            due_back = None if num % 7 == 0 else today + datetime.timedelta(days=num % 4)
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', due_back=due_back, status='o')
+
+    def walk(self, paginator):
+        """Проходит все страницы вперед, а затем обратно, возвращая списки первичных ключей."""
+        forward, pages = [], []
+        page = paginator.page()
+        pages.append(page)
+        while True:
+            forward.extend(obj.pk for obj in page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+
+        backward = [obj.pk for obj in page]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward = [obj.pk for obj in page] + backward
+        return forward, backward, pages
+
+    def expected(self, *ordering):
+        return list(BookInstance.objects.order_by(*ordering).values_list('pk', flat=True))
+
+    def test_walks_all_rows_in_order(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 5, ('due_back', 'id'))
+        forward, backward, pages = self.walk(paginator)
+        expected = self.expected('due_back', 'id')
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertEqual(len(pages), 5)
+        self.assertFalse(pages[0].has_previous())
+        self.assertFalse(pages[-1].has_next())
+
+    def test_descending_ordering(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 4, ('-due_back', 'id'))
+        forward, backward, _ = self.walk(paginator)
+        expected = self.expected('-due_back', 'id')
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_page_does_not_count_rows(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 5, ('due_back', 'id'))
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1):
+            page = paginator.page(cursor)
+        self.assertEqual(len(page), 5)
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 5, ('due_back', 'id'))
+        for cursor in ('garbage', 'WyJ4IixbXV0', 'WyJuIixbMV1d'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginator.page(cursor)
+
+
+@override_settings(BLOG_KEYSET_PAGINATION=True)
+class KeysetListViewTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(13):
+            Author.objects.create(first_name=f'Christian {num}', last_name='Surname')
+        cls.user = User.objects.create_user(username='librarian', password='lhbnoFdb49')
+        cls.user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        book = Book.objects.create(title='Book Title', summary='My book', isbn='ABCDEFG')
+        for num in range(12):
+            BookInstance.objects.create(
+                book=book, imprint='Imprint', borrower=cls.user, status='o',
+                due_back=datetime.date.today() + datetime.timedelta(days=num % 3),
+            )
+
+    def test_author_list_uses_cursor(self):
+        resp = self.client.get(reverse('authors'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertEqual(len(resp.context['author_list']), 10)
+        next_cursor = resp.context['page_obj'].next_cursor
+        self.assertContains(resp, f'?cursor={next_cursor}')
+        self.assertNotContains(resp, 'Page 1 of')
+
+        resp = self.client.get(reverse('authors'), {'cursor': next_cursor})
+        self.assertEqual(len(resp.context['author_list']), 3)
+        self.assertFalse(resp.context['page_obj'].has_next())
+        self.assertTrue(resp.context['page_obj'].has_previous())
+
+    def test_invalid_cursor_is_404(self):
+        resp = self.client.get(reverse('books'), {'cursor': 'garbage'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_loan_lists_skip_count_query(self):
+        self.client.force_login(self.user)
+        for name in ('my-borrowed', 'all-borrowed'):
+            with self.subTest(view=name):
+                with self.assertMaxQueries(5) as queries:
+                    resp = self.client.get(reverse(name))
+                self.assertEqual(len(resp.context['bookinstance_list']), 10)
+                self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
@@ -0,0 +1,169 @@
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import URLPattern, reverse
+
+from blog import urls as blog_urls
+from blog import visits
+from blog.fragments import get_cache
+from blog.models import Author, Book, BookInstance, Genre, Language, LibraryStats
+from blog.tests.utils import QueryBudgetMixin
+
+
+# Бюджет запросов для каждого именованного маршрута из blog/urls.py.
+# Пользователь залогинен с правом can_mark_returned, поэтому в бюджет входят
+# запросы сессии и пользователя (2 запроса). Разрешения после прогрева берутся
+# из кэша (blog/auth_backends.py) и запросов не требуют.
+QUERY_BUDGETS = {
+    'index': 4,
+    'books': 5,
+    'book-detail': 6,
+    'authors': 5,
+    'author-detail': 5,
+    'my-borrowed': 3,
+    'my-borrowed-json': 2,
+    'all-borrowed': 4,
+    'renew-book-librarian': 3,
+    'loans-batch': 2,
+    'author-create': 2,
+    'author-update': 3,
+    'author-delete': 3,
+    'book-create': 3,
+    'book-update': 7,
+    'book-delete': 3,
+    'catalog-export': 4,
+    'search': 2,
+    'autocomplete': 0,
+}
+
+
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Каждое представление из blog/urls.py должно укладываться в свой бюджет запросов
+    независимо от количества связанных объектов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='librarian', password='lhbnoFdb49')
+        cls.user.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name=f'Genre {num}') for num in range(3)]
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        due_back = datetime.date.today() + datetime.timedelta(days=3)
+        for book_num in range(5):
+            book = Book.objects.create(
+                title=f'Book {book_num}',
+                summary='My book',
+                isbn=f'ISBN{book_num}',
+                author=cls.author,
+                language=language,
+            )
+            book.genre.set(genres)
+            for copy_num in range(5):
+                copy = BookInstance.objects.create(
+                    book=book,
+                    imprint='Unlikely Imprint, 2016',
+                    due_back=due_back,
+                    borrower=cls.user,
+                    status='o',
+                )
+        cls.book = book
+        cls.copy = copy
+        LibraryStats.rebuild()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # Бюджеты рассчитаны на промах кэша фрагментов, прогретые разрешения и без записи пачки посещений
+        get_cache().clear()
+        User.objects.get(pk=self.user.pk).has_perm('blog.can_mark_returned')
+        visits.buffer.reset()
+
+    def url_kwargs(self, name):
+        """Аргументы для reverse() каждого маршрута, которому нужен первичный ключ."""
+        if name.startswith('author-') and name != 'author-create':
+            return {'pk': self.author.pk}
+        if name.startswith('book-') and name != 'book-create':
+            return {'pk': self.book.pk}
+        if name == 'renew-book-librarian':
+            return {'pk': self.copy.pk}
+        if name == 'autocomplete':
+            return {'index': 'authors'}
+        return {}
+
+    def test_every_route_has_a_budget(self):
+        names = {pattern.name for pattern in blog_urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_views_stay_within_query_budget(self):
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                url = reverse(name, kwargs=self.url_kwargs(name))
+                with self.assertMaxQueries(budget):
+                    resp = self.client.get(url)
+                    if resp.streaming:
+                        # Запросы потокового ответа выполняются при чтении его содержимого
+                        b''.join(resp.streaming_content)
+                self.assertEqual(resp.status_code, 200)
+
+    def test_book_detail_queries_do_not_grow_with_copies(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.pk})
+        with self.assertMaxQueries(QUERY_BUDGETS['book-detail']) as before:
+            self.client.get(url)
+        for copy_num in range(20):
+            BookInstance.objects.create(book=self.book, imprint='Another Imprint', status='a')
+        with self.assertMaxQueries(QUERY_BUDGETS['book-detail']) as after:
+            self.client.get(url)
+        self.assertEqual(len(before.captured_queries), len(after.captured_queries))
+
+    def test_author_detail_queries_do_not_grow_with_books(self):
+        url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        with self.assertMaxQueries(QUERY_BUDGETS['author-detail']) as before:
+            resp = self.client.get(url)
+        self.assertContains(resp, '</a> (5)')
+        for book_num in range(20):
+            book = Book.objects.create(title=f'Extra {book_num}', summary='More', isbn=f'EXTRA{book_num}', author=self.author)
+            BookInstance.objects.create(book=book, imprint='Another Imprint', status='a')
+        with self.assertMaxQueries(QUERY_BUDGETS['author-detail']) as after:
+            self.client.get(url)
+        self.assertEqual(len(before.captured_queries), len(after.captured_queries))
+
+    def test_author_detail_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_author_detail', books=[1, 5], repeat=1, stdout=out)
+        # Число запросов в последней колонке одинаково для любого количества книг
+        rows = out.getvalue().splitlines()[1:]
+        self.assertEqual(len({row.split()[-1] for row in rows}), 1)
+
+    def test_loan_index_benchmark_command_leaves_no_trace(self):
+        out = StringIO()
+        call_command('bench_loan_indexes', copies=200, books=20, users=5, repeat=1, stdout=out)
+        self.assertIn('Speedup', out.getvalue())
+        # Данные и удаленные индексы откатываются вместе с транзакцией
+        self.assertEqual(BookInstance.objects.count(), 25)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, BookInstance._meta.db_table)
+        for index in BookInstance._meta.indexes:
+            self.assertIn(index.name, constraints)
+
+    def test_url_benchmark_reports_every_route_as_json(self):
+        out = StringIO()
+        call_command('bench_urls', authors=3, books=10, genres=2, copies=20, users=2, repeat=2,
+                     stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        routes = {route['name']: route for route in report['routes']}
+        self.assertEqual(set(QUERY_BUDGETS) - set(routes), set())
+        self.assertLessEqual({'login', 'logout', 'password_change'}, set(routes))
+        for route in report['routes']:
+            self.assertLess(route['status'], 400, route['url'])
+            self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+            self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+            self.assertIsNotNone(route['memory_kb'])
+        self.assertLessEqual(routes['index']['queries'], QUERY_BUDGETS['index'])
+        self.assertEqual(report['meta']['seed']['books'], 10)
+        # Синтетическая библиотека откатывается вместе с транзакцией
+        self.assertEqual(Book.objects.count(), 5)
@@ -0,0 +1,141 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from blog import search
+from blog.importer import CatalogImporter
+from blog.models import Author, Book, Genre
+
+
+class SearchIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.wizard = Book.objects.create(
+            title='A Wizard of Earthsea', summary='A young mage on an archipelago.', isbn='9780547773742',
+            author=cls.author,
+        )
+        cls.wizard.genre.add(cls.genre)
+        cls.dispossessed = Book.objects.create(
+            title='The Dispossessed', summary='An anarchist physicist and a wizard of time.', isbn='9780061054884',
+        )
+
+    def ids(self, query, **kwargs):
+        return [pk for pk, _ in search.search_books(query, **kwargs)]
+
+    def test_searches_all_fields(self):
+        self.assertEqual(self.ids('earthsea'), [self.wizard.pk])
+        self.assertEqual(self.ids('archipelago'), [self.wizard.pk])
+        self.assertEqual(self.ids('ursula guin'), [self.wizard.pk])
+        self.assertEqual(self.ids('fantasy'), [self.wizard.pk])
+        self.assertEqual(self.ids('9780061054884'), [self.dispossessed.pk])
+        self.assertEqual(self.ids('wizard dragons'), [])
+        self.assertEqual(self.ids('  '), [])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.ids('wizard'), [self.wizard.pk, self.dispossessed.pk])
+
+    def test_ranking_covers_all_matches(self):
+        # Сотни книг со словом в описании не вытесняют книгу с ним в названии
+        Book.objects.bulk_create([
+            Book(title=f'Chronicle {num}', summary='A story of war and peace.', isbn=f'979{num:010}')
+            for num in range(600)
+        ])
+        war = Book.objects.create(title='War', summary='Summary', isbn='9780000000001')
+        search.rebuild_index()
+        self.assertEqual(self.ids('war', limit=10)[0], war.pk)
+        self.assertEqual(self.ids('war', prefix=False, limit=10)[0], war.pk)
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.ids('earth'), [self.wizard.pk])
+        self.assertEqual(self.ids('earth', prefix=False), [])
+        self.assertEqual(self.ids('dispo'), [self.dispossessed.pk])
+
+    def test_query_syntax_is_escaped(self):
+        for query in ('"wizard', 'wizard*', 'earthsea:', "wizard') --", '(wizard)^'):
+            with self.subTest(query=query):
+                self.assertIn(self.wizard.pk, self.ids(query))
+        # Операторы FTS5 ищутся как обычные слова
+        self.assertEqual(self.ids('wizard OR NOT'), [])
+
+    def test_index_follows_changes(self):
+        self.author.last_name = 'Kroeber'
+        self.author.save()
+        self.assertEqual(self.ids('kroeber'), [self.wizard.pk])
+
+        self.wizard.genre.clear()
+        self.assertEqual(self.ids('fantasy'), [])
+        self.genre.book_set.add(self.dispossessed)
+        self.genre.name = 'Speculative'
+        self.genre.save()
+        self.assertEqual(self.ids('speculative'), [self.dispossessed.pk])
+
+        self.genre.delete()
+        self.assertEqual(self.ids('speculative'), [])
+        self.author.delete()
+        self.assertEqual(self.ids('kroeber'), [])
+
+        self.dispossessed.delete()
+        self.assertEqual(self.ids('dispossessed'), [])
+
+    def test_importer_indexes_books(self):
+        CatalogImporter().run([
+            {'isbn': '9780547773742', 'title': 'A Wizard of Earthsea', 'summary': 'Ged and the shadow.'},
+            {'isbn': '9780441478125', 'title': 'The Left Hand of Darkness', 'summary': 'Winter planet.'},
+        ])
+        self.assertEqual(self.ids('shadow'), [self.wizard.pk])
+        self.assertEqual(self.ids('archipelago'), [])
+        self.assertEqual(len(self.ids('darkness')), 1)
+
+    def test_rebuild_index(self):
+        Book.objects.filter(pk=self.wizard.pk).update(title='Tehanu')
+        self.assertEqual(self.ids('tehanu'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.ids('tehanu'), [self.wizard.pk])
+
+
+class SearchViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        for num in range(12):
+            Book.objects.create(title=f'Earthsea {num}', summary='Archipelago', isbn=f'ISBN{num}', author=author)
+        Book.objects.create(title='Tales from Earthsea', summary='Stories', isbn='TALES')
+
+    def test_view_lists_ranked_results(self):
+        resp = self.client.get(reverse('search'), {'q': 'earthsea'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'blog/book_search.html')
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertEqual(len(resp.context['book_list']), 10)
+        self.assertContains(resp, '?q=earthsea&page=2')
+
+    def test_view_without_query(self):
+        resp = self.client.get(reverse('search'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['book_list']), 0)
+
+    def test_api_search(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get('/api/books/search/', {'q': 'tales earth', 'fields': 'title,rank'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data), 1)
+        self.assertEqual(resp.data[0]['title'], 'Tales from Earthsea')
+        self.assertEqual(set(resp.data[0]), {'title', 'rank'})
+
+        resp = self.client.get('/api/books/search/', {'q': 'earth', 'prefix': '0'})
+        self.assertEqual(resp.data, [])
+        resp = self.client.get('/api/books/search/', {'q': 'earthsea', 'limit': '5'})
+        self.assertEqual(len(resp.data), 5)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_search', books=200, repeat=2, target_ms=1000, stdout=out)
+        self.assertIn('typeahead', out.getvalue())
+        self.assertIn('within', out.getvalue())
+        self.assertEqual(Book.objects.count(), 13)
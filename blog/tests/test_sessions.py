@@ -0,0 +1,85 @@
+import datetime
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.sessions import prune_expired_sessions
+
+
+class PruneSessionsTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        for num in range(25):
+            Session.objects.create(session_key=f'expired{num:02}', session_data='',
+                                   expire_date=now - datetime.timedelta(days=1, minutes=num))
+        for num in range(5):
+            Session.objects.create(session_key=f'active{num}', session_data='',
+                                   expire_date=now + datetime.timedelta(days=1))
+
+    def test_deletes_expired_sessions_in_batches(self):
+        # Каждая пачка - выборка ключей и удаление (плюс точка сохранения внутри теста)
+        with self.assertNumQueries(3 * 4):
+            self.assertEqual(prune_expired_sessions(batch_size=10), 25)
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)),
+                         {f'active{num}' for num in range(5)})
+
+    def test_max_batches_limits_one_run(self):
+        self.assertEqual(prune_expired_sessions(batch_size=10, max_batches=2), 20)
+        # Первыми удаляются самые старые сессии
+        self.assertTrue(Session.objects.filter(session_key='expired00').exists())
+        self.assertFalse(Session.objects.filter(session_key='expired24').exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('prune_sessions', batch_size=7, pause=0, stdout=out)
+        self.assertIn('Deleted 25 expired sessions', out.getvalue())
+        self.assertEqual(Session.objects.count(), 5)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_command_skips_engines_without_database(self):
+        out = StringIO()
+        call_command('prune_sessions', stdout=out)
+        self.assertIn('nothing to prune', out.getvalue())
+        self.assertEqual(Session.objects.count(), 30)
+
+
+class SessionEngineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='lhbnoFdb49')
+
+    def test_login_works_with_every_engine(self):
+        for name, engine in settings.SESSION_ENGINES.items():
+            with self.subTest(engine=name), override_settings(SESSION_ENGINE=engine):
+                # SessionMiddleware выбирает хранилище при создании, поэтому клиент новый
+                client = Client()
+                self.assertTrue(client.login(username='reader', password='lhbnoFdb49'))
+                resp = client.get(reverse('my-borrowed'))
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.context['user'], self.user)
+                client.logout()
+                self.assertEqual(client.get(reverse('my-borrowed')).status_code, 302)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookies_do_not_write_to_database(self):
+        self.client.login(username='reader', password='lhbnoFdb49')
+        self.client.get(reverse('my-borrowed'))
+        self.assertFalse(Session.objects.exists())
+
+    def test_bench_sessions_command(self):
+        out = StringIO()
+        call_command('bench_sessions', repeat=2, stdout=out)
+        rows = dict(line.split()[0::4] for line in out.getvalue().splitlines()[1:])
+        self.assertEqual(rows['cache'], '0')
+        self.assertEqual(rows['signed_cookies'], '0')
+        self.assertGreater(int(rows['db']), 0)
+        # Сессии бенчмарка откатываются вместе с транзакцией
+        self.assertFalse(Session.objects.exists())
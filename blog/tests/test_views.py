@@ -1,9 +1,35 @@
 from django.test import TestCase
 
 from blog.models import Author
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 
+class IndexViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(first_name='John', last_name='Smith')
+        Author.objects.create(first_name='Jane', last_name='Doe')
+
+    def test_counts_in_context(self):
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['num_authors'], 2)
+        self.assertEqual(resp.context['num_books'], 0)
+
+    def test_counts_read_with_single_query(self):
+        # Прогрев: первая загрузка создает строку LibraryStats
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('index'))
+        # Счетчики читаются одним запросом; остальные запросы относятся к сессии
+        catalogue_queries = [q['sql'] for q in ctx.captured_queries if '"blog_' in q['sql']]
+        self.assertEqual(len(catalogue_queries), 1)
+        self.assertIn('blog_librarystats', catalogue_queries[0])
+
+
 class AuthorListViewTest(TestCase):
 
     @classmethod
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog import visits
+from blog.models import VisitCount
+
+
+@override_settings(BLOG_VISITS_FLUSH_SIZE=1000, BLOG_VISITS_FLUSH_INTERVAL=3600)
+class VisitCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'reader{num}', password='lhbnoFdb49') for num in range(5)]
+
+    def setUp(self):
+        visits.buffer.reset()
+
+    def test_anonymous_index_is_cacheable(self):
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('sessionid', resp.cookies)
+        self.assertIn('public', resp['Cache-Control'])
+        self.assertIn('max-age=60', resp['Cache-Control'])
+        self.assertIsNone(resp.context['num_visits'])
+        self.assertNotContains(resp, 'Вы уже посещали')
+        self.assertFalse(Session.objects.exists())
+
+    def test_user_visits_are_buffered(self):
+        self.client.force_login(self.users[0])
+        for expected in range(3):
+            resp = self.client.get(reverse('index'))
+            self.assertEqual(resp.context['num_visits'], expected)
+        self.assertIn('private', resp['Cache-Control'])
+        self.assertFalse(VisitCount.objects.exists())
+
+        self.assertEqual(visits.buffer.flush(), 3)
+        self.assertEqual(VisitCount.objects.get(user=self.users[0]).count, 3)
+        resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.context['num_visits'], 3)
+
+    def test_flush_writes_batch_with_constant_queries(self):
+        for user in self.users:
+            for _ in range(user.pk):
+                visits.buffer.add(user.pk)
+        # пользователи без строки, вставка и одно обновление (плюс точки сохранения)
+        with self.assertNumQueries(5):
+            visits.buffer.flush()
+        for user in self.users:
+            visits.buffer.add(user.pk)
+        with self.assertNumQueries(4):
+            visits.buffer.flush()
+        self.assertEqual(dict(VisitCount.objects.values_list('user_id', 'count')),
+                         {user.pk: user.pk + 1 for user in self.users})
+
+    @override_settings(BLOG_VISITS_FLUSH_SIZE=3)
+    def test_flush_when_buffer_is_full(self):
+        visits.buffer.add(self.users[0].pk)
+        visits.buffer.add(self.users[1].pk)
+        self.assertFalse(VisitCount.objects.exists())
+        visits.buffer.add(self.users[0].pk)
+        self.assertEqual(VisitCount.objects.get(user=self.users[0]).count, 2)
+
+    def test_deleted_users_are_skipped(self):
+        user = User.objects.create_user(username='gone')
+        visits.buffer.add(user.pk)
+        visits.buffer.add(self.users[0].pk)
+        user.delete()
+        visits.buffer.flush()
+        self.assertEqual(list(VisitCount.objects.values_list('user_id', flat=True)), [self.users[0].pk])
+
+    @override_settings(BLOG_VISITS_FLUSH_SIZE=1)
+    def test_failed_flush_keeps_visits_and_page_works(self):
+        self.client.force_login(self.users[0])
+        with mock.patch.object(VisitCount.objects, 'bulk_create', side_effect=DatabaseError('locked')), \
+                self.assertLogs('blog.visits', 'ERROR'):
+            resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(visits.buffer.pending_for(self.users[0].pk), 1)
+        self.assertFalse(VisitCount.objects.exists())
+
+        self.assertEqual(visits.buffer.flush(), 1)
+        self.assertEqual(VisitCount.objects.get(user=self.users[0]).count, 1)
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Примесь для TestCase: проверяет, что блок кода укладывается в бюджет запросов к БД."""
+
+    @contextmanager
+    def assertMaxQueries(self, limit, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > limit:
+            queries = '\n'.join(
+                f'{num}. {query["sql"]}' for num, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{executed} queries executed, at most {limit} expected\nCaptured queries were:\n{queries}')
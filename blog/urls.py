@@ -1,19 +1,49 @@
 from django.urls import path, re_path
 from . import views
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('books/', views.BookListView.as_view(), name='books'),
-    re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
-    path('authors/', views.AuthorListView.as_view(), name='authors'),
-    path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+
+def catalogue_urlpatterns(async_views=False):
+    """Главная страница и страницы каталога: синхронные представления или их асинхронные
+    версии из blog/async_views.py (см. blog/urls_async.py)."""
+    if async_views:
+        from . import async_views as catalogue
+        return [
+            path('', catalogue.index, name='index'),
+            path('books/', catalogue.book_list, name='books'),
+            re_path(r'^book/(?P<pk>\d+)$', catalogue.book_detail, name='book-detail'),
+            path('authors/', catalogue.author_list, name='authors'),
+            path('author/<int:pk>', catalogue.author_detail, name='author-detail'),
+        ]
+    return [
+        path('', views.index, name='index'),
+        path('books/', views.BookListView.as_view(), name='books'),
+        re_path(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
+        path('authors/', views.AuthorListView.as_view(), name='authors'),
+        path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+    ]
+
+
+urlpatterns = catalogue_urlpatterns() + [
+    path('search/', views.BookSearchView.as_view(), name='search'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
+    path('mybooks.json', views.my_borrowed_json, name='my-borrowed-json'),
     path('borrowed/', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),
 ]
 
 # URLconf для библиотеккаря, чтобы продлить книгу.
 urlpatterns += [
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
+    path('loans/batch/', views.loans_batch, name='loans-batch'),
+]
+
+# URLconf для потоковой выгрузки каталога.
+urlpatterns += [
+    path('export/', views.catalog_export, name='catalog-export'),
+]
+
+# URLconf для подсказок при вводе (виджеты автора, жанров и книги в формах).
+urlpatterns += [
+    path('autocomplete/<str:index>/', views.autocomplete, name='autocomplete'),
 ]
 
 # URLConf для создания, обновления и удаления авторов
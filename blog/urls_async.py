@@ -0,0 +1,7 @@
+"""Маршруты blog.urls, в которых главная страница и страницы каталога асинхронные."""
+from .urls import catalogue_urlpatterns, urlpatterns as sync_urlpatterns
+
+_catalogue = catalogue_urlpatterns(async_views=True)
+_names = {pattern.name for pattern in _catalogue}
+
+urlpatterns = _catalogue + [pattern for pattern in sync_urlpatterns if pattern.name not in _names]
@@ -1,101 +1,172 @@
 import datetime
 
+from django.conf import settings
+from django.db.models import Prefetch
 from django.shortcuts import render
-from .models import Book, Author, BookInstance, Genre
+from .models import Book, Author, BookInstance, Genre, Language, LibraryStats
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
+from django.core.exceptions import PermissionDenied
+from django.utils.cache import patch_cache_control, patch_response_headers
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import condition
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from blog.forms import RenewBookForm
+from blog import instrumentation, loan_summary, search, visits
+from blog.autocomplete import INDEXES
+from blog.conditional import author_list_version, author_version, book_list_version, book_version, catalog_condition
+from blog.db import pool
+from blog.exporter import FORMATS, export_catalog
+from blog.forms import BookForm, LoanBatchForm, RenewBookForm
+from blog.loans import apply_loans
+from blog.pagination import KeysetPaginationMixin
 from blog.models import Author
 
 
 def index(request):
     """Функция просмотра главной страницы сайта."""
-    #Сгенерировать кол-во некоторых основных объектов
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+    # Счетчики поддерживаются сигналами, поэтому достаточно одного запроса по первичному ключу
+    stats = LibraryStats.load()
 
-    # Доступные книги (status = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
+    # Количество посещений этого представления. Считаются только вошедшие пользователи:
+    # без записи в сессию ответ анонимному посетителю одинаков для всех и кэшируется.
+    num_visits = visits.record_visit(request.user) if request.user.is_authenticated else None
 
-    # 'all()' подразумевается по умолчанию
-    num_authors = Author.objects.count()
-
-    # Все доступные жанры
-    num_gener = Genre.objects.count()
-
-    # Количество посещений этого представления
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
-
-    context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_gener': num_gener,
+    # Визуализировать HTML-шаблон index.html с данными в переменной context
+    response = render(request, 'index.html', context=index_context(stats, num_visits))
+    return patch_index_caching(response, num_visits)
+
+
+def index_context(stats, num_visits):
+    """Контекст главной страницы (общий для index и его асинхронной версии)."""
+    return {
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_authors': stats.num_authors,
+        'num_gener': stats.num_genres,
         'num_visits': num_visits,
     }
 
-    # Визуализировать HTML-шаблон index.html с данными в переменной context
-    return render(request, 'index.html', context=context)
 
+def patch_index_caching(response, num_visits):
+    """Анонимный ответ (без счетчика посещений) кэшируется, ответ пользователю - только в браузере."""
+    if num_visits is None:
+        patch_response_headers(response, cache_timeout=getattr(settings, 'BLOG_INDEX_CACHE_SECONDS', 60))
+        patch_cache_control(response, public=True)
+    else:
+        patch_cache_control(response, private=True)
+    return response
 
-class BookListView(generic.ListView):
+
+@catalog_condition(book_list_version)
+class BookListView(KeysetPaginationMixin, generic.ListView):
     """Обшее представление списка книг на основе классов."""
     model = Book
     paginate_by = 10
+    # Book.Meta.ordering сортирует по имени автора через JOIN; для поиска по ключу
+    # используется столбец author_id, который входит в индекс book_title_author_idx.
+    keyset_ordering = ('title', 'author_id', 'id')
+
+    def get_queryset(self):
+        return Book.objects.select_related('author')
 
 
+@catalog_condition(book_version)
 class BookDetailView(generic.DetailView):
     """Общее представление сведений для книги на основе классов."""
     model = Book
 
+    def get_queryset(self):
+        # Автор, язык и жанры загружаются фиксированным числом запросов. Экземпляры
+        # запрашиваются шаблоном только при промахе кэша фрагмента 'book-copies'.
+        return Book.objects.select_related('author', 'language').prefetch_related('genre')
+
 
-class AuthorListView(generic.ListView):
+@catalog_condition(author_list_version)
+class AuthorListView(KeysetPaginationMixin, generic.ListView):
     """Общее представление списка авторов на основе классов."""
     model = Author
     paginate_by = 10
+    keyset_ordering = ('last_name', 'first_name', 'id')
 
 
+@catalog_condition(author_version)
 class AuthorDetailView(generic.DetailView):
+    # Книги автора с количеством экземпляров загружаются одним запросом
+    # (author.book_set.with_copy_counts) и только при промахе кэша фрагмента 'author-books'.
     model = Author
 
 
+class BookSearchView(generic.ListView):
+    """Поиск книг по названию, ISBN, автору, жанрам и описанию в порядке релевантности."""
+    template_name = 'blog/book_search.html'
+    context_object_name = 'book_list'
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.ranked_books(Book.objects.select_related('author'), self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
 class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
     """Общий список книг на основе классов, предоставленных текущему пользователю во временное пользование."""
-    model = BookInstance
     template_name = 'blog/bookinstance_list_borrowed_user.html'
+    context_object_name = 'bookinstance_list'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user)\
-                .filter(status__exact='o').order_by('due_back')
+        # Сводка выдач берется из кэша (blog/loan_summary.py) и постранично делится в памяти,
+        # поэтому постраничный вывод по ключу ей не нужен
+        return loan_summary.get_summary(self.request.user).loans
+
 
+def my_borrowed_version(request):
+    if not request.user.is_authenticated:
+        return None
+    request._loan_summary = loan_summary.get_summary(request.user)
+    return request._loan_summary.etag
 
-class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
+
+@login_required
+@condition(etag_func=my_borrowed_version)
+def my_borrowed_json(request):
+    """Сводка выдач текущего пользователя в JSON для периодического опроса (304 без изменений)."""
+    summary = getattr(request, '_loan_summary', None) or loan_summary.get_summary(request.user)
+    response = JsonResponse(summary.as_dict())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class LoanedBooksAllListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """Общее представление на основе классов, в котором перечислены все книги, взятые во временное пользование. Видно только пользователям с разрешением can_mark_returned."""
     model = BookInstance
     permission_required = 'blog.can_mark_returned'
     template_name = 'blog/bookinstance_list_borrowed_all.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(status__exact='o')\
+                .select_related('book', 'borrower').order_by('due_back')
 
 
 @login_required
 @permission_required('blog.can_mark_returned', raise_exception=True)
 def renew_book_librarian(request, pk):
     """Функция просмотра для обновления конкретного экземпляра BookInstance библиотекарем."""
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    book_instance = get_object_or_404(BookInstance.objects.select_related('book', 'borrower'), pk=pk)
 
     # Обработает данные, если это POST запрос
     if request.method == 'POST':
@@ -123,6 +194,76 @@ def renew_book_librarian(request, pk):
     return render(request, 'blog/book_renew_librarian.html', context)
 
 
+@login_required
+@permission_required('blog.can_mark_returned', raise_exception=True)
+def loans_batch(request):
+    """Пакетная выдача, возврат или продление экземпляров в одной транзакции (например, тележка возвратов)."""
+    result = None
+    if request.method == 'POST':
+        form = LoanBatchForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            # Экземпляры, заблокированные параллельной операцией, пропускаются, а не ждут ее окончания
+            result = apply_loans(data['action'], data['copies'], borrower=data['borrower'],
+                                 due_back=data['due_back'], skip_locked=True)
+            form = LoanBatchForm(initial={'action': data['action']})
+    else:
+        form = LoanBatchForm()
+
+    return render(request, 'blog/loans_batch.html', {'form': form, 'result': result})
+
+
+@login_required
+@permission_required('blog.can_mark_returned', raise_exception=True)
+def catalog_export(request):
+    """Потоковая выгрузка всего каталога в CSV (?format=csv) или NDJSON (?format=ndjson)."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise Http404('Unknown export format')
+
+    response = StreamingHttpResponse(export_catalog(fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+    return response
+
+
+def autocomplete(request, index):
+    """
+    Подсказки при вводе для виджетов select2 по индексу префиксов в памяти.
+
+    ?term= (или ?q=) - начало названия книги, ISBN, имени автора или жанра.
+    """
+    if index not in INDEXES:
+        raise Http404('Unknown autocomplete index')
+    query = request.GET.get('term') or request.GET.get('q', '')
+    results = INDEXES[index].search(query, limit=20)
+    return JsonResponse({
+        'results': [{'id': str(pk), 'text': text} for pk, text in results],
+        'pagination': {'more': False},
+    })
+
+
+def metrics(request):
+    """
+    Скользящая гистограмма замеров PerformanceMiddleware по маршрутам (JSON).
+
+    Доступна сотрудникам (is_staff) и по заголовку Authorization: Bearer <BLOG_METRICS_TOKEN>.
+    """
+    token = getattr(settings, 'BLOG_METRICS_TOKEN', '')
+    authorized = request.user.is_staff or bool(token) and constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}',
+    )
+    if not authorized:
+        raise PermissionDenied
+    response = JsonResponse({
+        'sample_rate': instrumentation.sample_rate(),
+        'window_seconds': instrumentation.histogram.window,
+        'routes': instrumentation.histogram.snapshot(),
+        'database_pools': pool.pool_stats(),
+    })
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     model = Author
     fields = ['first_name', 'last_name', 'date_of_birth', 'date_of_death']
@@ -143,13 +284,13 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
 
 class BookCreate(PermissionRequiredMixin, CreateView):
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
     permission_required = 'blog.can_mark_returned'
     
 
 class BookUpdate(PermissionRequiredMixin, UpdateView):
     model = Book
-    fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+    form_class = BookForm
     permission_required = 'blog.can_mark_returned'
 
 
@@ -163,7 +304,12 @@ class BookDelete(PermissionRequiredMixin, DeleteView):
 from django.contrib.auth.models import User, Group
 from rest_framework import viewsets
 from rest_framework import permissions
-from .serializers import UserSerializer, GroupSerializer
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .serializers import (
+    AuthorSerializer, BookInstanceSerializer, BookSearchSerializer, BookSerializer, GenreSerializer,
+    GroupSerializer, LanguageSerializer, UserSerializer, requested_fields,
+)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -174,6 +320,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = '-date_joined'
 
 
 class GroupViewSet(viewsets.ModelViewSet):
@@ -185,3 +332,109 @@ class GroupViewSet(viewsets.ModelViewSet):
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+
+class SparseFieldsQuerysetMixin:
+    '''
+    Строит запрос только под поля, запрошенные в ?fields= (по умолчанию - все).
+
+    field_queries сопоставляет полю сериализатора нужные ему столбцы (only),
+    связи (select_related, prefetch_related) и метод BookQuerySet с аннотациями,
+    поэтому список никогда не выполняет запросов на каждую строку.
+    '''
+    field_queries = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request) or set(self.field_queries)
+        only = [queryset.model._meta.pk.name]
+        select_related, prefetch_related, annotations = [], [], []
+        for name in fields & set(self.field_queries):
+            spec = self.field_queries[name]
+            only += spec.get('only', [])
+            select_related += spec.get('select_related', [])
+            prefetch_related += spec.get('prefetch_related', [])
+            if 'annotate' in spec and spec['annotate'] not in annotations:
+                annotations.append(spec['annotate'])
+        for method in annotations:
+            queryset = getattr(queryset, method)()
+        return queryset.select_related(*select_related)\
+                .prefetch_related(*prefetch_related)\
+                .only(*only)
+
+
+class BookViewSet(SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    '''Конечная точка API только для чтения списка книг и сведений о книге.'''
+    queryset = Book.objects.all()
+    serializer_class = BookSerializer
+    field_queries = {
+        'title': {'only': ['title']},
+        'summary': {'only': ['summary']},
+        'isbn': {'only': ['isbn']},
+        'author': {'only': ['author', 'author__first_name', 'author__last_name'], 'select_related': ['author']},
+        'language': {'only': ['language', 'language__name'], 'select_related': ['language']},
+        'genres': {'prefetch_related': ['genre']},
+        'copies': {'annotate': 'with_copy_counts'},
+        'available': {'annotate': 'with_copy_counts'},
+    }
+
+    @action(detail=False)
+    def search(self, request):
+        '''
+        Книги по запросу ?q= в порядке релевантности (без постраничного вывода).
+
+        Последнее слово ищется по префиксу (для подсказок при вводе), ?prefix=0
+        отключает это; ?limit= ограничивает число результатов.
+        '''
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), search.SEARCH_LIMIT)
+        except ValueError:
+            limit = 20
+        books = search.ranked_books(
+            self.get_queryset(),
+            request.query_params.get('q', ''),
+            limit=limit,
+            prefix=request.query_params.get('prefix') != '0',
+        )
+        serializer = BookSearchSerializer(books, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+
+class AuthorViewSet(SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    '''Конечная точка API только для чтения авторов.'''
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+    field_queries = {
+        'first_name': {'only': ['first_name']},
+        'last_name': {'only': ['last_name']},
+        'date_of_birth': {'only': ['date_of_birth']},
+        'date_of_death': {'only': ['date_of_death']},
+        'books': {'prefetch_related': [
+            Prefetch('book_set', queryset=Book.objects.only('id', 'author').order_by('title', 'id')),
+        ]},
+    }
+
+
+class BookInstanceViewSet(SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    '''Конечная точка API только для чтения экземпляров книг (без сведений о читателях).'''
+    queryset = BookInstance.objects.all()
+    serializer_class = BookInstanceSerializer
+    field_queries = {
+        'book': {'only': ['book', 'book__title'], 'select_related': ['book']},
+        'imprint': {'only': ['imprint']},
+        'status': {'only': ['status']},
+        'due_back': {'only': ['due_back']},
+    }
+
+
+class GenreViewSet(SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    '''Конечная точка API только для чтения жанров.'''
+    queryset = Genre.objects.all()
+    serializer_class = GenreSerializer
+    field_queries = {'name': {'only': ['name']}}
+
+
+class LanguageViewSet(SparseFieldsQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    '''Конечная точка API только для чтения языков.'''
+    queryset = Language.objects.all()
+    serializer_class = LanguageSerializer
+    field_queries = {'name': {'only': ['name']}}
@@ -0,0 +1,127 @@
+"""Счетчик посещений главной страницы без записи в сессию.
+
+Раньше счетчик хранился в сессии: каждый просмотр главной страницы сохранял
+сессию (запись в БД) и отправлял Set-Cookie, поэтому страницу нельзя было
+кэшировать. Теперь посещения вошедших пользователей копятся в памяти процесса
+и записываются в VisitCount пачкой (два-три запроса на всю пачку), когда накопится
+BLOG_VISITS_FLUSH_SIZE посещений или пройдет BLOG_VISITS_FLUSH_INTERVAL секунд
+с прошлой записи, а также при завершении процесса. Анонимные посещения не
+считаются, и главная страница для анонимных посетителей кэшируется.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .models import VisitCount
+
+logger = logging.getLogger(__name__)
+
+
+class VisitBuffer:
+    """Накопленные, но еще не записанные в БД посещения (user_id -> число)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed_at = time.monotonic()
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'BLOG_VISITS_FLUSH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'BLOG_VISITS_FLUSH_INTERVAL', 10)
+
+    def add(self, user_id, count=1):
+        """Учитывает посещение и записывает пачку, если пора."""
+        if self.record(user_id, count):
+            self.try_flush()
+
+    def record(self, user_id, count=1):
+        """Учитывает посещение без записи в БД; возвращает True, если пачку пора записать."""
+        with self.lock:
+            self.pending[user_id] = self.pending.get(user_id, 0) + count
+            return (sum(self.pending.values()) >= self.flush_size
+                    or time.monotonic() - self.flushed_at >= self.flush_interval)
+
+    def pending_for(self, user_id):
+        with self.lock:
+            return self.pending.get(user_id, 0)
+
+    def flush(self):
+        """Записывает накопленные посещения в VisitCount; возвращает число записанных посещений."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            with transaction.atomic():
+                # Недостающие строки создаются с нулем (кроме удаленных пользователей),
+                # затем все счетчики увеличиваются одним UPDATE
+                missing = User.objects.filter(pk__in=pending, visitcount__isnull=True).values_list('pk', flat=True)
+                VisitCount.objects.bulk_create(
+                    [VisitCount(user_id=user_id) for user_id in missing], ignore_conflicts=True,
+                )
+                VisitCount.objects.filter(user_id__in=pending).update(count=Case(
+                    *(When(user_id=user_id, then=F('count') + count) for user_id, count in pending.items()),
+                    default=F('count'),
+                ))
+        except Exception:
+            # Посещения не теряются: вернутся в буфер и запишутся в следующий раз
+            with self.lock:
+                for user_id, count in pending.items():
+                    self.pending[user_id] = self.pending.get(user_id, 0) + count
+            raise
+        return sum(pending.values())
+
+    def try_flush(self):
+        """flush() для пути запроса: ошибка БД записывается в журнал, а не приводит к ответу 500.
+
+        Посещения остаются в буфере, следующая попытка - через flush_interval секунд.
+        """
+        try:
+            return self.flush()
+        except Exception:
+            logger.exception('Не удалось записать %d посещений, запись отложена', self.pending_total())
+            return 0
+
+    def pending_total(self):
+        with self.lock:
+            return sum(self.pending.values())
+
+    def reset(self):
+        with self.lock:
+            self.pending = {}
+            self.flushed_at = time.monotonic()
+
+
+buffer = VisitBuffer()
+
+
+def record_visit(user):
+    """Учитывает посещение пользователя и возвращает число его прошлых посещений."""
+    stored = VisitCount.objects.filter(user_id=user.pk).values_list('count', flat=True).first() or 0
+    visits = stored + buffer.pending_for(user.pk)
+    buffer.add(user.pk)
+    return visits
+
+
+async def arecord_visit(user):
+    """Асинхронный record_visit() для ASGI-представлений."""
+    stored = await VisitCount.objects.filter(user_id=user.pk).values_list('count', flat=True).afirst() or 0
+    visits = stored + buffer.pending_for(user.pk)
+    if buffer.record(user.pk):
+        await sync_to_async(buffer.try_flush)()
+    return visits
+
+
+atexit.register(buffer.try_flush)
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect, AutocompleteSelectMultiple
+from django.urls import reverse
+
+
+class IndexAutocompleteMixin:
+    """
+    Виджет select2 админки, который получает варианты из blog.views.autocomplete
+    (индекс префиксов в памяти, см. blog/autocomplete.py) вместо встраивания всех
+    записей в HTML. В разметку попадают только выбранные значения.
+    """
+
+    def __init__(self, field, index_name, attrs=None, admin_site=None):
+        super().__init__(field, admin_site or admin.site, attrs=attrs)
+        self.index_name = index_name
+
+    def get_url(self):
+        return reverse('autocomplete', kwargs={'index': self.index_name})
+
+
+class IndexAutocompleteSelect(IndexAutocompleteMixin, AutocompleteSelect):
+    pass
+
+
+class IndexAutocompleteSelectMultiple(IndexAutocompleteMixin, AutocompleteSelectMultiple):
+    pass
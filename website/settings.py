@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.instrumentation.PerformanceMiddleware',  # Server-Timing и метрики /metrics/ для выборки запросов.
+    'blog.db.routers.replica_routing_middleware',  # Чтение каталога с реплик, основная база после записи.
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware', # Управляет сеансами по запросам.
@@ -54,11 +56,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'website.urls'
+# Асинхронные представления главной страницы и страниц каталога (blog/async_views.py)
+# для запуска под ASGI, например: BLOG_ASYNC_VIEWS=1 uvicorn website.asgi:application
+BLOG_ASYNC_VIEWS = bool(os.environ.get('BLOG_ASYNC_VIEWS', False))
+
+ROOT_URLCONF = 'website.urls_async' if BLOG_ASYNC_VIEWS else 'website.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки (см. blog/instrumentation.py)
+        'BACKEND': 'blog.instrumentation.InstrumentedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,18 +86,24 @@ WSGI_APPLICATION = 'website.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Основная база - $DATABASE_URL (по умолчанию SQLite), реплики для чтения каталога -
+# $DATABASE_REPLICA_URLS через запятую с весами $BLOG_DB_REPLICA_WEIGHTS. Постоянные
+# соединения, их проверка и пул соединений процесса настраиваются переменными
+# BLOG_DB_* (см. blog/db/config.py).
+from blog.db.config import databases, replica_weights
+
+DATABASES = databases({
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+})
+DATABASE_ROUTERS = ['blog.db.routers.ReplicaRouter']
+BLOG_DATABASE_REPLICAS = replica_weights(DATABASES)
+# Выбор реплики на запрос: round_robin (по кругу с учетом весов) или random (случайно по весу)
+BLOG_DATABASE_REPLICA_SELECTION = os.environ.get('BLOG_DB_REPLICA_SELECTION', 'round_robin')
+# Сколько секунд после записи клиент читает каталог из основной базы (cookie db_primary)
+BLOG_DATABASE_PIN_SECONDS = int(os.environ.get('BLOG_DB_PIN_SECONDS', 5))
 
-# Обновляет конфигурацию базы данных с $DATABASE_URL
-import dj_database_url
 
-db_from_env = dj_database_url.config(conn_max_age=500)
-DATABASES['default'].update(db_from_env)
 
 
 # Password validation
@@ -147,10 +161,71 @@ LOGIN_REDIRECT_URL = '/'
 # Для тестирования. Будет регистрировать все электронные письма при сбросе пароля и отправлять на консоль.
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Кэш отрисованных фрагментов шаблонов (см. blog/fragments.py). По умолчанию – память
+# процесса; для общего кэша нескольких процессов задайте бэкенд и адрес, например
+# BLOG_FRAGMENT_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# BLOG_FRAGMENT_CACHE_LOCATION=redis://127.0.0.1:6379/1
+FRAGMENT_CACHE_BACKEND = os.environ.get('BLOG_FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': FRAGMENT_CACHE_BACKEND,
+        'LOCATION': os.environ.get('BLOG_FRAGMENT_CACHE_LOCATION', 'blog-fragments'),
+        # Ключи версионные, поэтому время жизни лишь ограничивает хранение устаревших фрагментов
+        'TIMEOUT': int(os.environ.get('BLOG_FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)),
+        # MAX_ENTRIES поддерживают только локальные бэкенды (по умолчанию 300 записей)
+        'OPTIONS': {'MAX_ENTRIES': 10000} if FRAGMENT_CACHE_BACKEND.endswith('LocMemCache') else {},
+    },
+}
+
+# Разрешения пользователей кэшируются в кэше 'fragments' с версиями, которые сбрасываются
+# сигналами (см. blog/auth_backends.py). Сигнал сбрасывает версию только в кэше своего
+# процесса: на локальном кэше другие рабочие процессы (gunicorn, WEB_CONCURRENCY > 1)
+# видят отзыв разрешения лишь по истечении времени жизни снимка. Поэтому по умолчанию
+# оно короткое (5 секунд: снимок избавляет от запросов к БД в пределах страницы и серии
+# запросов), а с общим кэшем (BLOG_FRAGMENT_CACHE_BACKEND) - 5 минут.
+AUTHENTICATION_BACKENDS = ['blog.auth_backends.CachedModelBackend']
+BLOG_PERMISSION_CACHE_TIMEOUT = int(os.environ.get(
+    'BLOG_PERMISSION_CACHE_TIMEOUT', 5 if FRAGMENT_CACHE_BACKEND.endswith('LocMemCache') else 5 * 60,
+))
+
+# Хранилище сессий: db (по умолчанию), cached_db (кэш 'sessions' с записью в БД),
+# cache (только кэш) или signed_cookies (подписанная cookie, без записи на сервере).
+# Можно указать и полный путь к модулю SESSION_ENGINE. Для cached_db и cache при
+# нескольких процессах нужен общий кэш: BLOG_SESSION_CACHE_BACKEND и BLOG_SESSION_CACHE_LOCATION.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+BLOG_SESSION_ENGINE = os.environ.get('BLOG_SESSION_ENGINE', 'db')
+SESSION_ENGINE = SESSION_ENGINES.get(BLOG_SESSION_ENGINE, BLOG_SESSION_ENGINE)
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_CACHE_BACKEND = os.environ.get('BLOG_SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES['sessions'] = {
+    'BACKEND': SESSION_CACHE_BACKEND,
+    'LOCATION': os.environ.get('BLOG_SESSION_CACHE_LOCATION', 'blog-sessions'),
+    # Время жизни записи задает сама сессия; вытеснение при 300 записях разлогинивало бы пользователей
+    'OPTIONS': {'MAX_ENTRIES': 100000} if SESSION_CACHE_BACKEND.endswith('LocMemCache') else {},
+}
+
+# Постраничный вывод по ключу (?cursor=) вместо OFFSET (?page=) для списков книг, авторов и выдач.
+BLOG_KEYSET_PAGINATION = bool(os.environ.get('BLOG_KEYSET_PAGINATION', False))
+
+# Доля запросов, для которых замеряются SQL и шаблоны (заголовок Server-Timing и /metrics/),
+# окно гистограммы в секундах и токен для чтения /metrics/ без входа (Authorization: Bearer <токен>).
+BLOG_METRICS_SAMPLE_RATE = float(os.environ.get('BLOG_METRICS_SAMPLE_RATE', 0.05))
+BLOG_METRICS_WINDOW = int(os.environ.get('BLOG_METRICS_WINDOW', 300))
+BLOG_METRICS_TOKEN = os.environ.get('BLOG_METRICS_TOKEN', '')
+
 REST_FRAMEWORK = {
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     # ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'blog.pagination.CatalogCursorPagination',
     'PAGE_SIZE': 10
 }
\ No newline at end of file
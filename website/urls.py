@@ -26,18 +26,30 @@ from blog import views
 router = routers.DefaultRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'groups', views.GroupViewSet)
-
-
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('blog/', include('blog.urls')),
-    # path('', include(router.urls)),
-    # path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
-    path('', RedirectView.as_view(url='blog/', permanent=True)),
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-
-
-# Добавляет URL-адреса аутентификации сайта Django (для входа, выхода, управления паролями)
-urlpatterns += [
-    path('accounts/', include('django.contrib.auth.urls')),
-]
\ No newline at end of file
+# Имена маршрутов с префиксом api-, чтобы не пересекаться с 'book-detail' и т.п. из blog.urls
+router.register(r'books', views.BookViewSet, basename='api-book')
+router.register(r'authors', views.AuthorViewSet, basename='api-author')
+router.register(r'bookinstances', views.BookInstanceViewSet, basename='api-bookinstance')
+router.register(r'genres', views.GenreViewSet, basename='api-genre')
+router.register(r'languages', views.LanguageViewSet, basename='api-language')
+
+
+def build_urlpatterns(blog_urlconf='blog.urls'):
+    """Маршруты сайта; blog_urlconf - синхронные (blog.urls) или асинхронные (blog.urls_async) страницы блога."""
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+        path('blog/', include(blog_urlconf)),
+        path('api/', include(router.urls)),
+        path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
+        path('metrics/', views.metrics, name='metrics'),
+        path('', RedirectView.as_view(url='blog/', permanent=True)),
+    ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+
+    # Добавляет URL-адреса аутентификации сайта Django (для входа, выхода, управления паролями)
+    urlpatterns += [
+        path('accounts/', include('django.contrib.auth.urls')),
+    ]
+    return urlpatterns
+
+
+urlpatterns = build_urlpatterns()
\ No newline at end of file
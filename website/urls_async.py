@@ -0,0 +1,6 @@
+"""URLconf сайта для ASGI: главная страница и страницы каталога обслуживаются
+асинхронными представлениями (blog/async_views.py). Выбирается в settings при
+BLOG_ASYNC_VIEWS=1."""
+from website.urls import build_urlpatterns
+
+urlpatterns = build_urlpatterns('blog.urls_async')